@@ -0,0 +1,152 @@
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+from benchmark.utils import timed
+from ingestion.download_html import download_many
+
+
+class FlakyPageServer(ThreadingHTTPServer):
+    def __init__(self, n_failures: int, status: int = 503):
+        """
+        Initializes a local HTTP server standing in for ar5iv, whose pages fail a few times
+        before being served: it exercises the retries and backoff of the download.
+
+        Each page answers its first n_failures requests with an error status, then
+        its content with an ETag (and 304 to requests revalidating that ETag).
+
+        Args:
+            n_failures (int): The number of failed requests of each page before it is served.
+            status (int): The status of the failed requests (e.g., 429 or 503).
+        """
+        super().__init__(("127.0.0.1", 0), _FlakyPageHandler)
+        self.n_failures = n_failures
+        self.status = status
+        self.n_requests: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """str: The URL of the server."""
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count_request(self, path: str) -> int:
+        """
+        Counts a request of a page.
+
+        Args:
+            path (str): The path of the page.
+
+        Returns:
+            int: The number of requests of the page so far, this one included.
+        """
+        with self._lock:
+            self.n_requests[path] = self.n_requests.get(path, 0) + 1
+            return self.n_requests[path]
+
+
+class _FlakyPageHandler(BaseHTTPRequestHandler):
+    server: FlakyPageServer
+
+    def do_GET(self) -> None:
+        if self.server.count_request(self.path) <= self.server.n_failures:
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = f"<html><body><h1>Page {self.path}</h1></body></html>".encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@contextmanager
+def serve_flaky_pages(n_failures: int, status: int = 503) -> Iterator[FlakyPageServer]:
+    """
+    Runs a FlakyPageServer in a background thread.
+
+    Args:
+        n_failures (int): The number of failed requests of each page before it is served.
+        status (int): The status of the failed requests.
+
+    Yields:
+        FlakyPageServer: The running server.
+    """
+    server = FlakyPageServer(n_failures, status=status)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def check_download_retries(
+    n_pages: int,
+    n_failures: int,
+    max_retries: int,
+    backoff_factor: float = 0.01,
+    status: int = 503,
+) -> dict[str, float]:
+    """
+    Downloads pages from a local server failing a few times per page, then downloads them again
+    (revalidation), to check that the retries recover from transient errors.
+
+    Args:
+        n_pages (int): The number of pages to download.
+        n_failures (int): The number of failed requests of each page before it is served.
+        max_retries (int): The max number of retries of a request.
+        backoff_factor (float): The base delay of the exponential backoff, in seconds.
+        status (int): The status of the failed requests.
+
+    Returns:
+        dict[str, float]: The number of pages downloaded, of requests received by the server,
+            and of pages revalidated by the second download, with the time of the first one.
+    """
+    with serve_flaky_pages(
+        n_failures, status=status
+    ) as server, tempfile.TemporaryDirectory() as save_dir:
+        pages = [(f"{server.base_url}/{i}", f"{i}.html") for i in range(n_pages)]
+        settings = dict(
+            max_requests_per_s_per_host=1000,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor,
+        )
+        downloaded, elapsed = timed(
+            lambda: list(download_many(pages, save_dir, **settings))
+        )
+        n_requests = sum(server.n_requests.values())
+        revalidated = list(download_many(pages, save_dir, **settings))
+    return {
+        "n_failures": n_failures,
+        "max_retries": max_retries,
+        "downloaded": len(downloaded),
+        "requests": n_requests,
+        "revalidated": len(revalidated),
+        "total_s": elapsed,
+    }
+
+
+if __name__ == "__main__":
+    # failures within the retries are recovered, the others make the downloads fail
+    for n_failures, max_retries in [(0, 3), (2, 3), (3, 3), (4, 3)]:
+        row = check_download_retries(8, n_failures, max_retries)
+        print(", ".join(f"{key}: {val}" for key, val in row.items()))
@@ -0,0 +1,106 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import markdownify
+from bs4 import BeautifulSoup
+
+from benchmark.utils import timed
+from ingestion.utils import (
+    HTML_EXTENSIONS,
+    HTML_PARSER,
+    convert_html_to_markdown,
+    html_to_markdown,
+    read_html_file,
+)
+
+
+def legacy_html_to_markdown(html_content: str) -> str:
+    """
+    Converts HTML content to Markdown format as done before the single-parse conversion:
+    the page is parsed by BeautifulSoup, serialized back and parsed again by markdownify.
+
+    Args:
+        html_content (str): The HTML content to be converted.
+
+    Returns:
+        str: The converted Markdown content.
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+    return markdownify.markdownify(str(soup), heading_style="ATX")
+
+
+def compare_html_parsing(
+    html_file_paths: list[str], lst_n_processes: list[int]
+) -> list[dict[str, float]]:
+    """
+    Measures the conversion of HTML files to markdown with the former double parse, the
+    single parse with each available parser and the single parse in a process pool.
+
+    Args:
+        html_file_paths (list[str]): The HTML files to convert.
+        lst_n_processes (list[int]): The numbers of processes of the pools to compare.
+
+    Returns:
+        list[dict[str, float]]: For each method, the total time, the time per file, the
+            throughput and the mean size of the markdown output.
+    """
+    html_contents = [read_html_file(path) for path in html_file_paths]
+    size_mb = sum(len(html) for html in html_contents) / 2**20
+
+    methods = {"double parse (html.parser)": legacy_html_to_markdown}
+    for parser in sorted({"html.parser", HTML_PARSER}):
+        methods[f"single parse ({parser})"] = (
+            lambda html, parser=parser: html_to_markdown(html, parser=parser)
+        )
+
+    report = []
+
+    def add_row(method: str, markdown_texts: list[str], elapsed: float) -> None:
+        report.append(
+            {
+                "method": method,
+                "total_s": elapsed,
+                "ms_per_file": 1000 * elapsed / len(html_file_paths),
+                "mb_per_s": size_mb / elapsed,
+                "markdown_chars_per_file": sum(map(len, markdown_texts))
+                / len(markdown_texts),
+            }
+        )
+
+    for method, convert in methods.items():
+        markdown_texts, elapsed = timed(lambda: [convert(h) for h in html_contents])
+        add_row(method, markdown_texts, elapsed)
+
+    for n_processes in lst_n_processes:
+        with ProcessPoolExecutor(
+            max_workers=n_processes, mp_context=mp.get_context("spawn")
+        ) as executor:
+            # start the processes outside of the measure
+            list(executor.map(abs, range(n_processes)))
+            markdown_texts, elapsed = timed(
+                lambda: list(executor.map(convert_html_to_markdown, html_file_paths))
+            )
+        add_row(
+            f"single parse ({HTML_PARSER}), {n_processes} processes",
+            markdown_texts,
+            elapsed,
+        )
+    return report
+
+
+if __name__ == "__main__":
+    from utility.read_config import get_config_from_path
+
+    dct_config = get_config_from_path("config.yaml")
+    html_folder_path = dct_config["INPUT_DATA"]["PATH_TO_FOLDER"]
+    html_file_paths = [
+        os.path.join(html_folder_path, f)
+        for f in sorted(os.listdir(html_folder_path))
+        if f.endswith(HTML_EXTENSIONS)
+    ]
+
+    print(f"Sample: {len(html_file_paths)} HTML files")
+    lst_n_processes = sorted({2, min(4, os.cpu_count())})
+    for row in compare_html_parsing(html_file_paths, lst_n_processes):
+        print(", ".join(f"{key}: {val}" for key, val in row.items()))
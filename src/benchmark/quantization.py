@@ -0,0 +1,76 @@
+from benchmark.utils import (
+    load_sample_chunks,
+    model_size_mb,
+    recall_at_k,
+    sample_queries,
+    sparse_to_dense,
+    timed,
+    top_k,
+)
+from embedding import dense, sparse
+
+
+def compare_quantization(
+    chunks: list[str], queries: list[str], k: int = 10
+) -> dict[str, dict[str, float]]:
+    """
+    Encodes a corpus and its queries with both encoders, in fp32 and in int8, to
+    measure the speedup, the memory saved and the loss of retrieval quality of the
+    dynamic int8 quantization.
+
+    Args:
+        chunks (list[str]): The chunks of the sample corpus.
+        queries (list[str]): The queries run against the corpus.
+        k (int): The number of results per query used to measure the overlap.
+
+    Returns:
+        dict: For each encoder, the fp32 and int8 encoding times, the speedup, the
+            model sizes, the memory saved and the overlap@k of the int8 results.
+    """
+    report = {}
+    for name in ["dense", "sparse"]:
+        results = {}
+        for quantize_int8 in [False, True]:
+            if name == "dense":
+                encoder = dense.load_encoder(quantize_int8=quantize_int8)
+                docs, elapsed = timed(dense.encode_with, encoder, chunks)
+                queries_vecs = dense.encode_with(encoder, queries)
+                size = model_size_mb(encoder)
+            else:
+                tokenizer, model = sparse.load_model(quantize_int8=quantize_int8)
+                docs, elapsed = timed(sparse.encode_with, tokenizer, model, chunks)
+                docs = sparse_to_dense(docs, len(tokenizer))
+                queries_vecs = sparse_to_dense(
+                    sparse.encode_with(tokenizer, model, queries), len(tokenizer)
+                )
+                size = model_size_mb(model)
+            results[quantize_int8] = (top_k(queries_vecs @ docs.T, k), elapsed, size)
+
+        (ref, time_fp32, size_fp32), (res, time_int8, size_int8) = (
+            results[False],
+            results[True],
+        )
+        report[name] = {
+            "time_fp32_s": time_fp32,
+            "time_int8_s": time_int8,
+            "speedup": time_fp32 / time_int8,
+            "size_fp32_mb": size_fp32,
+            "size_int8_mb": size_int8,
+            "memory_saved_mb": size_fp32 - size_int8,
+            f"overlap@{k}": recall_at_k(ref, res),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    from utility.read_config import get_config_from_path
+
+    dct_config = get_config_from_path("config.yaml")
+    chunks = load_sample_chunks(dct_config["INPUT_DATA"]["PATH_TO_FOLDER"])
+    queries = sample_queries(chunks)
+
+    print(f"Sample corpus: {len(chunks)} chunks, {len(queries)} queries")
+    for name, metrics in compare_quantization(chunks, queries).items():
+        print(f"--- {name} encoder")
+        for metric, value in metrics.items():
+            print(f"{metric:>16}: {value:.3f}")
@@ -0,0 +1,141 @@
+from typing import Optional
+from uuid import uuid4
+
+from qdrant_client import QdrantClient, models
+
+from benchmark.utils import load_sample_chunks, recall_at_k, sample_queries, timed
+from embedding.sparse import (
+    BACKEND,
+    compute_sparse_vector,
+    compute_sparse_vectors,
+    drop_bm25_encoder,
+)
+
+SPARSE_VECT_NAME = "text-sparse"
+
+
+def _build_sparse_collection(
+    client: QdrantClient, coll_name: str, vectors: list[dict[str, list]]
+) -> None:
+    client.create_collection(
+        collection_name=coll_name,
+        vectors_config={},
+        sparse_vectors_config={
+            SPARSE_VECT_NAME: models.SparseVectorParams(
+                index=models.SparseIndexParams(on_disk=False)
+            )
+        },
+    )
+    client.upload_points(
+        collection_name=coll_name,
+        points=[
+            models.PointStruct(
+                id=i, vector={SPARSE_VECT_NAME: models.SparseVector(**vector)}
+            )
+            for i, vector in enumerate(vectors)
+        ],
+    )
+
+
+def _search(
+    client: QdrantClient,
+    coll_name: str,
+    query_vectors: list[dict[str, list]],
+    k: int,
+) -> list[list[int]]:
+    # a query may have fewer than k hits: its list of ids is shorter
+    return [
+        [
+            p.id
+            for p in client.query_points(
+                collection_name=coll_name,
+                query=models.SparseVector(**vector),
+                using=SPARSE_VECT_NAME,
+                limit=k,
+            ).points
+        ]
+        for vector in query_vectors
+    ]
+
+
+def compare_pruning(
+    chunks: list[str],
+    queries: list[str],
+    doc_settings: list[tuple[Optional[int], Optional[float]]],
+    query_top_k: Optional[int] = None,
+    query_min_weight: Optional[float] = None,
+    k: int = 10,
+) -> list[dict[str, float]]:
+    """
+    Indexes a corpus with several document pruning settings, to trade the size and
+    search latency of the sparse index against the recall@k of the unpruned index.
+
+    The index size is estimated from the number of stored (index, value) postings,
+    8 bytes each.
+
+    Args:
+        chunks (list[str]): The chunks of the sample corpus.
+        queries (list[str]): The queries run against the corpus.
+        doc_settings (list[tuple[Optional[int], Optional[float]]]): The (top_k, min_weight) pairs to compare.
+        query_top_k (Optional[int]): The top_k pruning of the queries.
+        query_min_weight (Optional[float]): The min_weight pruning of the queries.
+        k (int): The number of results per query.
+
+    Returns:
+        list[dict[str, float]]: For each setting, the mean terms per doc, the index size,
+            the mean search latency and the recall@k.
+    """
+    client = QdrantClient(":memory:")
+    # with the BM25 backend, the corpus statistics of the sample are kept apart from those
+    # of the indexed collections, and dropped afterwards
+    coll_name = f"benchmark-{uuid4().hex}"
+    try:
+        full_vectors = compute_sparse_vectors(
+            chunks, top_k=None, min_weight=None, coll_name=coll_name
+        )
+        query_vectors = [
+            compute_sparse_vector(
+                q, top_k=query_top_k, min_weight=query_min_weight, coll_name=coll_name
+            )
+            for q in queries
+        ]
+        _build_sparse_collection(client, "reference", full_vectors)
+        reference = _search(client, "reference", query_vectors, k)
+
+        report = []
+        for i, (top_k, min_weight) in enumerate(doc_settings):
+            vectors = compute_sparse_vectors(
+                chunks, top_k=top_k, min_weight=min_weight, coll_name=coll_name
+            )
+            _build_sparse_collection(client, f"pruned_{i}", vectors)
+            results, elapsed = timed(_search, client, f"pruned_{i}", query_vectors, k)
+
+            n_terms = sum(len(v["indices"]) for v in vectors)
+            report.append(
+                {
+                    "top_k": top_k,
+                    "min_weight": min_weight,
+                    "terms_per_doc": n_terms / len(vectors),
+                    "index_size_mb": n_terms * 8 / 2**20,
+                    "latency_ms": 1000 * elapsed / len(queries),
+                    f"recall@{k}": recall_at_k(reference, results),
+                }
+            )
+    finally:
+        if BACKEND == "bm25":
+            drop_bm25_encoder(coll_name)
+    return report
+
+
+if __name__ == "__main__":
+    from utility.read_config import get_config_from_path
+
+    dct_config = get_config_from_path("config.yaml")
+    chunks = load_sample_chunks(dct_config["INPUT_DATA"]["PATH_TO_FOLDER"])
+    queries = sample_queries(chunks)
+
+    print(f"Sample corpus: {len(chunks)} chunks, {len(queries)} queries")
+    doc_settings = [(None, None), (256, None), (128, None), (64, None), (32, None)]
+    doc_settings += [(None, 0.1), (None, 0.3), (128, 0.1)]
+    for row in compare_pruning(chunks, queries, doc_settings):
+        print(", ".join(f"{key}: {val}" for key, val in row.items()))
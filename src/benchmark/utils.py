@@ -0,0 +1,150 @@
+import io
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+import numpy as np
+
+from ingestion.chunking import chunk_markdown
+from ingestion.utils import HTML_EXTENSIONS, convert_html_to_markdown
+
+if TYPE_CHECKING:
+    import torch
+
+
+def load_sample_chunks(html_folder_path: str, n_max_chunks: int = 500) -> list[str]:
+    """
+    Builds a sample corpus by chunking the HTML files of a folder.
+
+    Args:
+        html_folder_path (str): The folder containing the HTML files.
+        n_max_chunks (int): The maximum number of chunks to return.
+
+    Returns:
+        list[str]: The chunks of the sample corpus.
+    """
+    chunks = []
+    for f in sorted(os.listdir(html_folder_path)):
+        if f.endswith(HTML_EXTENSIONS):
+            markdown_text = convert_html_to_markdown(os.path.join(html_folder_path, f))
+            chunks += [chunk.text for chunk in chunk_markdown(markdown_text)]
+        if len(chunks) >= n_max_chunks:
+            break
+    return chunks[:n_max_chunks]
+
+
+def sample_queries(
+    chunks: list[str], n_queries: int = 50, n_words: int = 12, seed: int = 0
+) -> list[str]:
+    """
+    Builds pseudo-queries by taking a random span of words from random chunks.
+
+    Args:
+        chunks (list[str]): The chunks of the sample corpus.
+        n_queries (int): The number of queries to build.
+        n_words (int): The number of words of each query.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        list[str]: The pseudo-queries.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for chunk in rng.sample(chunks, min(n_queries, len(chunks))):
+        words = chunk.split()
+        start = rng.randrange(max(1, len(words) - n_words))
+        queries.append(" ".join(words[start : start + n_words]))
+    return queries
+
+
+def timed(func: Callable[..., Any], *args, **kwargs) -> tuple[Any, float]:
+    """
+    Calls a function and measures its wall time.
+
+    Args:
+        func (Callable[..., Any]): The function to call.
+        *args: The positional arguments of the function.
+        **kwargs: The keyword arguments of the function.
+
+    Returns:
+        tuple: The output of the function and the elapsed time, in seconds.
+    """
+    start = time.perf_counter()
+    out = func(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def model_size_mb(model: "torch.nn.Module") -> float:
+    """
+    Computes the size of the serialized weights of a model.
+
+    Args:
+        model (torch.nn.Module): The model.
+
+    Returns:
+        float: The size of the model state dict, in MB.
+    """
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def sparse_to_dense(vectors: list[dict[str, list]], dim: int) -> np.ndarray:
+    """
+    Converts sparse vectors into the rows of a dense matrix.
+
+    Args:
+        vectors (list[dict[str, list]]): The sparse vectors, as indices and values.
+        dim (int): The dimension of the vector space (e.g., the vocabulary size).
+
+    Returns:
+        np.ndarray: A float32 matrix of shape (len(vectors), dim).
+    """
+    out = np.zeros((len(vectors), dim), dtype=np.float32)
+    for row, vector in enumerate(vectors):
+        out[row, vector["indices"]] = vector["values"]
+    return out
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the column indices of the k highest scores of each row.
+
+    Args:
+        scores (np.ndarray): A (n_queries, n_docs) matrix of scores.
+        k (int): The number of results per query.
+
+    Returns:
+        np.ndarray: A (n_queries, k) matrix of document indices, in no particular order.
+    """
+    k = min(k, scores.shape[1])
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def recall_at_k(
+    reference: Sequence[Sequence[Any]], retrieved: Sequence[Sequence[Any]]
+) -> float:
+    """
+    Computes the mean fraction of reference results which have also been retrieved.
+
+    The queries may have fewer results than k (e.g., a search returning fewer hits):
+    the rows can be ragged lists, and the queries without reference results are ignored.
+
+    Args:
+        reference (Sequence[Sequence[Any]]): The reference results of each query
+            (e.g., a (n_queries, k) matrix or lists of ids).
+        retrieved (Sequence[Sequence[Any]]): The results to evaluate of each query.
+
+    Returns:
+        float: The recall@k of the retrieved results against the reference ones
+            (nan if no query has reference results).
+    """
+    recalls = [
+        len(set(ref) & set(ret)) / len(ref)
+        for ref, ret in zip(reference, retrieved)
+        if len(ref) > 0
+    ]
+    return float(np.mean(recalls)) if recalls else float("nan")
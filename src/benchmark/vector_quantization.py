@@ -0,0 +1,166 @@
+import math
+from typing import Optional
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from benchmark.utils import (
+    load_sample_chunks,
+    recall_at_k,
+    sample_queries,
+    timed,
+    top_k,
+)
+from embedding.dense import compute_dense_vectors
+from ingestion.vdb_wrapper import build_quantization_config
+from retrieval.vdb_wrapper import SearchInVdb
+
+DENSE_VECT_NAME = "text-dense"
+
+
+def vectors_ram_mb(
+    n_vectors: int, dim: int, quantization: Optional[str], on_disk: bool
+) -> float:
+    """
+    Estimates the RAM taken by the dense vectors of a collection (indexes excluded).
+
+    Args:
+        n_vectors (int): The number of vectors.
+        dim (int): The dimension of the vectors.
+        quantization (Optional[str]): None, 'scalar' or 'binary'.
+        on_disk (bool): Whether the original float32 vectors are kept on disk.
+
+    Returns:
+        float: The size of the original vectors kept in RAM and of the quantized ones, in MB.
+    """
+    bytes_per_vector = {None: 0, "scalar": dim, "binary": math.ceil(dim / 8)}
+    original = 0 if on_disk else 4 * dim
+    return n_vectors * (original + bytes_per_vector[quantization]) / 2**20
+
+
+def _build_dense_collection(
+    client: QdrantClient,
+    coll_name: str,
+    vectors: np.ndarray,
+    quantization: Optional[str],
+    on_disk: bool,
+) -> None:
+    client.create_collection(
+        collection_name=coll_name,
+        vectors_config={
+            DENSE_VECT_NAME: models.VectorParams(
+                size=vectors.shape[1],
+                distance=models.Distance.COSINE,
+                on_disk=on_disk,
+                quantization_config=build_quantization_config(quantization),
+            )
+        },
+    )
+    client.upload_points(
+        collection_name=coll_name,
+        points=[
+            models.PointStruct(id=i, vector={DENSE_VECT_NAME: vector.tolist()})
+            for i, vector in enumerate(vectors)
+        ],
+    )
+
+
+def _search(
+    searcher: SearchInVdb,
+    query_vectors: np.ndarray,
+    k: int,
+    oversampling: Optional[float],
+    rescore: Optional[bool],
+) -> list[list[int]]:
+    # a query may have fewer than k hits: its list of ids is shorter
+    return [
+        [
+            p.id
+            for p in searcher.dense(
+                vector.tolist(), k=k, oversampling=oversampling, rescore=rescore
+            )
+        ]
+        for vector in query_vectors
+    ]
+
+
+def compare_dense_quantization(
+    chunks: list[str],
+    queries: list[str],
+    settings: list[tuple[Optional[str], bool, Optional[float], Optional[bool]]],
+    client: Optional[QdrantClient] = None,
+    k: int = 10,
+) -> list[dict[str, float]]:
+    """
+    Indexes a corpus with several storage settings of the dense vectors, to trade
+    the RAM of the collection against the search latency and the recall@k of the
+    exact search.
+
+    Quantization is only applied by a Qdrant server: with a local client, the
+    latency and recall of all settings are those of the float32 vectors.
+
+    Args:
+        chunks (list[str]): The chunks of the sample corpus.
+        queries (list[str]): The queries run against the corpus.
+        settings (list[tuple[Optional[str], bool, Optional[float], Optional[bool]]]): The
+            (quantization, on_disk, oversampling, rescore) settings to compare.
+        client (Optional[QdrantClient]): The client of the database. If None, an in-memory local one.
+        k (int): The number of results per query.
+
+    Returns:
+        list[dict[str, float]]: For each setting, the estimated RAM of the vectors, the mean
+            search latency and the recall@k.
+    """
+    client = client or QdrantClient(":memory:")
+    vectors = compute_dense_vectors(chunks)
+    query_vectors = compute_dense_vectors(queries)
+    # exact cosine search, as reference
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    reference = top_k(query_vectors @ normalized.T, k)
+
+    report = []
+    for i, (quantization, on_disk, oversampling, rescore) in enumerate(settings):
+        coll_name = f"bench_quantization_{i}"
+        _build_dense_collection(client, coll_name, vectors, quantization, on_disk)
+        searcher = SearchInVdb(client, coll_name, dense_vect_name=DENSE_VECT_NAME)
+        results, elapsed = timed(
+            _search, searcher, query_vectors, k, oversampling, rescore
+        )
+        client.delete_collection(coll_name)
+
+        report.append(
+            {
+                "quantization": quantization,
+                "on_disk": on_disk,
+                "oversampling": oversampling,
+                "rescore": rescore,
+                "ram_mb": vectors_ram_mb(*vectors.shape, quantization, on_disk),
+                "latency_ms": 1000 * elapsed / len(queries),
+                f"recall@{k}": recall_at_k(reference, results),
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    import os
+
+    from utility.read_config import get_config_from_path
+
+    dct_config = get_config_from_path("config.yaml")
+    chunks = load_sample_chunks(dct_config["INPUT_DATA"]["PATH_TO_FOLDER"])
+    queries = sample_queries(chunks)
+
+    # e.g., QDRANT_URL=http://localhost:6333, as quantization needs a Qdrant server
+    url = os.environ.get("QDRANT_URL")
+    client = QdrantClient(url=url) if url else QdrantClient(":memory:")
+    if not url:
+        print("QDRANT_URL not set: local client, vectors are not quantized")
+
+    print(f"Sample corpus: {len(chunks)} chunks, {len(queries)} queries")
+    settings = [(None, False, None, None), (None, True, None, None)]
+    settings += [("scalar", False, None, False), ("scalar", True, 2.0, True)]
+    settings += [("binary", False, None, False), ("binary", True, 2.0, True)]
+    settings += [("binary", True, 4.0, True)]
+    for row in compare_dense_quantization(chunks, queries, settings, client=client):
+        print(", ".join(f"{key}: {val}" for key, val in row.items()))
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Optional
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits a text into lowercase word tokens.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list[str]: The tokens of the text.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Encoder:
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        Initializes a lexical sparse encoder producing BM25 weights.
+
+        Documents are encoded with their BM25 term-frequency weights and queries with
+        the IDF of their terms, so that the dot product computed by the vector database
+        is the BM25 score. The vocabulary and the contribution of each source (document)
+        to the corpus statistics are persisted, so that re-encoding a source replaces its
+        contribution and removing it subtracts it.
+
+        Args:
+            path (str): The sqlite file where the vocabulary and corpus statistics are persisted.
+            k1 (float): The BM25 term-frequency saturation parameter.
+            b (float): The BM25 document-length normalization parameter.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS terms (id INTEGER PRIMARY KEY, term TEXT UNIQUE)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources "
+            "(source_id TEXT PRIMARY KEY, n_docs INTEGER, total_len INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS source_df "
+            "(source_id TEXT, term_id INTEGER, df INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS source_df_source ON source_df (source_id)"
+        )
+        self._conn.commit()
+
+        self.vocab: dict[str, int] = {
+            term: term_id
+            for term_id, term in self._conn.execute("SELECT id, term FROM terms")
+        }
+        self.df: list[int] = [0] * len(self.vocab)
+        for term_id, df in self._conn.execute(
+            "SELECT term_id, SUM(df) FROM source_df GROUP BY term_id"
+        ):
+            self.df[term_id] = df
+        self.n_docs, self.total_len = self._conn.execute(
+            "SELECT COALESCE(SUM(n_docs), 0), COALESCE(SUM(total_len), 0) FROM sources"
+        ).fetchone()
+
+    def _remove_source(self, source_id: str) -> None:
+        row = self._conn.execute(
+            "SELECT n_docs, total_len FROM sources WHERE source_id = ?", (source_id,)
+        ).fetchone()
+        if row is None:
+            return
+        self.n_docs -= row[0]
+        self.total_len -= row[1]
+        for term_id, df in self._conn.execute(
+            "SELECT term_id, df FROM source_df WHERE source_id = ?", (source_id,)
+        ):
+            self.df[term_id] -= df
+        self._conn.execute("DELETE FROM source_df WHERE source_id = ?", (source_id,))
+        self._conn.execute("DELETE FROM sources WHERE source_id = ?", (source_id,))
+
+    def _add_source(self, source_id: str, lst_tokens: list[list[str]]) -> None:
+        source_df: dict[int, int] = {}
+        new_terms = []
+        for tokens in lst_tokens:
+            for term in set(tokens):
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self.vocab)
+                    self.df.append(0)
+                    new_terms.append((term_id, term))
+                source_df[term_id] = source_df.get(term_id, 0) + 1
+        n_tokens = sum(len(tokens) for tokens in lst_tokens)
+        for term_id, df in source_df.items():
+            self.df[term_id] += df
+        self.n_docs += len(lst_tokens)
+        self.total_len += n_tokens
+
+        self._conn.executemany("INSERT INTO terms (id, term) VALUES (?, ?)", new_terms)
+        self._conn.execute(
+            "INSERT INTO sources (source_id, n_docs, total_len) VALUES (?, ?, ?)",
+            (source_id, len(lst_tokens), n_tokens),
+        )
+        self._conn.executemany(
+            "INSERT INTO source_df (source_id, term_id, df) VALUES (?, ?, ?)",
+            [(source_id, term_id, df) for term_id, df in source_df.items()],
+        )
+
+    def encode_documents(
+        self, texts: list[str], source_ids: Optional[list[str]] = None
+    ) -> list[dict[str, list]]:
+        """
+        Encodes documents with their BM25 term weights, after adding them to the corpus statistics.
+
+        The texts of a source replace the contribution of its previously encoded texts, so
+        all the texts (e.g., the chunks) of a source must be encoded in the same call.
+
+        Args:
+            texts (list[str]): The documents to encode.
+            source_ids (Optional[list[str]]): The source of each text. If None, each text is its own
+                source, identified by its content (re-encoding a text does not change the statistics).
+
+        Returns:
+            list[dict[str, list]]: One dictionary per document containing the sparse vector indices and values.
+        """
+        if source_ids is None:
+            source_ids = [
+                hashlib.sha1(text.encode("utf-8")).hexdigest()[:16] for text in texts
+            ]
+        lst_tokens = [tokenize(text) for text in texts]
+        tokens_by_source: dict[str, list[list[str]]] = {}
+        for source_id, tokens in zip(source_ids, lst_tokens):
+            tokens_by_source.setdefault(source_id, []).append(tokens)
+
+        with self._lock:
+            for source_id, source_tokens in tokens_by_source.items():
+                self._remove_source(source_id)
+                self._add_source(source_id, source_tokens)
+            self._conn.commit()
+            avg_len = self.total_len / max(self.n_docs, 1)
+            lst_ids = [
+                np.fromiter((self.vocab[t] for t in tokens), np.int64, len(tokens))
+                for tokens in lst_tokens
+            ]
+
+        out = []
+        for ids in lst_ids:
+            indices, tf = np.unique(ids, return_counts=True)
+            norm = self.k1 * (1 - self.b + self.b * len(ids) / max(avg_len, 1e-9))
+            values = tf * (self.k1 + 1) / (tf + norm)
+            out.append({"indices": indices.tolist(), "values": values.tolist()})
+        return out
+
+    def remove_source(self, source_id: str) -> None:
+        """
+        Subtracts the texts of a source from the corpus statistics (e.g., when it is deleted).
+
+        Args:
+            source_id (str): The identifier of the source.
+        """
+        with self._lock:
+            self._remove_source(source_id)
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Resets the corpus statistics (the vocabulary is kept, as term ids are stable)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM source_df")
+            self._conn.execute("DELETE FROM sources")
+            self._conn.commit()
+            self.df = [0] * len(self.vocab)
+            self.n_docs = 0
+            self.total_len = 0
+
+    def close(self) -> None:
+        """Closes the sqlite file of the corpus statistics."""
+        with self._lock:
+            self._conn.close()
+
+    def encode_query(self, text: str) -> dict[str, list]:
+        """
+        Encodes a query with the IDF of its terms; terms never seen in the corpus are dropped.
+
+        Args:
+            text (str): The query to encode.
+
+        Returns:
+            dict[str, list]: The sparse vector indices and values of the query.
+        """
+        with self._lock:
+            ids = {self.vocab[t] for t in tokenize(text) if t in self.vocab}
+            indices = np.array(sorted(ids), dtype=np.int64)
+            df = np.array([self.df[i] for i in indices], dtype=np.float64)
+            n_docs = self.n_docs
+        values = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        return {"indices": indices.tolist(), "values": values.tolist()}
@@ -0,0 +1,335 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional, Union
+
+import numpy as np
+
+from utility.read_config import get_config_from_path
+
+dct_config = get_config_from_path("config.yaml")
+
+
+def text_key(model_name: str, text: str) -> str:
+    """
+    Computes the content-addressed cache key of a text embedded by a given model.
+
+    Args:
+        model_name (str): The name of the model producing the embedding.
+        text (str): The embedded text.
+
+    Returns:
+        str: The hex digest identifying the (model name, text) pair.
+    """
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class _VectorCache:
+    def __init__(self, folder: str, model_name: str, kind: str):
+        """
+        Initializes the sqlite index shared by the dense and sparse caches.
+
+        Args:
+            folder (str): The directory where the cache files are stored.
+            model_name (str): The name of the model whose embeddings are cached.
+            kind (str): The kind of cached vectors, used in file names.
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.model_name = model_name
+        self.path_prefix = os.path.join(
+            folder, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)}_{kind}"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path_prefix + ".sqlite", check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _keys(self, texts: list[str]) -> list[str]:
+        return [text_key(self.model_name, t) for t in texts]
+
+    def _select(self, columns: str, keys: list[str]) -> list[tuple]:
+        rows = []
+        # bounded number of host parameters per statement
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            rows += self._conn.execute(
+                f"SELECT {columns} FROM entries WHERE key IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+        return rows
+
+    def _touch(self, keys: list[str]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in keys]
+        )
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        """
+        Returns the hit and miss counters of the cache.
+
+        Returns:
+            dict: The number of hits, misses and evictions, and the hit rate.
+        """
+        n_calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / n_calls if n_calls > 0 else 0.0,
+        }
+
+
+class DenseVectorCache(_VectorCache):
+    def __init__(self, folder: str, model_name: str, dim: int, max_size_mb: float):
+        """
+        Initializes an on-disk cache of dense vectors.
+
+        Vectors are stored in the rows (slots) of a memory-mapped float32 matrix, whose
+        number of rows is set by the size limit; a sqlite table maps keys to slots.
+
+        Args:
+            folder (str): The directory where the cache files are stored.
+            model_name (str): The name of the model whose embeddings are cached.
+            dim (int): The dimension of the dense vectors.
+            max_size_mb (float): The maximum size of the vector file, in MB.
+        """
+        super().__init__(folder, model_name, kind="dense")
+        self.dim = dim
+        self.capacity = max(1, int(max_size_mb * 2**20) // (dim * 4))
+
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used REAL)"
+        )
+        data_path = self.path_prefix + ".f32"
+        expected_size = self.capacity * dim * 4
+        if not os.path.exists(data_path) or os.path.getsize(data_path) != expected_size:
+            # layout changed (or first run): previous slots are meaningless
+            self._conn.execute("DELETE FROM entries")
+            mode = "w+"
+        else:
+            mode = "r+"
+        self._conn.commit()
+        self._data = np.memmap(
+            data_path, dtype=np.float32, mode=mode, shape=(self.capacity, dim)
+        )
+
+    def get_many(self, texts: list[str]) -> list[Optional[np.ndarray]]:
+        """
+        Looks up the dense vectors of the given texts.
+
+        Args:
+            texts (list[str]): The texts to look up.
+
+        Returns:
+            list[Optional[np.ndarray]]: The cached vector of each text, or None on a miss.
+        """
+        keys = self._keys(texts)
+        with self._lock:
+            slots = dict(self._select("key, slot", keys))
+            out = [np.array(self._data[slots[k]]) if k in slots else None for k in keys]
+            self._touch(list(slots))
+            self._conn.commit()
+            self.hits += sum(v is not None for v in out)
+            self.misses += sum(v is None for v in out)
+        return out
+
+    def _allocate(self, n: int) -> list[int]:
+        # read in the write transaction: the file is shared with other processes (e.g.,
+        # embedding workers, other app instances), which may have taken slots
+        (n_used,) = self._conn.execute(
+            "SELECT COALESCE(MAX(slot) + 1, 0) FROM entries"
+        ).fetchone()
+        free = list(range(n_used, min(n_used + n, self.capacity)))
+        if len(free) < n:
+            evicted = self._conn.execute(
+                "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?",
+                (n - len(free),),
+            ).fetchall()
+            self._conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(k,) for k, _ in evicted]
+            )
+            self.evictions += len(evicted)
+            free += [slot for _, slot in evicted]
+        return free
+
+    def put_many(self, texts: list[str], vectors: np.ndarray) -> None:
+        """
+        Stores the dense vectors of the given texts, evicting the least recently used ones if full.
+
+        Args:
+            texts (list[str]): The embedded texts.
+            vectors (np.ndarray): The matrix of their vectors, one row per text.
+        """
+        new = {k: v for k, v in zip(self._keys(texts), vectors)}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (k,) in self._select("key", list(new)):
+                    new.pop(k)
+                # the most recent vectors are kept if they do not all fit
+                items = list(new.items())[-self.capacity :]
+                if items:
+                    slots = self._allocate(len(items))
+                    for slot, (_, vector) in zip(slots, items):
+                        self._data[slot] = vector
+                    self._data.flush()
+
+                    now = time.time()
+                    self._conn.executemany(
+                        "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                        [(k, slot, now) for slot, (k, _) in zip(slots, items)],
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+
+class SparseVectorCache(_VectorCache):
+    def __init__(self, folder: str, model_name: str, max_size_mb: float):
+        """
+        Initializes an on-disk cache of sparse vectors.
+
+        Each vector is stored as two compact blobs (uint32 indices, float32 values).
+
+        Args:
+            folder (str): The directory where the cache files are stored.
+            model_name (str): The name of the model whose embeddings are cached.
+            max_size_mb (float): The maximum size of the stored blobs, in MB.
+        """
+        super().__init__(folder, model_name, kind="sparse")
+        self.max_size = int(max_size_mb * 2**20)
+
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, indices BLOB, vals BLOB, nbytes INTEGER, last_used REAL)"
+        )
+        self._conn.commit()
+        (self._size,) = self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM entries"
+        ).fetchone()
+
+    def get_many(self, texts: list[str]) -> list[Optional[dict[str, list]]]:
+        """
+        Looks up the sparse vectors of the given texts.
+
+        Args:
+            texts (list[str]): The texts to look up.
+
+        Returns:
+            list[Optional[dict[str, list]]]: The cached indices and values of each text, or None on a miss.
+        """
+        keys = self._keys(texts)
+        with self._lock:
+            rows = {
+                k: {
+                    "indices": np.frombuffer(ind, dtype=np.uint32).tolist(),
+                    "values": np.frombuffer(val, dtype=np.float32).tolist(),
+                }
+                for k, ind, val in self._select("key, indices, vals", keys)
+            }
+            self._touch(list(rows))
+            self._conn.commit()
+            out = [rows.get(k) for k in keys]
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        return out
+
+    def put_many(self, texts: list[str], vectors: list[dict[str, list]]) -> None:
+        """
+        Stores the sparse vectors of the given texts, evicting the least recently used ones if full.
+
+        Args:
+            texts (list[str]): The embedded texts.
+            vectors (list[dict[str, list]]): Their sparse vectors, as indices and values.
+        """
+        now = time.time()
+        records = []
+        for k, vector in zip(self._keys(texts), vectors):
+            ind = np.asarray(vector["indices"], dtype=np.uint32).tobytes()
+            val = np.asarray(vector["values"], dtype=np.float32).tobytes()
+            records.append((k, ind, val, len(ind) + len(val), now))
+
+        with self._lock:
+            for record in records:
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO entries (key, indices, vals, nbytes, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    record,
+                )
+                self._size += record[3] * cur.rowcount
+
+            if self._size > self.max_size:
+                # the file is shared with other processes (e.g., embedding workers, other
+                # app instances), which may have added or evicted entries
+                (self._size,) = self._conn.execute(
+                    "SELECT COALESCE(SUM(nbytes), 0) FROM entries"
+                ).fetchone()
+            while self._size > self.max_size:
+                evicted = []
+                for k, nbytes in self._conn.execute(
+                    "SELECT key, nbytes FROM entries ORDER BY last_used LIMIT 256"
+                ).fetchall():
+                    if self._size <= self.max_size:
+                        break
+                    evicted.append((k,))
+                    self._size -= nbytes
+                if not evicted:
+                    break
+                self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+                self.evictions += len(evicted)
+            self._conn.commit()
+
+
+@lru_cache(maxsize=None)
+def get_dense_cache(model_name: str, dim: int) -> Optional[DenseVectorCache]:
+    """
+    Returns the dense vector cache of a model, as set in the config file.
+
+    Args:
+        model_name (str): The name of the model whose embeddings are cached.
+        dim (int): The dimension of the dense vectors.
+
+    Returns:
+        Optional[DenseVectorCache]: The cache, or None if caching is disabled.
+    """
+    cache_config = dct_config["EMB_CACHE"]
+    if not cache_config["ENABLED"]:
+        return None
+    return DenseVectorCache(
+        cache_config["PATH_TO_FOLDER"],
+        model_name,
+        dim=dim,
+        max_size_mb=cache_config["DENSE_MAX_SIZE_MB"],
+    )
+
+
+@lru_cache(maxsize=None)
+def get_sparse_cache(model_name: str) -> Optional[SparseVectorCache]:
+    """
+    Returns the sparse vector cache of a model, as set in the config file.
+
+    Args:
+        model_name (str): The name of the model whose embeddings are cached.
+
+    Returns:
+        Optional[SparseVectorCache]: The cache, or None if caching is disabled.
+    """
+    cache_config = dct_config["EMB_CACHE"]
+    if not cache_config["ENABLED"]:
+        return None
+    return SparseVectorCache(
+        cache_config["PATH_TO_FOLDER"],
+        model_name,
+        max_size_mb=cache_config["SPARSE_MAX_SIZE_MB"],
+    )
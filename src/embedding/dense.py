@@ -1,16 +1,149 @@
-from sentence_transformers import SentenceTransformer
+import json
+import os
+from typing import TYPE_CHECKING, Optional
 
+import numpy as np
+
+from embedding.cache import DenseVectorCache, get_dense_cache
+from embedding.quantization import quantize_linear_layers
+from utility.lazy import LazySingleton
 from utility.read_config import get_config_from_path
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+    from transformers import PreTrainedTokenizerBase
+
 dct_config = get_config_from_path("config.yaml")
 
-encoder = SentenceTransformer(dct_config["PRE_TRAINED_EMB"]["DENSE_MODEL_NAME"])
-EMB_DIM = encoder.get_sentence_embedding_dimension()
+MODEL_NAME = dct_config["PRE_TRAINED_EMB"]["DENSE_MODEL_NAME"]
+BATCH_SIZE = dct_config["PRE_TRAINED_EMB"]["DENSE_BATCH_SIZE"]
+QUANTIZE_INT8 = dct_config["PRE_TRAINED_EMB"]["QUANTIZE_INT8"]
+
+
+def load_encoder(quantize_int8: bool = QUANTIZE_INT8) -> "SentenceTransformer":
+    """
+    Loads the dense encoder.
+
+    Args:
+        quantize_int8 (bool): Whether to apply dynamic int8 quantization to the linear layers.
+
+    Returns:
+        SentenceTransformer: The dense encoder.
+    """
+    # imported here: loading sentence_transformers (and torch) is slow
+    from sentence_transformers import SentenceTransformer
+
+    encoder = SentenceTransformer(MODEL_NAME, device="cpu")
+    encoder.eval()
+    return quantize_linear_layers(encoder) if quantize_int8 else encoder
+
+
+def _model_path() -> str:
+    # as in SentenceTransformer, short hub names belong to the sentence-transformers organization
+    if "/" in MODEL_NAME or os.path.exists(MODEL_NAME):
+        return MODEL_NAME
+    return f"sentence-transformers/{MODEL_NAME}"
+
+
+def load_tokenizer() -> tuple["PreTrainedTokenizerBase", int]:
+    """
+    Loads the tokenizer of the dense encoder and its max input length, without the encoder.
+
+    Returns:
+        tuple: The tokenizer of the dense encoder and its max number of tokens (special tokens included).
+    """
+    from transformers import AutoTokenizer
+    from transformers.utils import cached_file
+
+    tokenizer = AutoTokenizer.from_pretrained(_model_path())
+    config_path = cached_file(
+        _model_path(),
+        "sentence_bert_config.json",
+        _raise_exceptions_for_missing_entries=False,
+    )
+    max_seq_length = None
+    if config_path is not None:
+        with open(config_path, "r", encoding="utf-8") as file:
+            max_seq_length = json.load(file).get("max_seq_length")
+    return tokenizer, max_seq_length or tokenizer.model_max_length
+
+
+_encoder = LazySingleton(load_encoder)
+_tokenizer = LazySingleton(load_tokenizer)
+# the dimension of the dense vectors, once known (e.g., from the encoder of a worker process)
+_emb_dim: Optional[int] = None
+
+
+def get_encoder() -> "SentenceTransformer":
+    """
+    Returns the dense encoder, loading it on first use.
+
+    Returns:
+        SentenceTransformer: The dense encoder.
+    """
+    return _encoder.get()
+
+
+def get_tokenizer() -> tuple["PreTrainedTokenizerBase", int]:
+    """
+    Returns the tokenizer of the dense encoder and its max input length, loading them on first use
+    (without the encoder, unless the encoder is already loaded).
+
+    Returns:
+        tuple: The tokenizer of the dense encoder and its max number of tokens (special tokens included).
+    """
+    if _encoder.is_loaded:
+        encoder = _encoder.get()
+        return encoder.tokenizer, encoder.max_seq_length
+    return _tokenizer.get()
+
+
+def get_emb_dim() -> int:
+    """
+    Returns the dimension of the dense vectors, loading the encoder if it is not known yet.
+
+    Returns:
+        int: The embedding dimension of the dense encoder.
+    """
+    global _emb_dim
+    if _emb_dim is None:
+        _emb_dim = get_encoder().get_sentence_embedding_dimension()
+    return _emb_dim
+
+
+def set_emb_dim(dim: int) -> None:
+    """
+    Records the dimension of the dense vectors, computed by an encoder loaded elsewhere
+    (e.g., in a worker process), so that the encoder is not loaded here to get it.
+
+    Args:
+        dim (int): The embedding dimension of the dense encoder.
+    """
+    global _emb_dim
+    _emb_dim = dim
+
+
+def get_cache() -> Optional[DenseVectorCache]:
+    """
+    Returns the embedding cache of the dense encoder.
+
+    Returns:
+        Optional[DenseVectorCache]: The cache, or None if caching is disabled.
+    """
+    # quantized vectors differ from the fp32 ones, so they are cached apart
+    cache_name = f"{MODEL_NAME}:int8" if QUANTIZE_INT8 else MODEL_NAME
+    return get_dense_cache(cache_name, get_emb_dim())
+
+
+def warmup() -> None:
+    """Loads the dense encoder, so that the first call to embed texts is not slowed down."""
+    get_encoder()
 
 
 def compute_dense_vector(query_text: str) -> list[float]:
     """
     Computes a dense vector representation of the given query text.
+    Queries are not stored in the embedding cache, which keeps the vectors of the documents.
 
     Args:
         query_text (str): The input text to convert into a dense vector.
@@ -18,4 +151,73 @@ def compute_dense_vector(query_text: str) -> list[float]:
     Returns:
         list[float]: A list representing the dense vector of the input text.
     """
-    return encoder.encode(query_text, show_progress_bar=False).tolist()
+    return compute_dense_vectors([query_text], use_cache=False)[0].tolist()
+
+
+def encode_with(
+    encoder: "SentenceTransformer", texts: list[str], batch_size: int = BATCH_SIZE
+) -> np.ndarray:
+    """
+    Encodes texts with the given encoder in length-sorted batches, returning their vectors in input order.
+
+    Args:
+        encoder (SentenceTransformer): The dense encoder.
+        texts (list[str]): The input texts to convert into dense vectors.
+        batch_size (int): The number of texts encoded together in a single forward pass.
+
+    Returns:
+        np.ndarray: A float32 matrix of shape (len(texts), embedding dimension).
+    """
+    dim = encoder.get_sentence_embedding_dimension()
+    if len(texts) == 0:
+        return np.empty((0, dim), dtype=np.float32)
+
+    order = np.argsort([-len(t) for t in texts], kind="stable")
+    embeddings = encoder.encode(
+        [texts[i] for i in order],
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    out[order] = embeddings
+    return out
+
+
+def compute_dense_vectors(
+    texts: list[str], batch_size: int = BATCH_SIZE, use_cache: bool = True
+) -> np.ndarray:
+    """
+    Computes the dense vector representations of many texts in batches.
+
+    Texts are sorted by length before encoding, so that each batch holds texts of
+    similar size and little compute is wasted on padding; the output keeps the input order.
+    Vectors found in the embedding cache are not recomputed.
+
+    Args:
+        texts (list[str]): The input texts to convert into dense vectors.
+        batch_size (int): The number of texts encoded together in a single forward pass.
+        use_cache (bool): Whether to look up and store the vectors in the embedding cache.
+
+    Returns:
+        np.ndarray: A contiguous float32 matrix of shape (len(texts), embedding dimension).
+    """
+    cache = get_cache() if use_cache else None
+    if cache is None or len(texts) == 0:
+        return encode_with(get_encoder(), texts, batch_size)
+
+    out = np.empty((len(texts), cache.dim), dtype=np.float32)
+    missing = []
+    for i, vector in enumerate(cache.get_many(texts)):
+        if vector is None:
+            missing.append(i)
+        else:
+            out[i] = vector
+
+    if len(missing) > 0:
+        missing_texts = [texts[i] for i in missing]
+        computed = encode_with(get_encoder(), missing_texts, batch_size)
+        cache.put_many(missing_texts, computed)
+        out[missing] = computed
+    return out
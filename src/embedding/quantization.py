@@ -0,0 +1,26 @@
+from typing import TYPE_CHECKING, TypeVar
+
+if TYPE_CHECKING:
+    import torch
+
+ModuleT = TypeVar("ModuleT", bound="torch.nn.Module")
+
+
+def quantize_linear_layers(model: ModuleT) -> ModuleT:
+    """
+    Applies dynamic int8 quantization to the linear layers of a model, in place.
+
+    Weights are stored as int8 and activations are quantized on the fly, which speeds
+    up CPU inference of transformer encoders and shrinks their memory footprint.
+
+    Args:
+        model (torch.nn.Module): The model to quantize, in eval mode.
+
+    Returns:
+        torch.nn.Module: The quantized model (the same object).
+    """
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
@@ -1,55 +1,478 @@
-import torch
-from transformers import AutoModelForMaskedLM, AutoTokenizer
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
 
+import numpy as np
+
+from embedding.bm25 import BM25Encoder
+from embedding.cache import SparseVectorCache, get_sparse_cache
+from embedding.quantization import quantize_linear_layers
+from utility.lazy import LazySingleton
 from utility.read_config import get_config_from_path
 
+if TYPE_CHECKING:
+    import torch
+    from transformers import BatchEncoding, PreTrainedModel, PreTrainedTokenizerBase
+
 dct_config = get_config_from_path("config.yaml")
 
-tokenizer = AutoTokenizer.from_pretrained(
-    dct_config["PRE_TRAINED_EMB"]["SPARSE_MODEL_NAME"],
-    clean_up_tokenization_spaces=True,
-)
-model = AutoModelForMaskedLM.from_pretrained(
-    dct_config["PRE_TRAINED_EMB"]["SPARSE_MODEL_NAME"],
-)
+BACKEND = dct_config["PRE_TRAINED_EMB"]["SPARSE_BACKEND"]
+MODEL_NAME = dct_config["PRE_TRAINED_EMB"]["SPARSE_MODEL_NAME"]
+BM25_CONFIG = dct_config["PRE_TRAINED_EMB"]["BM25"]
+COLLECTION_NAME = dct_config["VECTOR_DB"]["COLLECTION_NAME"]
+BATCH_SIZE = dct_config["PRE_TRAINED_EMB"]["SPARSE_BATCH_SIZE"]
+QUANTIZE_INT8 = dct_config["PRE_TRAINED_EMB"]["QUANTIZE_INT8"]
+PRUNING = dct_config["PRE_TRAINED_EMB"]["SPARSE_PRUNING"]
+SLIDING_WINDOW = dct_config["PRE_TRAINED_EMB"]["SPARSE_SLIDING_WINDOW"]
+WINDOW_OVERLAP = dct_config["PRE_TRAINED_EMB"]["SPARSE_WINDOW_OVERLAP"]
+MAX_LENGTH = 512
 
 
-# TODO: this implementation is just a placeholder, to be modified! watch out for the max len param!
-def __compute_vector(text) -> tuple[torch.Tensor, dict]:
+def load_tokenizer() -> "PreTrainedTokenizerBase":
     """
-    Computes a vector from the given text using the model and tokenizer.
-    Taken from Qdrant documentation: https://qdrant.tech/articles/sparse-vectors/
+    Loads the tokenizer of the sparse encoder.
+
+    Returns:
+        PreTrainedTokenizerBase: The tokenizer of the sparse encoder.
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(
+        MODEL_NAME,
+        clean_up_tokenization_spaces=True,
+    )
+
+
+def load_model(
+    quantize_int8: bool = QUANTIZE_INT8,
+) -> tuple["PreTrainedTokenizerBase", "PreTrainedModel"]:
+    """
+    Loads the sparse encoder and its tokenizer.
 
     Args:
-    text (str): The input text to compute the vector for.
+        quantize_int8 (bool): Whether to apply dynamic int8 quantization to the linear layers.
 
     Returns:
         tuple: A tuple containing:
-            - torch.Tensor: The computed vector.
-            - dict: The tokens used for the computation.
+            - PreTrainedTokenizerBase: The tokenizer of the sparse encoder.
+            - PreTrainedModel: The sparse encoder (a masked language model).
+    """
+    # imported here: loading transformers (and torch) is slow
+    from transformers import AutoModelForMaskedLM
+
+    tokenizer = load_tokenizer()
+    model = AutoModelForMaskedLM.from_pretrained(
+        MODEL_NAME,
+    )
+    model.eval()
+    return tokenizer, quantize_linear_layers(model) if quantize_int8 else model
+
+
+_model = LazySingleton(load_model)
+_tokenizer = LazySingleton(load_tokenizer)
+
+
+_bm25_encoders: dict[str, BM25Encoder] = {}
+_bm25_lock = threading.Lock()
+
+
+def get_bm25_encoder(coll_name: str = COLLECTION_NAME) -> BM25Encoder:
+    """
+    Returns the BM25 encoder of a collection, loading its persisted statistics on first use.
+
+    Args:
+        coll_name (str): The name of the collection whose corpus statistics are used.
+
+    Returns:
+        BM25Encoder: The BM25 encoder.
+    """
+    with _bm25_lock:
+        if coll_name not in _bm25_encoders:
+            _bm25_encoders[coll_name] = BM25Encoder(
+                os.path.join(BM25_CONFIG["PATH_TO_FOLDER"], f"{coll_name}.sqlite"),
+                k1=BM25_CONFIG["K1"],
+                b=BM25_CONFIG["B"],
+            )
+        return _bm25_encoders[coll_name]
+
+
+def drop_bm25_encoder(coll_name: str) -> None:
+    """
+    Closes the BM25 encoder of a collection and deletes its corpus statistics
+    (e.g., those of a throwaway collection).
+
+    Args:
+        coll_name (str): The name of the collection.
+    """
+    with _bm25_lock:
+        encoder = _bm25_encoders.pop(coll_name, None)
+    path = os.path.join(BM25_CONFIG["PATH_TO_FOLDER"], f"{coll_name}.sqlite")
+    if encoder is not None:
+        encoder.close()
+        path = encoder.path
+    for a_path in [path, path + "-wal", path + "-shm"]:
+        if os.path.exists(a_path):
+            os.remove(a_path)
+
+
+def get_corpus_stats(coll_name: str) -> Optional[BM25Encoder]:
+    """
+    Returns the encoder holding the corpus statistics of a collection, if the sparse vectors depend on them.
+
+    Args:
+        coll_name (str): The name of the collection.
+
+    Returns:
+        Optional[BM25Encoder]: The BM25 encoder, or None if the backend is not BM25.
+    """
+    return get_bm25_encoder(coll_name) if BACKEND == "bm25" else None
+
+
+def get_tokenizer() -> "PreTrainedTokenizerBase":
+    """
+    Returns the tokenizer of the sparse encoder, loading it on first use
+    (without the encoder, unless the encoder is already loaded).
+
+    Returns:
+        PreTrainedTokenizerBase: The tokenizer of the sparse encoder.
+    """
+    if _model.is_loaded:
+        return _model.get()[0]
+    return _tokenizer.get()
+
+
+def get_model() -> "PreTrainedModel":
+    """
+    Returns the sparse encoder (a masked language model), loading it on first use.
+
+    Returns:
+        PreTrainedModel: The sparse encoder.
+    """
+    return _model.get()[1]
+
+
+def get_cache() -> Optional[SparseVectorCache]:
+    """
+    Returns the embedding cache of the sparse encoder.
+
+    Returns:
+        Optional[SparseVectorCache]: The cache, or None if caching is disabled or the backend is BM25.
+    """
+    if BACKEND == "bm25":
+        # BM25 is cheap, and its weights change with the corpus statistics
+        return None
+    # vectors of quantized models, or of windowed long texts, are cached apart
+    cache_name = MODEL_NAME + (":int8" if QUANTIZE_INT8 else "")
+    cache_name += f":window{WINDOW_OVERLAP}" if SLIDING_WINDOW else ""
+    return get_sparse_cache(cache_name)
+
+
+def warmup() -> None:
+    """Loads the sparse encoder, so that the first call to embed texts is not slowed down."""
+    if BACKEND == "bm25":
+        get_bm25_encoder()
+    else:
+        _model.get()
+
+
+def _compute_vectors(
+    model: "PreTrainedModel", tokens: dict[str, "torch.Tensor"]
+) -> "torch.Tensor":
+    """
+    Computes the SPLADE vectors of a batch of tokenized texts using the model.
+    Taken from Qdrant documentation: https://qdrant.tech/articles/sparse-vectors/
+
+    Args:
+        model (PreTrainedModel): The sparse encoder.
+        tokens (dict[str, torch.Tensor]): The padded tokens of the texts.
+
+    Returns:
+        torch.Tensor: The computed vectors, with shape (batch size, vocabulary size).
+    """
+    import torch
+
+    with torch.inference_mode():
+        logits = model(**tokens).logits
+        relu_log = torch.log1p(torch.relu(logits))
+        weighted_log = relu_log * tokens["attention_mask"].unsqueeze(-1)
+        vecs, _ = torch.max(weighted_log, dim=1)
+
+    return vecs
+
+
+def _to_csr(vecs: "torch.Tensor") -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Extracts the non-zero entries of a batch of dense vectors in one vectorized step.
+
+    Args:
+        vecs (torch.Tensor): A 2D tensor with one vector per row.
+
+    Returns:
+        tuple: A CSR-style triple containing:
+            - np.ndarray: The row pointers, of length vecs.shape[0] + 1.
+            - np.ndarray: The column indices of the non-zero entries.
+            - np.ndarray: The values of the non-zero entries.
+    """
+    import torch
+
+    rows, cols = vecs.nonzero(as_tuple=True)
+    values = vecs[rows, cols]
+    counts = torch.bincount(rows, minlength=vecs.shape[0])
+
+    indptr = np.zeros(vecs.shape[0] + 1, dtype=np.int64)
+    np.cumsum(counts.numpy(), out=indptr[1:])
+    return indptr, cols.numpy(), values.float().numpy()
+
+
+def _pad(
+    encodings: "BatchEncoding", ids: np.ndarray, pad_token_id: int
+) -> dict[str, "torch.Tensor"]:
     """
-    tokens = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-    output = model(**tokens)
-    logits, attention_mask = output.logits, tokens.attention_mask
-    relu_log = torch.log(1 + torch.relu(logits))
-    weighted_log = relu_log * attention_mask.unsqueeze(-1)
-    max_val, _ = torch.max(weighted_log, dim=1)
-    vec = max_val.squeeze()
+    Gathers and right-pads the given tokenized sequences into tensors.
+
+    Args:
+        encodings (BatchEncoding): The unpadded tokenized sequences.
+        ids (np.ndarray): The positions of the sequences to gather.
+        pad_token_id (int): The id of the padding token.
 
-    return vec, tokens
+    Returns:
+        dict[str, torch.Tensor]: The padded input ids, attention mask and token type ids.
+    """
+    import torch
+
+    max_len = max(len(encodings["input_ids"][i]) for i in ids)
+    out = {}
+    for key in ["input_ids", "attention_mask", "token_type_ids"]:
+        if key not in encodings:
+            continue
+        mat = np.full(
+            (len(ids), max_len), pad_token_id if key == "input_ids" else 0, np.int64
+        )
+        for row, i in enumerate(ids):
+            mat[row, : len(encodings[key][i])] = encodings[key][i]
+        out[key] = torch.from_numpy(mat)
+    return out
 
 
-def compute_sparse_vector(query_text: str) -> dict[str, list[float]]:
+def _max_pool(windows: list[tuple[np.ndarray, np.ndarray]]) -> dict[str, list]:
+    """
+    Merges the sparse vectors of the windows of a text, keeping the max weight of each term.
+
+    Args:
+        windows (list[tuple[np.ndarray, np.ndarray]]): The indices and values of each window.
+
+    Returns:
+        dict[str, list]: The indices and values of the merged sparse vector.
+    """
+    if len(windows) == 1:
+        indices, values = windows[0]
+    else:
+        indices = np.concatenate([ind for ind, _ in windows])
+        values = np.concatenate([val for _, val in windows])
+        # sorted by index, then by decreasing value: the first of each index is the max
+        order = np.lexsort((-values, indices))
+        indices, values = indices[order], values[order]
+        first = np.r_[True, indices[1:] != indices[:-1]]
+        indices, values = indices[first], values[first]
+    return {"indices": indices.tolist(), "values": values.tolist()}
+
+
+def encode_with(
+    tokenizer: "PreTrainedTokenizerBase",
+    model: "PreTrainedModel",
+    texts: list[str],
+    batch_size: int = BATCH_SIZE,
+    sliding_window: bool = SLIDING_WINDOW,
+    window_overlap: int = WINDOW_OVERLAP,
+) -> list[dict[str, list]]:
+    """
+    Encodes texts with the given encoder in batches bucketed by token length, returning their vectors in input order.
+
+    Texts longer than the model max length are either truncated or, with the sliding
+    window, split into overlapping windows: the windows of all texts are encoded
+    together, then the vectors of the windows of each text are max-pooled.
+
+    Args:
+        tokenizer (PreTrainedTokenizerBase): The tokenizer of the sparse encoder.
+        model (PreTrainedModel): The sparse encoder.
+        texts (list[str]): The texts to be converted into sparse vectors.
+        batch_size (int): The number of texts (or windows) encoded together in a single forward pass.
+        sliding_window (bool): Whether to encode long texts in windows instead of truncating them.
+        window_overlap (int): The number of tokens shared by consecutive windows.
+
+    Returns:
+        list[dict[str, list]]: One dictionary per text containing the sparse vector indices and values.
+    """
+    if len(texts) == 0:
+        return []
+
+    encodings = tokenizer(
+        texts,
+        truncation=True,
+        max_length=MAX_LENGTH,
+        return_overflowing_tokens=sliding_window,
+        stride=window_overlap if sliding_window else 0,
+    )
+    if sliding_window:
+        text_ids = np.asarray(encodings.pop("overflow_to_sample_mapping"))
+    else:
+        text_ids = np.arange(len(texts))
+    order = np.argsort([-len(ids) for ids in encodings["input_ids"]], kind="stable")
+
+    windows: list[list[tuple[np.ndarray, np.ndarray]]] = [[] for _ in texts]
+    for start in range(0, len(order), batch_size):
+        batch_ids = order[start : start + batch_size]
+        tokens = _pad(encodings, batch_ids, tokenizer.pad_token_id)
+        indptr, indices, values = _to_csr(_compute_vectors(model, tokens))
+        for row, window_id in enumerate(batch_ids):
+            lo, hi = indptr[row], indptr[row + 1]
+            windows[text_ids[window_id]].append((indices[lo:hi], values[lo:hi]))
+    return [_max_pool(text_windows) for text_windows in windows]
+
+
+def prune_sparse_vector(
+    vector: dict[str, list],
+    top_k: Optional[int] = None,
+    min_weight: Optional[float] = None,
+) -> dict[str, list]:
+    """
+    Drops the least informative terms of a sparse vector.
+
+    Args:
+        vector (dict[str, list]): The sparse vector indices and values.
+        top_k (Optional[int]): If set, only the top_k terms with the highest weight are kept.
+        min_weight (Optional[float]): If set, only the terms with at least this weight are kept.
+
+    Returns:
+        dict[str, list]: The pruned sparse vector indices and values, in the original order.
+    """
+    values = np.asarray(vector["values"], dtype=np.float32)
+    keep = np.ones(len(values), dtype=bool)
+    if min_weight is not None:
+        keep &= values >= min_weight
+    if top_k is not None and keep.sum() > top_k:
+        candidates = np.flatnonzero(keep)
+        top = np.argpartition(-values[candidates], top_k - 1)[:top_k]
+        keep[:] = False
+        keep[candidates[top]] = True
+    if keep.all():
+        return vector
+
+    indices = np.asarray(vector["indices"])
+    return {"indices": indices[keep].tolist(), "values": values[keep].tolist()}
+
+
+def _compute_cached(
+    texts: list[str],
+    batch_size: int,
+    use_cache: bool,
+    source_ids: Optional[list[str]],
+    coll_name: str,
+) -> list[dict[str, list]]:
+    if BACKEND == "bm25":
+        return get_bm25_encoder(coll_name).encode_documents(texts, source_ids)
+
+    cache = get_cache() if use_cache else None
+    if cache is None or len(texts) == 0:
+        return encode_with(*_model.get(), texts, batch_size)
+
+    out = cache.get_many(texts)
+    missing = [i for i, vector in enumerate(out) if vector is None]
+    if len(missing) > 0:
+        missing_texts = [texts[i] for i in missing]
+        computed = encode_with(*_model.get(), missing_texts, batch_size)
+        cache.put_many(missing_texts, computed)
+        for i, vector in zip(missing, computed):
+            out[i] = vector
+    return out
+
+
+def compute_sparse_vectors(
+    texts: list[str],
+    batch_size: int = BATCH_SIZE,
+    use_cache: bool = True,
+    top_k: Optional[int] = PRUNING["DOC_TOP_K"],
+    min_weight: Optional[float] = PRUNING["DOC_MIN_WEIGHT"],
+    source_ids: Optional[list[str]] = None,
+    coll_name: str = COLLECTION_NAME,
+) -> list[dict[str, list]]:
+    """
+    Computes the sparse vector representations of many texts (documents) in batches.
+    With the BM25 backend, the texts are also added to the corpus statistics of the collection.
+
+    Texts are bucketed by token length, so that each batch holds texts of similar size
+    and little compute is wasted on padding; the output keeps the input order.
+    Vectors found in the embedding cache are not recomputed; pruning is applied
+    afterwards, so the cache always holds the full vectors.
+
+    Args:
+        texts (list[str]): The texts to be converted into sparse vectors.
+        batch_size (int): The number of texts encoded together in a single forward pass.
+        use_cache (bool): Whether to look up and store the vectors in the embedding cache.
+        top_k (Optional[int]): If set, max number of terms kept per vector. Defaults to the document setting in the config.
+        min_weight (Optional[float]): If set, min weight of the terms kept. Defaults to the document setting in the config.
+        source_ids (Optional[list[str]]): With the BM25 backend, the source of each text, whose previous
+            texts are replaced in the corpus statistics (see `BM25Encoder.encode_documents`).
+        coll_name (str): With the BM25 backend, the collection the texts are indexed in.
+
+    Returns:
+        list[dict[str, list]]: One dictionary per text containing the sparse vector indices and values.
+    """
+    out = _compute_cached(texts, batch_size, use_cache, source_ids, coll_name)
+    if top_k is None and min_weight is None:
+        return out
+    return [prune_sparse_vector(vector, top_k, min_weight) for vector in out]
+
+
+def compute_sparse_query_vectors(
+    query_texts: list[str],
+    top_k: Optional[int] = PRUNING["QUERY_TOP_K"],
+    min_weight: Optional[float] = PRUNING["QUERY_MIN_WEIGHT"],
+    coll_name: str = COLLECTION_NAME,
+) -> list[dict[str, list]]:
+    """
+    Computes the sparse vector representations of many query texts in batches.
+    Queries are not stored in the embedding cache, which keeps the vectors of the documents,
+    and, with the BM25 backend, are not added to the corpus statistics.
+
+    Args:
+        query_texts (list[str]): The texts to be converted into sparse vectors.
+        top_k (Optional[int]): If set, max number of terms kept per vector. Defaults to the query setting in the config.
+        min_weight (Optional[float]): If set, min weight of the terms kept. Defaults to the query setting in the config.
+        coll_name (str): With the BM25 backend, the collection whose corpus statistics weight the terms.
+
+    Returns:
+        list[dict[str, list]]: One dictionary per query containing the sparse vector indices and values.
+    """
+    if BACKEND == "bm25":
+        encoder = get_bm25_encoder(coll_name)
+        return [
+            prune_sparse_vector(encoder.encode_query(query_text), top_k, min_weight)
+            for query_text in query_texts
+        ]
+    return compute_sparse_vectors(
+        query_texts, use_cache=False, top_k=top_k, min_weight=min_weight
+    )
+
+
+def compute_sparse_vector(
+    query_text: str,
+    top_k: Optional[int] = PRUNING["QUERY_TOP_K"],
+    min_weight: Optional[float] = PRUNING["QUERY_MIN_WEIGHT"],
+    coll_name: str = COLLECTION_NAME,
+) -> dict[str, list[float]]:
     """
     Computes a sparse vector representation of the query text.
 
     Args:
         query_text (str): The text to be converted into a sparse vector.
+        top_k (Optional[int]): If set, max number of terms kept. Defaults to the query setting in the config.
+        min_weight (Optional[float]): If set, min weight of the terms kept. Defaults to the query setting in the config.
+        coll_name (str): With the BM25 backend, the collection whose corpus statistics weight the terms.
 
     Returns:
         dict: A dictionary containing the sparse vector indices and values.
     """
-    q_vec, q_tokens = __compute_vector(query_text)
-    out = {"indices": q_vec.nonzero().numpy().flatten().tolist()}
-    out["values"] = q_vec.detach().numpy()[out["indices"]].tolist()
-    return out
+    return compute_sparse_query_vectors(
+        [query_text], top_k=top_k, min_weight=min_weight, coll_name=coll_name
+    )[0]
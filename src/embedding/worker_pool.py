@@ -0,0 +1,244 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from logging import getLogger
+from typing import Optional
+
+import numpy as np
+
+from embedding import dense, sparse
+from utility.read_config import get_config_from_path
+
+logger = getLogger("ingestion")
+
+dct_config = get_config_from_path("config.yaml")
+
+N_WORKERS = dct_config["EMB_WORKERS"]["N_WORKERS"]
+THREADS_PER_WORKER = dct_config["EMB_WORKERS"]["THREADS_PER_WORKER"]
+SUB_BATCH_SIZE = dct_config["EMB_WORKERS"]["SUB_BATCH_SIZE"]
+
+Embeddings = tuple[np.ndarray, list[dict[str, list]]]
+
+
+def _init_worker(n_threads: int, counter: "mp.Value") -> None:
+    """
+    Pins a worker process to its own cores and loads the encoders.
+
+    Args:
+        n_threads (int): The number of torch intra-op threads of the worker.
+        counter (mp.Value): A shared counter giving each worker a distinct index.
+    """
+    with counter.get_lock():
+        worker_idx = counter.value
+        counter.value += 1
+
+    # set before torch is first imported, so that its thread pools are sized accordingly
+    os.environ["OMP_NUM_THREADS"] = str(n_threads)
+    os.environ["MKL_NUM_THREADS"] = str(n_threads)
+    if hasattr(os, "sched_setaffinity"):
+        # only the CPUs the process may run on (e.g., in a container, or under taskset)
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(
+            0,
+            {cpus[(worker_idx * n_threads + i) % len(cpus)] for i in range(n_threads)},
+        )
+
+    import torch
+
+    torch.set_num_threads(n_threads)
+    dense.warmup()
+    sparse.warmup()
+
+
+def _emb_dim() -> int:
+    return dense.get_emb_dim()
+
+
+def _embed(texts: list[str]) -> tuple[np.ndarray, Optional[list[dict[str, list]]]]:
+    # the cache is handled by the parent process, and pruning is applied after it;
+    # BM25 needs the corpus statistics of the parent process, so it runs there
+    if sparse.BACKEND == "bm25":
+        return dense.compute_dense_vectors(texts, use_cache=False), None
+    return (
+        dense.compute_dense_vectors(texts, use_cache=False),
+        sparse.compute_sparse_vectors(
+            texts, use_cache=False, top_k=None, min_weight=None
+        ),
+    )
+
+
+class PendingEmbeddings:
+    def __init__(
+        self,
+        texts: list[str],
+        dense_vectors: np.ndarray,
+        sparse_vectors: list[Optional[dict[str, list]]],
+        missing: list[int],
+        futures: list[Future],
+        source_ids: Optional[list[str]] = None,
+        coll_name: str = sparse.COLLECTION_NAME,
+    ):
+        """
+        Initializes the handle of the embeddings of a batch of texts being computed by the pool.
+
+        Args:
+            texts (list[str]): The texts being embedded.
+            dense_vectors (np.ndarray): The dense vectors, already filled for the cached texts.
+            sparse_vectors (list[Optional[dict[str, list]]]): The sparse vectors, None for the texts not cached.
+            missing (list[int]): The positions of the texts sent to the workers, in submission order.
+            futures (list[Future]): The futures of the sub-batches sent to the workers.
+            source_ids (Optional[list[str]]): With the BM25 backend, the source of each text.
+            coll_name (str): With the BM25 backend, the collection the texts are indexed in.
+        """
+        self.texts = texts
+        self._dense = dense_vectors
+        self._sparse = sparse_vectors
+        self._missing = missing
+        self._futures = futures
+        self._source_ids = source_ids
+        self._coll_name = coll_name
+
+    def result(self) -> Embeddings:
+        """
+        Waits for the workers, stores the new vectors in the embedding cache and prunes the sparse vectors.
+
+        Returns:
+            Embeddings: The dense vectors as a float32 matrix and the sparse vectors, in input order.
+        """
+        offset = 0
+        for future in self._futures:
+            dense_vectors, sparse_vectors = future.result()
+            positions = self._missing[offset : offset + len(dense_vectors)]
+            offset += len(dense_vectors)
+
+            self._dense[positions] = dense_vectors
+            if sparse_vectors is not None:
+                for i, vector in zip(positions, sparse_vectors):
+                    self._sparse[i] = vector
+
+            new_texts = [self.texts[i] for i in positions]
+            for cache, vectors in [
+                (dense.get_cache(), dense_vectors),
+                (sparse.get_cache(), sparse_vectors),
+            ]:
+                if cache is not None:
+                    cache.put_many(new_texts, vectors)
+
+        if sparse.BACKEND == "bm25":
+            return self._dense, sparse.compute_sparse_vectors(
+                self.texts, source_ids=self._source_ids, coll_name=self._coll_name
+            )
+        return self._dense, [
+            sparse.prune_sparse_vector(
+                vector, sparse.PRUNING["DOC_TOP_K"], sparse.PRUNING["DOC_MIN_WEIGHT"]
+            )
+            for vector in self._sparse
+        ]
+
+
+class EmbeddingWorkerPool:
+    def __init__(
+        self,
+        n_workers: int = N_WORKERS,
+        threads_per_worker: int = THREADS_PER_WORKER,
+        sub_batch_size: int = SUB_BATCH_SIZE,
+    ):
+        """
+        Initializes a pool of processes computing dense and sparse embeddings.
+
+        Each worker loads its own copy of both encoders and runs torch with a fixed
+        number of intra-op threads, pinned (where supported) to as many cores.
+
+        Args:
+            n_workers (int): The number of worker processes.
+            threads_per_worker (int): The number of torch threads of each worker.
+            sub_batch_size (int): The max number of texts sent to a worker at a time.
+        """
+        ctx = mp.get_context("spawn")
+        self.n_workers = n_workers
+        self.sub_batch_size = sub_batch_size
+        self._executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(threads_per_worker, ctx.Value("i", 0)),
+        )
+        # the encoder of the workers gives the dimension, without loading one here
+        dense.set_emb_dim(self._executor.submit(_emb_dim).result())
+        logger.info(
+            f"Embedding pool started: {n_workers} workers, {threads_per_worker} threads each"
+        )
+
+    def submit(
+        self,
+        texts: list[str],
+        source_ids: Optional[list[str]] = None,
+        coll_name: str = sparse.COLLECTION_NAME,
+    ) -> PendingEmbeddings:
+        """
+        Sends the texts which are not in the embedding cache to the workers, without waiting.
+
+        Args:
+            texts (list[str]): The texts to embed.
+            source_ids (Optional[list[str]]): With the BM25 backend, the source of each text
+                (see `embedding.sparse.compute_sparse_vectors`).
+            coll_name (str): With the BM25 backend, the collection the texts are indexed in.
+
+        Returns:
+            PendingEmbeddings: The handle to retrieve the embeddings with.
+        """
+        dense_cache, sparse_cache = dense.get_cache(), sparse.get_cache()
+        cached_dense = (
+            dense_cache.get_many(texts) if dense_cache else [None for _ in texts]
+        )
+        cached_sparse = (
+            sparse_cache.get_many(texts) if sparse_cache else [None for _ in texts]
+        )
+
+        dense_vectors = np.empty((len(texts), dense.get_emb_dim()), dtype=np.float32)
+        missing = []
+        for i, (d_vec, s_vec) in enumerate(zip(cached_dense, cached_sparse)):
+            if d_vec is None or (sparse_cache is not None and s_vec is None):
+                missing.append(i)
+            else:
+                dense_vectors[i] = d_vec
+
+        # spread the work evenly over the workers, within the sub-batch limit
+        step = max(1, min(self.sub_batch_size, -(-len(missing) // self.n_workers)))
+        futures = [
+            self._executor.submit(
+                _embed, [texts[i] for i in missing[start : start + step]]
+            )
+            for start in range(0, len(missing), step)
+        ]
+        return PendingEmbeddings(
+            texts,
+            dense_vectors,
+            cached_sparse,
+            missing,
+            futures,
+            source_ids=source_ids,
+            coll_name=coll_name,
+        )
+
+    def embed(self, texts: list[str]) -> Embeddings:
+        """
+        Computes the dense and sparse embeddings of the texts with the workers.
+
+        Args:
+            texts (list[str]): The texts to embed.
+
+        Returns:
+            Embeddings: The dense vectors as a float32 matrix and the sparse vectors, in input order.
+        """
+        return self.submit(texts).result()
+
+    def close(self) -> None:
+        """Shuts the worker processes down."""
+        self._executor.shutdown()
+
+    def __enter__(self) -> "EmbeddingWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
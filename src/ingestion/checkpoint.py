@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from typing import Any, Optional
+
+from utility.read_config import get_config_from_path
+
+dct_config = get_config_from_path("config.yaml")
+
+STAGES = ["downloaded", "parsed", "embedded", "upserted"]
+
+
+class IngestionCheckpoint:
+    def __init__(self, path: str):
+        """
+        Initializes the durable record of the progress of an ingestion run.
+
+        For each file, the checkpoint records the latest stage it has completed (downloaded,
+        parsed, embedded, upserted: a file has completed the stages before it), together with the parameters and the document list
+        of the run, so that an interrupted run can be resumed where it stopped.
+
+        Args:
+            path (str): The JSON file where the checkpoint is persisted.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.state: dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.state = json.load(file)
+
+    def save(self) -> None:
+        """Persists the checkpoint, atomically and durably."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self.state, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+
+    def start(self, params: dict[str, Any], documents: list[tuple[str, str]]) -> None:
+        """
+        Starts the record of a new run, discarding the previous one.
+
+        Args:
+            params (dict[str, Any]): The parameters identifying the run (e.g., the search keyword).
+            documents (list[tuple[str, str]]): The URLs of the documents of the run and their file names.
+        """
+        with self._lock:
+            self.state = {
+                "params": params,
+                "documents": documents,
+                "completed": False,
+                "files": {},
+            }
+        self.save()
+
+    def is_resumable(self, params: dict[str, Any]) -> bool:
+        """
+        Checks whether the recorded run has been interrupted, with the same parameters.
+
+        Args:
+            params (dict[str, Any]): The parameters of the run to resume.
+
+        Returns:
+            bool: True if the run can be resumed.
+        """
+        return (
+            bool(self.state)
+            and not self.state["completed"]
+            and self.state["params"] == params
+        )
+
+    @property
+    def documents(self) -> list[tuple[str, str]]:
+        """The URLs of the documents of the run and their file names."""
+        return [tuple(doc) for doc in self.state["documents"]]
+
+    def mark(self, source_id: str, stage: str, save: bool = True) -> None:
+        """
+        Records that a file has completed a stage (and the stages before it).
+
+        A stage already passed is not recorded again (e.g., when a resumed run downloads
+        a file which has been upserted), so the record of a file never goes back.
+
+        Args:
+            source_id (str): The identifier of the file (its name).
+            stage (str): The completed stage, one of STAGES.
+            save (bool): Whether to persist the checkpoint right away. Set it to False
+                to record many files, then call `save` once.
+        """
+        with self._lock:
+            if not self._has_done(source_id, stage):
+                self.state["files"][source_id] = stage
+        if save:
+            self.save()
+
+    def _has_done(self, source_id: str, stage: str) -> bool:
+        latest = self.state.get("files", {}).get(source_id)
+        return latest is not None and STAGES.index(latest) >= STAGES.index(stage)
+
+    def is_done(self, source_id: str, stage: str) -> bool:
+        """
+        Checks whether a file has completed a stage.
+
+        Args:
+            source_id (str): The identifier of the file (its name).
+            stage (str): The stage, one of STAGES.
+
+        Returns:
+            bool: True if the file has completed the stage.
+        """
+        with self._lock:
+            return self._has_done(source_id, stage)
+
+    def complete(self) -> None:
+        """Records (and persists) that the run has completed."""
+        with self._lock:
+            self.state["completed"] = True
+        self.save()
+
+
+def get_checkpoint(coll_name: str) -> Optional[IngestionCheckpoint]:
+    """
+    Returns the checkpoint of the ingestion runs of a collection, as set in the config file.
+
+    Args:
+        coll_name (str): The name of the collection.
+
+    Returns:
+        Optional[IngestionCheckpoint]: The checkpoint, or None if checkpoints are disabled.
+    """
+    checkpoint_config = dct_config["INGESTION_PIPELINE"]["CHECKPOINT"]
+    if not checkpoint_config["ENABLED"]:
+        return None
+    return IngestionCheckpoint(
+        os.path.join(checkpoint_config["PATH_TO_FOLDER"], f"{coll_name}.json")
+    )
@@ -0,0 +1,276 @@
+import copy
+import math
+import re
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from embedding import dense, sparse
+from utility.lazy import LazySingleton
+from utility.read_config import get_config_from_path
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizerBase
+
+dct_config = get_config_from_path("config.yaml")
+
+MAX_TOKENS = dct_config["CHUNKING"]["MAX_TOKENS"]
+OVERLAP_TOKENS = dct_config["CHUNKING"]["OVERLAP_TOKENS"]
+
+HEADING_PATTERN = re.compile(r"^#{1,6}[ \t]+(.*?)[ \t#]*$", re.MULTILINE)
+# whitespace after the end of a sentence, or line breaks
+BOUNDARY_PATTERN = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\s*\n\s*")
+
+
+class Chunk:
+    def __init__(self, text: str, start: int, end: int, heading: Optional[str]):
+        """
+        Initializes a chunk of a markdown text.
+
+        Args:
+            text (str): The text of the chunk.
+            start (int): The character offset of the chunk in the markdown text.
+            end (int): The character offset of the end of the chunk (excluded).
+            heading (Optional[str]): The heading of the section the chunk belongs to.
+        """
+        self.text = text
+        self.start = start
+        self.end = end
+        self.heading = heading
+
+
+def _strip_span(text: str, start: int, end: int) -> tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_sections(text: str) -> list[tuple[int, int, Optional[str]]]:
+    # each section starts at its heading line, which is kept in its chunks;
+    # headings directly followed by another one (e.g., the title) are kept with it
+    sections, start, heading, content_start = [], 0, None, 0
+    for match in HEADING_PATTERN.finditer(text):
+        if text[content_start : match.start()].strip():
+            sections.append((start, match.start(), heading))
+            start = match.start()
+        heading, content_start = match.group(1), match.end()
+    sections.append((start, len(text), heading))
+    return sections
+
+
+def _split_segments(text: str, start: int, end: int) -> list[tuple[int, int]]:
+    # sentences, lines (e.g., list items and table rows) and paragraphs
+    segments, pos = [], start
+    for match in BOUNDARY_PATTERN.finditer(text, start, end):
+        segments.append(_strip_span(text, pos, match.start()))
+        pos = match.end()
+    segments.append(_strip_span(text, pos, end))
+    return [(s, e) for s, e in segments if e > s]
+
+
+class TokenChunker:
+    def __init__(
+        self,
+        budgets: list[tuple["PreTrainedTokenizerBase", int]],
+        overlap_tokens: int = OVERLAP_TOKENS,
+    ):
+        """
+        Initializes a chunker sizing the chunks with the tokenizers of the encoders.
+
+        Chunks never cross a markdown heading and are made of whole sentences (or lines),
+        as many as fit the token budget of every encoder; only sentences longer than a
+        budget are cut, at token boundaries. Consecutive chunks of a section share the
+        last sentences of the previous one, within the overlap. Token counts are taken
+        on each sentence, with one tokenizer call per document and encoder.
+
+        Args:
+            budgets (list[tuple[PreTrainedTokenizerBase, int]]): For each encoder, its (fast) tokenizer and
+                the max number of tokens of a chunk, special tokens excluded.
+            overlap_tokens (int): The max number of tokens (of the first tokenizer) shared by consecutive chunks;
+                it may exceed the budget, since a chunk always leaves room for its next sentence.
+
+        Raises:
+            ValueError: If a budget is not positive.
+        """
+        if any(limit < 1 for _, limit in budgets):
+            raise ValueError("The token budget of a chunk must be positive")
+        self.budgets = budgets
+        self.overlap_tokens = overlap_tokens
+        # the same (Rust) tokenizer must not be used by two threads at a time
+        self._lock = threading.Lock()
+
+    def _count_tokens(
+        self, texts: list[str]
+    ) -> tuple[list[list[int]], list[list[tuple[int, int]]]]:
+        with self._lock:
+            first = self.budgets[0][0](
+                texts,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                verbose=False,
+            )
+            counts = [[len(ids) for ids in first["input_ids"]]]
+            for tokenizer, _ in self.budgets[1:]:
+                counts.append(
+                    [
+                        len(ids)
+                        for ids in tokenizer(
+                            texts, add_special_tokens=False, verbose=False
+                        )["input_ids"]
+                    ]
+                )
+        # per segment, the number of tokens of each tokenizer
+        return [list(c) for c in zip(*counts)], first["offset_mapping"]
+
+    def _fit_segments(
+        self,
+        segments: list[tuple[int, int]],
+        counts: list[list[int]],
+        offsets: list[list[tuple[int, int]]],
+    ) -> tuple[list[tuple[int, int]], list[list[int]]]:
+        # cut the segments exceeding a budget into (almost) equal pieces of tokens
+        limits = [limit for _, limit in self.budgets]
+        out_segments, out_counts = [], []
+        for (start, end), seg_counts, seg_offsets in zip(segments, counts, offsets):
+            n_pieces = max(math.ceil(c / lim) for c, lim in zip(seg_counts, limits))
+            if n_pieces <= 1:
+                out_segments.append((start, end))
+                out_counts.append(seg_counts)
+                continue
+            n_tokens = len(seg_offsets)
+            # at least one token per piece
+            step = max(1, math.ceil(n_tokens / n_pieces))
+            for i in range(0, n_tokens, step):
+                piece_offsets = seg_offsets[i : i + step]
+                out_segments.append(
+                    (start + piece_offsets[0][0], start + piece_offsets[-1][1])
+                )
+                # the other tokenizers are assumed to split the piece proportionally
+                out_counts.append(
+                    [math.ceil(c * len(piece_offsets) / n_tokens) for c in seg_counts]
+                )
+        return out_segments, out_counts
+
+    def chunk(self, text: str) -> list[Chunk]:
+        """
+        Chunks a markdown text.
+
+        Args:
+            text (str): The markdown text to be chunked.
+
+        Returns:
+            list[Chunk]: The chunks, with their character offsets and section heading.
+        """
+        sections = [
+            (_split_segments(text, start, end), heading)
+            for start, end, heading in _split_sections(text)
+        ]
+        all_segments = [segment for segments, _ in sections for segment in segments]
+        if not all_segments:
+            return []
+        counts, offsets = self._count_tokens([text[s:e] for s, e in all_segments])
+
+        limits = [limit for _, limit in self.budgets]
+        chunks, i = [], 0
+        for segments, heading in sections:
+            n_segments = len(segments)
+            segments, seg_counts = self._fit_segments(
+                segments,
+                counts[i : i + n_segments],
+                offsets[i : i + n_segments],
+            )
+            i += n_segments
+            current: list[int] = []
+            total = [0 for _ in limits]
+            for j, seg_count in enumerate(seg_counts):
+                if current and any(
+                    t + c > lim for t, c, lim in zip(total, seg_count, limits)
+                ):
+                    chunks.append(self._make_chunk(text, segments, current, heading))
+                    current = self._overlap(current, seg_counts, seg_count, limits)
+                    total = [
+                        sum(seg_counts[k][b] for k in current)
+                        for b in range(len(limits))
+                    ]
+                current.append(j)
+                total = [t + c for t, c in zip(total, seg_count)]
+            if current:
+                chunks.append(self._make_chunk(text, segments, current, heading))
+        return chunks
+
+    def _overlap(
+        self,
+        current: list[int],
+        seg_counts: list[list[int]],
+        next_count: list[int],
+        limits: list[int],
+    ) -> list[int]:
+        # the last segments of the chunk, within the overlap and leaving room for the next one
+        tail: list[int] = []
+        total = list(next_count)
+        for k in reversed(current):
+            total = [t + c for t, c in zip(total, seg_counts[k])]
+            if total[0] - next_count[0] > self.overlap_tokens or any(
+                t > lim for t, lim in zip(total, limits)
+            ):
+                break
+            tail.insert(0, k)
+        return tail
+
+    @staticmethod
+    def _make_chunk(
+        text: str,
+        segments: list[tuple[int, int]],
+        current: list[int],
+        heading: Optional[str],
+    ) -> Chunk:
+        start, end = segments[current[0]][0], segments[current[-1]][1]
+        return Chunk(text[start:end], start, end, heading)
+
+
+def load_chunker(
+    max_tokens: Optional[int] = MAX_TOKENS, overlap_tokens: int = OVERLAP_TOKENS
+) -> TokenChunker:
+    """
+    Builds a chunker matching the input limits of the dense and sparse encoders.
+
+    Args:
+        max_tokens (Optional[int]): The max number of tokens of a chunk, if lower than the encoder limits.
+        overlap_tokens (int): The max number of tokens shared by consecutive chunks.
+
+    Returns:
+        TokenChunker: The chunker.
+    """
+    # the tokenizers only: the encoders may be loaded by embedding workers instead
+    budgets = [dense.get_tokenizer()]
+    if sparse.BACKEND == "splade":
+        budgets.append((sparse.get_tokenizer(), sparse.MAX_LENGTH))
+    # copies: the tokenizers of the encoders are used by the embedding stage at the same time
+    budgets = [
+        (
+            copy.deepcopy(tokenizer),
+            min(
+                limit - tokenizer.num_special_tokens_to_add(),
+                max_tokens or math.inf,
+            ),
+        )
+        for tokenizer, limit in budgets
+    ]
+    return TokenChunker(budgets, overlap_tokens=overlap_tokens)
+
+
+_chunker = LazySingleton(load_chunker)
+
+
+def chunk_markdown(text: str) -> list[Chunk]:
+    """
+    Chunks a markdown text to fit the input of the encoders, as set in the CHUNKING section of the config.
+
+    Args:
+        text (str): The markdown text to be chunked.
+
+    Returns:
+        list[Chunk]: The chunks, with their character offsets and section heading.
+    """
+    return _chunker.get().chunk(text)
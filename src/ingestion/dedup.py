@@ -0,0 +1,318 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from utility.read_config import get_config_from_path
+
+dct_config = get_config_from_path("config.yaml")
+
+# a prime larger than the 32-bit shingle hashes; (a * hash + b) fits in uint64
+_PRIME = np.uint64(4294967311)
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def _lsh_params(num_perm: int, threshold: float) -> tuple[int, int]:
+    # (bands, rows) whose LSH threshold (1 / bands) ** (1 / rows) is closest to the target
+    return min(
+        ((b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0),
+        key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold),
+    )
+
+
+class MinHashDeduplicator:
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 3,
+        seed: int = 0,
+    ):
+        """
+        Initializes a detector of near-duplicate chunks, backed by a persisted index.
+
+        Chunks are represented by the MinHash signature of their word n-grams, and indexed
+        with locality-sensitive hashing (LSH): the signature is split into bands, and two
+        chunks sharing a band are candidates, kept as near-duplicates if the estimated
+        Jaccard similarity of their n-grams reaches the threshold.
+
+        The signatures of the kept chunks of a document are pending until it is committed
+        (once its points are in the collection), so a failed run leaves no signature of
+        chunks which are not indexed. The documents whose chunks have been dropped as
+        duplicates of another one are recorded, to be re-indexed when it is removed.
+
+        Args:
+            path (str): The sqlite file where the signatures are persisted.
+            threshold (float): The min estimated Jaccard similarity of two near-duplicate chunks.
+            num_perm (int): The number of hash functions of the signatures.
+            shingle_size (int): The number of words of the n-grams.
+            seed (int): The seed of the hash functions (signatures depend on it).
+        """
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.n_bands, self.n_rows = _lsh_params(num_perm, threshold)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, num_perm, dtype=np.uint64)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures "
+            "(id INTEGER PRIMARY KEY, source_id TEXT, signature BLOB)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS signatures_source ON signatures (source_id)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands (bucket INTEGER, signature_id INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (bucket)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates (source_id TEXT, original_source_id TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS duplicates_original "
+            "ON duplicates (original_source_id)"
+        )
+        self._conn.commit()
+        # per document not committed yet: the signatures and buckets of its kept chunks,
+        # and the documents its dropped chunks are duplicates of
+        self._pending: dict[str, list[tuple[np.ndarray, list[int]]]] = {}
+        self._pending_duplicates: dict[str, set[str]] = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Computes the MinHash signature of a text.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            np.ndarray: The uint64 signature, of length num_perm.
+        """
+        words = WORD_PATTERN.findall(text.lower())
+        n = self.shingle_size
+        shingles = {
+            " ".join(words[i : i + n]) for i in range(max(1, len(words) - n + 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), np.uint64, len(shingles)
+        )
+        return ((hashes[:, None] * self._a[None, :] + self._b[None, :]) % _PRIME).min(
+            axis=0
+        )
+
+    def _buckets(self, signature: np.ndarray) -> list[int]:
+        # one hash per band, which also depends on the position of the band
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    band.tobytes(), digest_size=8, salt=i.to_bytes(8, "little")
+                ).digest(),
+                "little",
+                signed=True,
+            )
+            for i, band in enumerate(signature.reshape(self.n_bands, self.n_rows))
+        ]
+
+    def _find_original(
+        self, source_id: str, signature: np.ndarray, buckets: list[int]
+    ) -> Optional[str]:
+        # the previous texts of the document are replaced by the new ones
+        candidates = self._conn.execute(
+            "SELECT source_id, signature FROM signatures WHERE source_id != ? AND id IN "
+            "(SELECT signature_id FROM bands "
+            f"WHERE bucket IN ({','.join('?' * len(buckets))}))",
+            [source_id, *buckets],
+        ).fetchall()
+        candidates = [
+            (original, np.frombuffer(blob, dtype=np.uint64))
+            for original, blob in candidates
+        ]
+        # texts of documents being indexed, including the previous texts of this one
+        set_buckets = set(buckets)
+        candidates += [
+            (original, other)
+            for original, entries in self._pending.items()
+            for other, other_buckets in entries
+            if set_buckets.intersection(other_buckets)
+        ]
+        for original, other in candidates:
+            if np.mean(other == signature) >= self.threshold:
+                return original
+        return None
+
+    def filter(self, source_id: str, texts: list[str]) -> list[bool]:
+        """
+        Flags the texts of a document which are near-duplicates of indexed texts (of any other
+        document, or of the same one), or of texts being indexed. The signatures of the other
+        texts are pending until `commit` is called for the document.
+
+        Args:
+            source_id (str): The identifier of the document.
+            texts (list[str]): The texts (e.g., the chunks) of the document.
+
+        Returns:
+            list[bool]: For each text, True if it is to be kept, False if it is a near-duplicate.
+        """
+        signatures = [self.signature(text) for text in texts]
+        keep = []
+        with self._lock:
+            pending = self._pending[source_id] = []
+            duplicates = self._pending_duplicates[source_id] = set()
+            for signature in signatures:
+                buckets = self._buckets(signature)
+                original = self._find_original(source_id, signature, buckets)
+                keep.append(original is None)
+                if original is None:
+                    pending.append((signature, buckets))
+                elif original != source_id:
+                    duplicates.add(original)
+        return keep
+
+    def _delete(self, source_id: str) -> list[str]:
+        # the documents with chunks dropped as duplicates of this one, which are not indexed anymore
+        dependents = [
+            dependent
+            for (dependent,) in self._conn.execute(
+                "SELECT DISTINCT source_id FROM duplicates WHERE original_source_id = ?",
+                (source_id,),
+            ).fetchall()
+        ]
+        self._conn.execute(
+            "DELETE FROM bands WHERE signature_id IN "
+            "(SELECT id FROM signatures WHERE source_id = ?)",
+            (source_id,),
+        )
+        self._conn.execute("DELETE FROM signatures WHERE source_id = ?", (source_id,))
+        self._conn.execute(
+            "DELETE FROM duplicates WHERE source_id = ? OR original_source_id = ?",
+            (source_id, source_id),
+        )
+        return dependents
+
+    def commit(self, source_id: str) -> list[str]:
+        """
+        Replaces the indexed texts of a document with its pending ones (e.g., once its points
+        have been upserted).
+
+        Args:
+            source_id (str): The identifier of the document.
+
+        Returns:
+            list[str]: The other documents with chunks dropped as duplicates of the previous
+                texts of the document, to be re-indexed since these texts may be gone.
+        """
+        with self._lock:
+            pending = self._pending.pop(source_id, [])
+            duplicates = self._pending_duplicates.pop(source_id, set())
+            dependents = self._delete(source_id)
+            for signature, buckets in pending:
+                signature_id = self._conn.execute(
+                    "INSERT INTO signatures (source_id, signature) VALUES (?, ?)",
+                    (source_id, signature.tobytes()),
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO bands (bucket, signature_id) VALUES (?, ?)",
+                    [(bucket, signature_id) for bucket in buckets],
+                )
+            self._conn.executemany(
+                "INSERT INTO duplicates (source_id, original_source_id) VALUES (?, ?)",
+                [(source_id, original) for original in duplicates],
+            )
+            self._conn.commit()
+        return [dependent for dependent in dependents if dependent != source_id]
+
+    def discard(self, source_id: Optional[str] = None) -> list[str]:
+        """
+        Drops the pending texts of a document (e.g., whose upsert failed), or of all the documents.
+
+        Args:
+            source_id (Optional[str]): The identifier of the document. If None, all the pending texts are dropped.
+
+        Returns:
+            list[str]: The documents with chunks dropped as duplicates of the discarded texts,
+                to be re-indexed since these texts are not indexed.
+        """
+        with self._lock:
+            source_ids = list(self._pending) if source_id is None else [source_id]
+            for a_source_id in source_ids:
+                self._pending.pop(a_source_id, None)
+                self._pending_duplicates.pop(a_source_id, None)
+            # pending documents are recorded as duplicates once committed
+            dependents = {
+                dependent
+                for dependent, originals in self._pending_duplicates.items()
+                if originals.intersection(source_ids)
+            }
+            for a_source_id in source_ids:
+                dependents.update(
+                    dependent
+                    for (dependent,) in self._conn.execute(
+                        "SELECT DISTINCT source_id FROM duplicates "
+                        "WHERE original_source_id = ?",
+                        (a_source_id,),
+                    ).fetchall()
+                )
+        return sorted(dependents)
+
+    def remove_source(self, source_id: str) -> list[str]:
+        """
+        Removes the texts of a document (e.g., when it is deleted).
+
+        Args:
+            source_id (str): The identifier of the document.
+
+        Returns:
+            list[str]: The other documents with chunks dropped as duplicates of the document,
+                to be re-indexed since these texts are gone.
+        """
+        with self._lock:
+            self._pending.pop(source_id, None)
+            self._pending_duplicates.pop(source_id, None)
+            dependents = self._delete(source_id)
+            self._conn.commit()
+        return [dependent for dependent in dependents if dependent != source_id]
+
+    def clear(self) -> None:
+        """Removes all the signatures."""
+        with self._lock:
+            self._pending.clear()
+            self._pending_duplicates.clear()
+            self._conn.execute("DELETE FROM bands")
+            self._conn.execute("DELETE FROM signatures")
+            self._conn.execute("DELETE FROM duplicates")
+            self._conn.commit()
+
+
+def get_deduplicator(coll_name: str) -> Optional[MinHashDeduplicator]:
+    """
+    Returns the near-duplicate detector of a collection, as set in the config file.
+
+    Args:
+        coll_name (str): The name of the collection.
+
+    Returns:
+        Optional[MinHashDeduplicator]: The detector, or None if deduplication is disabled.
+    """
+    dedup_config = dct_config["DEDUP"]
+    if not dedup_config["ENABLED"]:
+        return None
+    return MinHashDeduplicator(
+        os.path.join(dedup_config["PATH_TO_FOLDER"], f"{coll_name}.sqlite"),
+        threshold=dedup_config["THRESHOLD"],
+        num_perm=dedup_config["NUM_PERM"],
+        shingle_size=dedup_config["SHINGLE_SIZE"],
+    )
@@ -0,0 +1,155 @@
+import gzip
+import json
+import os
+import threading
+from logging import getLogger
+from typing import Optional
+
+logger = getLogger("ingestion")
+
+INDEX_FILENAME = "_index.json"
+
+
+class DocumentStore:
+    def __init__(self, folder: str):
+        """
+        Initializes a store of downloaded pages, kept gzip-compressed in a folder.
+
+        For each page, the URL and the HTTP validators of the response (ETag and
+        Last-Modified) are recorded in an index, so that the page can be re-fetched with
+        a conditional GET, i.e., downloaded again only if it has changed. Uncompressed
+        pages left in the folder by previous versions are compressed on opening.
+
+        Args:
+            folder (str): The directory where the pages are stored.
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.index_path = os.path.join(folder, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self.index: dict[str, dict[str, Optional[str]]] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                self.index = json.load(file)
+        self._compress_legacy_pages()
+
+    def _compress_legacy_pages(self) -> None:
+        for filename in os.listdir(self.folder):
+            if filename.endswith(".html"):
+                legacy_path = os.path.join(self.folder, filename)
+                if not self.exists(filename):
+                    with open(legacy_path, "r", encoding="utf-8") as file:
+                        self._write(filename, file.read())
+                os.remove(legacy_path)
+                logger.info(f"Compressed into the document store: {filename}")
+
+    def save(self) -> None:
+        """Persists the index, atomically."""
+        tmp_path = self.index_path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self.index, file, indent=1)
+            os.replace(tmp_path, self.index_path)
+
+    def path(self, filename: str) -> str:
+        """
+        Returns the path of a stored page.
+
+        Args:
+            filename (str): The name of the page (e.g., "2401.00001.html").
+
+        Returns:
+            str: The path of the compressed file.
+        """
+        return os.path.join(self.folder, filename + ".gz")
+
+    def exists(self, filename: str) -> bool:
+        """
+        Checks whether a page is stored.
+
+        Args:
+            filename (str): The name of the page.
+
+        Returns:
+            bool: True if the page is stored.
+        """
+        return os.path.exists(self.path(filename))
+
+    def conditional_headers(self, filename: str) -> dict[str, str]:
+        """
+        Returns the headers making a GET of a stored page conditional to its update.
+
+        Args:
+            filename (str): The name of the page.
+
+        Returns:
+            dict[str, str]: The If-None-Match and If-Modified-Since headers, as available.
+        """
+        if not self.exists(filename):
+            return {}
+        with self._lock:
+            entry = self.index.get(filename, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _write(self, filename: str, html_content: str) -> str:
+        file_path = self.path(filename)
+        tmp_path = file_path + ".part"
+        # no name nor timestamp in the header: the same page gives the same bytes
+        with open(tmp_path, "wb") as raw, gzip.GzipFile(
+            filename="", mode="wb", fileobj=raw, mtime=0
+        ) as file:
+            file.write(html_content.encode("utf-8"))
+        os.replace(tmp_path, file_path)
+        return file_path
+
+    def put(
+        self,
+        filename: str,
+        html_content: str,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> str:
+        """
+        Stores (or replaces) a page, atomically, with its HTTP validators.
+
+        Args:
+            filename (str): The name of the page.
+            html_content (str): The HTML content of the page.
+            url (str): The URL the page was downloaded from.
+            etag (Optional[str]): The ETag header of the response.
+            last_modified (Optional[str]): The Last-Modified header of the response.
+
+        Returns:
+            str: The path of the compressed file.
+        """
+        file_path = self._write(filename, html_content)
+        with self._lock:
+            self.index[filename] = {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+        self.save()
+        return file_path
+
+    def retain(self, filenames: set[str]) -> None:
+        """
+        Removes the stored pages which are not in a given set.
+
+        Args:
+            filenames (set[str]): The names of the pages to keep.
+        """
+        for stored_filename in os.listdir(self.folder):
+            filename = stored_filename.removesuffix(".gz")
+            if stored_filename.endswith(".html.gz") and filename not in filenames:
+                os.remove(os.path.join(self.folder, stored_filename))
+                logger.info(f"Removed file: {stored_filename}")
+        with self._lock:
+            self.index = {k: v for k, v in self.index.items() if k in filenames}
+        self.save()
@@ -1,11 +1,26 @@
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from logging import getLogger
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
 
 import arxiv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ingestion.doc_store import DocumentStore
+from ingestion.utils import arxiv_filename
+from utility.read_config import get_config_from_path
 
 logger = getLogger("ingestion")
 
+dct_config = get_config_from_path("config.yaml")
+DOWNLOAD_CONFIG = dct_config["INPUT_DATA"]["DOWNLOAD"]
+
 
 # Function to list paper links from arXiv based on a keyword
 def list_arxiv_links(keyword: str, max_results: int = 10) -> list[str]:
@@ -36,94 +51,270 @@ def list_arxiv_links(keyword: str, max_results: int = 10) -> list[str]:
     return paper_links
 
 
+class HostRateLimiter:
+    def __init__(self, max_requests_per_s: float):
+        """
+        Initializes a rate limiter spacing out the requests sent to each host.
+
+        Args:
+            max_requests_per_s (float): The max number of requests per second sent to a single host.
+        """
+        self.min_interval = 1.0 / max_requests_per_s
+        self._next_slot: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        """
+        Blocks until a request to the host of the URL is allowed.
+
+        Args:
+            url (str): The URL about to be requested.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        time.sleep(slot - now)
+
+
+def create_session(
+    pool_size: int = DOWNLOAD_CONFIG["MAX_CONCURRENCY"],
+    max_retries: int = DOWNLOAD_CONFIG["MAX_RETRIES"],
+    backoff_factor: float = DOWNLOAD_CONFIG["BACKOFF_FACTOR"],
+) -> requests.Session:
+    """
+    Creates an HTTP session with a pool of keep-alive connections and automatic retries.
+
+    Failed connections and 429/5xx responses are retried with exponential backoff
+    (backoff_factor * 2 ** retry seconds), honoring the Retry-After header.
+
+    Args:
+        pool_size (int): The max number of connections kept open per host.
+        max_retries (int): The max number of retries of a request.
+        backoff_factor (float): The base delay of the exponential backoff, in seconds.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 # Function to download HTML from a website and save it to a folder
 def download_html_from_url(
-    url: str, save_dir: str, filename: str = "downloaded_page.html"
-) -> None:
+    url: str,
+    save_dir: str,
+    filename: str = "downloaded_page.html",
+    session: Optional[requests.Session] = None,
+    timeout: float = DOWNLOAD_CONFIG["TIMEOUT_S"],
+    rate_limiter: Optional[HostRateLimiter] = None,
+    store: Optional[DocumentStore] = None,
+    revalidate: bool = DOWNLOAD_CONFIG["REVALIDATE"],
+) -> Optional[str]:
     """
-    Downloads HTML from a given URL and saves it to a specified directory.
+    Downloads HTML from a given URL and saves it, compressed, to a specified directory.
+    A page already saved is re-fetched with a conditional GET, i.e., downloaded again only if it has changed.
 
     Args:
         url (str): The URL of the webpage to download.
         save_dir (str): The directory where the HTML file will be saved.
         filename (str): The name of the file to save the HTML content as.
+        session (Optional[requests.Session]): The session to send the request with. If None, a new one is created.
+        timeout (float): The connect and read timeout of the request, in seconds.
+        rate_limiter (Optional[HostRateLimiter]): If set, the limiter the request waits for.
+        store (Optional[DocumentStore]): The store of the directory. If None, it is opened.
+        revalidate (bool): Whether to re-fetch a page already saved, if changed. If False, it is kept as is.
+
+    Returns:
+        Optional[str]: The path of the saved (gzip-compressed) file, or None if the download failed.
     """
-    # Fetch the webpage
-    response = requests.get(url)
+    if store is None:
+        store = DocumentStore(save_dir)
+    if store.exists(filename) and not revalidate:
+        logger.info(f"File {filename} already exists.")
+        return store.path(filename)
 
-    # Check if the request was successful
-    if response.status_code == 200:
-        logger.info(f"Saving documents in directory: {save_dir}")
+    if rate_limiter is not None:
+        rate_limiter.wait(url)
 
-        # Save the HTML content to the specified folder
-        file_path = os.path.join(save_dir, filename)
+    # Fetch the webpage, unless it is not modified since it was saved
+    try:
+        # a session created here is closed with its connections
+        with nullcontext(session) if session is not None else create_session() as http:
+            response = http.get(
+                url, timeout=timeout, headers=store.conditional_headers(filename)
+            )
+    except requests.RequestException as e:
+        logger.error(f"Failed to download the webpage {url}: {e}")
+        return None
 
-        if os.path.exists(file_path):
-            logger.info(f"File {filename} already exists.")
-        else:
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(response.text)
+    # Check if the request was successful
+    if response.status_code == 304:
+        logger.info(f"File {filename} already exists and is not modified.")
+        return store.path(filename)
+    elif response.status_code == 200:
+        # Save the HTML content to the specified folder, atomically
+        file_path = store.put(
+            filename,
+            response.text,
+            url,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
 
-            logger.info(f"Downloaded and saved: {filename}")
+        logger.info(f"Downloaded and saved: {filename} in directory: {save_dir}")
+        return file_path
     else:
         logger.error(
-            f"Failed to download the webpage. Status code: {response.status_code}"
+            f"Failed to download the webpage {url}. Status code: {response.status_code}"
         )
+        return None
 
 
-def remove_files_by_extension(directory: str, extension: str) -> None:
+def download_many(
+    urls_and_filenames: list[tuple[str, str]],
+    save_dir: str,
+    max_concurrency: int = DOWNLOAD_CONFIG["MAX_CONCURRENCY"],
+    timeout: float = DOWNLOAD_CONFIG["TIMEOUT_S"],
+    max_requests_per_s_per_host: float = DOWNLOAD_CONFIG["MAX_REQUESTS_PER_S_PER_HOST"],
+    max_retries: int = DOWNLOAD_CONFIG["MAX_RETRIES"],
+    backoff_factor: float = DOWNLOAD_CONFIG["BACKOFF_FACTOR"],
+) -> Iterator[str]:
     """
-    Removes files with a specified extension from a directory.
+    Downloads many pages concurrently, sharing one connection pool.
 
     Args:
-        directory (str): The directory to search for files.
-        extension (str): The file extension to match for removal.
+        urls_and_filenames (list[tuple[str, str]]): The URLs to download and the file names to save them as.
+        save_dir (str): The directory where the HTML files will be saved.
+        max_concurrency (int): The max number of downloads in progress at the same time.
+        timeout (float): The connect and read timeout of each request, in seconds.
+        max_requests_per_s_per_host (float): The max number of requests per second sent to a single host.
+        max_retries (int): The max number of retries of a request.
+        backoff_factor (float): The base delay of the exponential backoff of the retries, in seconds.
+
+    Yields:
+        str: The path of each saved file, as soon as its download is completed.
     """
-    for file_name in os.listdir(directory):
-        if file_name.endswith(extension):
-            file_path = os.path.join(directory, file_name)
-            os.remove(file_path)
-            logger.info(f"Removed file: {file_path}")
+    store = DocumentStore(save_dir)
+    rate_limiter = HostRateLimiter(max_requests_per_s_per_host)
+    with create_session(
+        pool_size=max_concurrency,
+        max_retries=max_retries,
+        backoff_factor=backoff_factor,
+    ) as session, ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [
+            executor.submit(
+                download_html_from_url,
+                url,
+                save_dir,
+                filename=filename,
+                session=session,
+                timeout=timeout,
+                rate_limiter=rate_limiter,
+                store=store,
+            )
+            for url, filename in urls_and_filenames
+        ]
+        for future in as_completed(futures):
+            file_path = future.result()
+            if file_path is not None:
+                yield file_path
 
 
-def main_html_download(
-    keyword: str, output_dir: str, is_fresh_start: bool, n_max_docs: int
-) -> None:
+def list_ar5iv_documents(keyword: str, n_max_docs: int) -> list[tuple[str, str]]:
     """
-    Downloads HTML pages from arXiv based on a search keyword.
+    Lists the ar5iv pages of the arXiv papers matching a search keyword.
 
     Args:
         keyword (str): The keyword to search for in arXiv.
-        output_dir (str): The directory where HTML files will be saved.
-        is_fresh_start (bool): Indicates whether to remove pre-existing HTML files.
-        n_max_docs (int): The maximum number of documents to download.
+        n_max_docs (int): The maximum number of documents to list.
+
+    Returns:
+        list[tuple[str, str]]: The URLs of the pages and the file names to save them as.
     """
     # Call the function and list paper links
     arxiv_links = list_arxiv_links(keyword, max_results=n_max_docs)
 
+    # URL of the website to download
+    return [
+        (url.replace("//arxiv.org", "//ar5iv.org"), arxiv_filename(url))
+        for url in arxiv_links
+    ]
+
+
+def iter_html_download(
+    keyword: str,
+    output_dir: str,
+    is_fresh_start: bool,
+    n_max_docs: int,
+    urls_and_filenames: Optional[list[tuple[str, str]]] = None,
+) -> Iterator[str]:
+    """
+    Downloads HTML pages from arXiv based on a search keyword, yielding each file as soon as it is saved.
+    Pages are downloaded concurrently, as set in the INPUT_DATA.DOWNLOAD section of the config.
+
+    Args:
+        keyword (str): The keyword to search for in arXiv.
+        output_dir (str): The directory where HTML files will be saved.
+        is_fresh_start (bool): Indicates whether to remove the pre-existing HTML files which are not
+            among the pages to download (the other ones are kept, and re-fetched only if changed).
+        n_max_docs (int): The maximum number of documents to download.
+        urls_and_filenames (Optional[list[tuple[str, str]]]): If given, the pages to download
+            (e.g., listed by a previous run), instead of searching arXiv.
+
+    Yields:
+        str: The path of each downloaded (or already present) gzip-compressed HTML file.
+    """
+    if urls_and_filenames is None:
+        urls_and_filenames = list_ar5iv_documents(keyword, n_max_docs)
+
     # Create the save directory if it doesn't exist
     logger.info(f"Output directory for html files: {output_dir}")
     os.makedirs(output_dir, exist_ok=True)
     if is_fresh_start:
-        remove_files_by_extension(output_dir, extension=".html")
-
-    # URL of the website to download
-    for url in arxiv_links:
-        url_html = url.replace("//arxiv.org", "//ar5iv.org")
-        # Call the function to download the HTML
-        download_html_from_url(
-            url_html, output_dir, filename=url.split("/")[-1] + ".html"
+        DocumentStore(output_dir).retain(
+            {filename for _, filename in urls_and_filenames}
         )
 
+    yield from download_many(urls_and_filenames, output_dir)
 
-if __name__ == "__main__":
-    from utility.read_config import get_config_from_path
 
+def main_html_download(
+    keyword: str, output_dir: str, is_fresh_start: bool, n_max_docs: int
+) -> list[str]:
+    """
+    Downloads HTML pages from arXiv based on a search keyword.
+
+    Args:
+        keyword (str): The keyword to search for in arXiv.
+        output_dir (str): The directory where HTML files will be saved.
+        is_fresh_start (bool): Indicates whether to remove the pre-existing HTML files which are not
+            among the pages to download.
+        n_max_docs (int): The maximum number of documents to download.
+
+    Returns:
+        list[str]: The paths of the downloaded (or already present) HTML files.
+    """
+    return list(iter_html_download(keyword, output_dir, is_fresh_start, n_max_docs))
+
+
+if __name__ == "__main__":
     logger.setLevel("INFO")
     keyword = "Gamma ray bursts"
 
     # Set the folder to save the downloaded HTML
-    dct_config = get_config_from_path("config.yaml")
     project_save_dir = dct_config["INPUT_DATA"]["PATH_TO_FOLDER"]
     n_max_docs = dct_config["INPUT_DATA"]["N_MAX_DOCS"]
     fresh_start_dwnld = dct_config["INPUT_DATA"]["DOWNLOAD_FRESH_START"]
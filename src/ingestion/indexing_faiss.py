@@ -5,7 +5,8 @@ import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
-from ingestion.utils import chunk_text, convert_html_to_markdown
+from ingestion.chunking import chunk_markdown
+from ingestion.utils import convert_html_to_markdown
 
 
 def save_chunks_to_faiss(chunks: list[str], index_file: str) -> None:
@@ -51,7 +52,7 @@ if __name__ == "__main__":
     markdown_text = convert_html_to_markdown(html_file_path)
 
     # Chunk the Markdown text
-    chunks = chunk_text(markdown_text)
+    chunks = [chunk.text for chunk in chunk_markdown(markdown_text)]
 
     # Save the chunks to FAISS index
     save_chunks_to_faiss(chunks, faiss_index_file)
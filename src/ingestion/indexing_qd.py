@@ -1,61 +1,111 @@
+import itertools
 import os
 from logging import getLogger
-
-from qdrant_client import models
-
-from embedding.dense import compute_dense_vector
-from embedding.sparse import compute_sparse_vector
-from ingestion.utils import chunk_text, convert_html_to_markdown
+from typing import Iterable, Iterator, Optional
+
+from embedding.dense import get_cache as get_dense_cache
+from embedding.sparse import get_cache as get_sparse_cache
+from embedding.sparse import get_corpus_stats
+from embedding.worker_pool import N_WORKERS, EmbeddingWorkerPool
+from ingestion.checkpoint import IngestionCheckpoint
+from ingestion.dedup import get_deduplicator
+from ingestion.manifest import get_manifest
+from ingestion.pipeline import IngestionPipeline
 from ingestion.vdb_wrapper import LoadInVdb
+from retrieval.search_qd import query_cache
 
 logger = getLogger("ingestion")
 
 
+def _iter_folder(html_folder_path: str) -> Iterator[str]:
+    # the folder is listed only once the first file is requested
+    for f in os.listdir(html_folder_path):
+        yield os.path.join(html_folder_path, f)
+
+
 def main_indexing(
-    loader: LoadInVdb, is_fresh_start: bool, html_folder_path: str
+    loader: LoadInVdb,
+    is_fresh_start: bool,
+    html_folder_path: str,
+    html_file_paths: Optional[Iterable[str]] = None,
+    checkpoint: Optional[IngestionCheckpoint] = None,
+    keyword: Optional[str] = None,
 ) -> None:
     """
     Indexes HTML files by converting them to markdown and adding the resulting chunks to the vector database.
+    Files go through the streaming pipeline set in the INGESTION_PIPELINE section of the config; if embedding
+    workers are set, the embeddings are computed by them. If deduplication is set, near-duplicate chunks
+    (of any indexed file) are dropped.
+    If incremental indexing is set in the config, only new or changed files are indexed, and the points
+    of the files no longer in the folder are deleted.
 
     Args:
         loader (LoadInVdb): The LoadInVdb instance used to load data into the vector database.
         is_fresh_start (bool): Indicates whether to start fresh with a new collection.
         html_folder_path (str): The path to the folder containing HTML files to be indexed.
+        html_file_paths (Optional[Iterable[str]]): If given, these files are indexed first, as they are
+            produced (e.g., by `iter_html_download`), then the other files of the folder.
+        checkpoint (Optional[IngestionCheckpoint]): If given, the progress of each file is recorded in it,
+            and the files it records as upserted are skipped.
+        keyword (Optional[str]): The search keyword the files have been downloaded for, recorded in the payloads.
     """
-    loader.setup_collection(is_fresh_start=is_fresh_start)
-
-    for f in os.listdir(html_folder_path):
-        html_file_path = os.path.join(html_folder_path, f)
-        if not html_file_path.endswith(".html"):
-            logger.info(f"Indexing in vect skipped for file: {html_file_path}")
-            continue
-
-        # Convert HTML to markdown
-        markdown_text = convert_html_to_markdown(html_file_path)
-
-        # Chunk the Markdown text
-        chunks = chunk_text(markdown_text)
-
-        # add the chunks to the vector db
-
-        if len(chunks) > 0:
-            logger.info(f"Starting indexing in vect db for: {html_file_path}")
-            # TODO: more informative payloads might be created during ingestion phase
-            loader.add_to_collection(
-                dense_vectors=[
-                    compute_dense_vector(query_text=chunk) for chunk in chunks
-                ],
-                sparse_vectors=[
-                    models.SparseVector(**compute_sparse_vector(query_text=chunk))
-                    for chunk in chunks
-                ],
-                payloads=[{"text": chunk} for chunk in chunks],
-            )
-            logger.info(f"Indexing in vect db ended for: {html_file_path}")
-        else:
-            logger.info(
-                f"Indexing in vect db skipped (no chunks) for: {html_file_path}"
-            )
+    manifest = get_manifest(loader.coll_name)
+    dedup = get_deduplicator(loader.coll_name)
+    corpus_stats = get_corpus_stats(loader.coll_name)
+    # started first: the dense vector size of a new collection is then given by the workers
+    pool = EmbeddingWorkerPool() if N_WORKERS > 0 else None
+    if (
+        manifest is not None
+        and not is_fresh_start
+        and not manifest.sources()
+        and loader.count_points() > 0
+    ):
+        # indexed without a manifest (e.g., before incremental indexing, with random point ids):
+        # its points could be neither replaced nor deleted, so it is rebuilt once
+        logger.info(f"Rebuilding collection {loader.coll_name}: it has no manifest")
+        is_fresh_start = True
+    try:
+        is_created = loader.setup_collection(is_fresh_start=is_fresh_start)
+        # the points recorded in the manifest, dedup index and corpus statistics are gone with the old collection
+        if manifest is not None and is_created:
+            manifest.clear()
+        if dedup is not None and is_created:
+            dedup.clear()
+        if corpus_stats is not None and is_created:
+            corpus_stats.clear()
+
+        IngestionPipeline(
+            loader, manifest=manifest, dedup=dedup, checkpoint=checkpoint, pool=pool
+        ).run(
+            itertools.chain(html_file_paths or [], _iter_folder(html_folder_path)),
+            keyword=keyword,
+        )
+    finally:
+        if pool is not None:
+            pool.close()
+
+    if manifest is not None:
+        for source_id in manifest.sources():
+            source_path = os.path.join(html_folder_path, source_id)
+            if not (os.path.exists(source_path) or os.path.exists(source_path + ".gz")):
+                loader.delete_points(manifest.chunk_ids(source_id))
+                manifest.remove(source_id)
+                if dedup is not None:
+                    # its duplicates in other documents are indexed by the next run
+                    manifest.invalidate(dedup.remove_source(source_id))
+                if corpus_stats is not None:
+                    corpus_stats.remove_source(source_id)
+                logger.info(f"Removed from vect db: {source_id}")
+
+    # the cached query vectors may be weighted by the previous corpus statistics (BM25)
+    query_cache.clear(loader.coll_name)
+
+    for name, cache in [
+        ("dense", get_dense_cache()),
+        ("sparse", get_sparse_cache()),
+    ]:
+        if cache is not None:
+            logger.info(f"Embedding cache stats ({name}): {cache.stats()}")
 
 
 if __name__ == "__main__":
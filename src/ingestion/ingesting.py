@@ -1,11 +1,19 @@
+import os
 from logging import getLogger
+from typing import Iterator
 
-from ingestion.download_html import main_html_download
+from ingestion.checkpoint import get_checkpoint
+from ingestion.download_html import iter_html_download, list_ar5iv_documents
 from ingestion.indexing_qd import main_indexing
 from ingestion.vdb_wrapper import LoadInVdb
+from utility.read_config import get_config_from_path
 
 logger = getLogger("ingestion")
 
+dct_config = get_config_from_path("config.yaml")
+
+RESUME = dct_config["INGESTION_PIPELINE"]["CHECKPOINT"]["RESUME"]
+
 
 def ingest(
     keyword: str,
@@ -14,8 +22,10 @@ def ingest(
     is_fresh_start_indexing: bool,
     html_folder_path: str,
     n_max_docs: int,
+    resume: bool = RESUME,
 ) -> None:
     """Downloads documents based on a keyword and indexes them into a vector database.
+    Each document is indexed as soon as it is downloaded, and its progress is recorded in a checkpoint.
 
     Args:
         keyword (str): The keyword to search for and download documents.
@@ -24,21 +34,48 @@ def ingest(
         is_fresh_start_indexing (bool): Flag indicating whether to start fresh for indexing.
         html_folder_path (str): The directory path where downloaded HTML files will be stored.
         n_max_docs (int): The maximum number of documents to download.
+        resume (bool): If True and the last run with the same keyword was interrupted, it is resumed:
+            its document list is reused, nothing is removed, and the files already upserted are skipped.
     """
-    main_html_download(
-        keyword,
-        html_folder_path,
-        is_fresh_start=is_fresh_start_dwnld,
-        n_max_docs=n_max_docs,
-    )
-    logger.info("Document download ended")
+    checkpoint = get_checkpoint(loader.coll_name)
+    params = {"keyword": keyword, "n_max_docs": n_max_docs}
+    if resume and checkpoint is not None and checkpoint.is_resumable(params):
+        logger.info(f"Resuming the interrupted ingestion for: {keyword}")
+        urls_and_filenames = checkpoint.documents
+        # the files and points of the interrupted run are kept
+        is_fresh_start_dwnld = is_fresh_start_indexing = False
+    else:
+        urls_and_filenames = list_ar5iv_documents(keyword, n_max_docs)
+        if checkpoint is not None:
+            checkpoint.start(params, urls_and_filenames)
+
+    def iter_downloaded() -> Iterator[str]:
+        for html_file_path in iter_html_download(
+            keyword,
+            html_folder_path,
+            is_fresh_start=is_fresh_start_dwnld,
+            n_max_docs=n_max_docs,
+            urls_and_filenames=urls_and_filenames,
+        ):
+            if checkpoint is not None:
+                checkpoint.mark(
+                    os.path.basename(html_file_path).removesuffix(".gz"),
+                    "downloaded",
+                    save=False,
+                )
+            yield html_file_path
 
     main_indexing(
         loader=loader,
         is_fresh_start=is_fresh_start_indexing,
         html_folder_path=html_folder_path,
+        html_file_paths=iter_downloaded(),
+        checkpoint=checkpoint,
+        keyword=keyword,
     )
-    logger.info("Document indexing ended")
+    if checkpoint is not None:
+        checkpoint.complete()
+    logger.info("Document download and indexing ended")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+from uuid import NAMESPACE_URL, uuid5
+
+from utility.read_config import get_config_from_path
+
+dct_config = get_config_from_path("config.yaml")
+
+
+def point_id(source_id: str, chunk_idx: int) -> str:
+    """
+    Derives the id of the point of a chunk from its document and its position.
+
+    Args:
+        source_id (str): The identifier of the document (e.g., the file name).
+        chunk_idx (int): The position of the chunk in the document.
+
+    Returns:
+        str: A UUID which is always the same for the same document and position.
+    """
+    return str(uuid5(NAMESPACE_URL, f"rag02h:{source_id}/{chunk_idx}"))
+
+
+def content_hash(file_path: str) -> str:
+    """
+    Computes the hash of the content of a file.
+
+    Args:
+        file_path (str): The path of the file.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_fingerprint(payload_version: int) -> str:
+    """
+    Computes the fingerprint of the way documents are indexed, from the settings of the config
+    file which change their chunks or their vectors (e.g., the models, the sparse backend).
+
+    Args:
+        payload_version (int): The version of the payload fields of the chunks.
+
+    Returns:
+        str: A short hex digest, which changes with any of these settings.
+    """
+    emb_config = dct_config["PRE_TRAINED_EMB"]
+    sparse_settings = {
+        "backend": emb_config["SPARSE_BACKEND"],
+        "doc_top_k": emb_config["SPARSE_PRUNING"]["DOC_TOP_K"],
+        "doc_min_weight": emb_config["SPARSE_PRUNING"]["DOC_MIN_WEIGHT"],
+    }
+    if emb_config["SPARSE_BACKEND"] == "bm25":
+        sparse_settings.update(k1=emb_config["BM25"]["K1"], b=emb_config["BM25"]["B"])
+    else:
+        sparse_settings.update(
+            model=emb_config["SPARSE_MODEL_NAME"],
+            sliding_window=emb_config["SPARSE_SLIDING_WINDOW"],
+            window_overlap=emb_config["SPARSE_WINDOW_OVERLAP"],
+        )
+    settings = {
+        "payload_version": payload_version,
+        "dense_model": emb_config["DENSE_MODEL_NAME"],
+        "quantize_int8": emb_config["QUANTIZE_INT8"],
+        "sparse": sparse_settings,
+        "chunking": dct_config["CHUNKING"],
+    }
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class DocumentManifest:
+    def __init__(self, path: str):
+        """
+        Initializes the persisted record of the documents indexed in a collection.
+
+        For each document (source id), the manifest stores the hash of its content, the
+        fingerprint of the way it was indexed (e.g., the version of the payload fields)
+        and the ids of the points of its chunks.
+
+        Args:
+            path (str): The JSON file where the manifest is persisted.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self.documents: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.documents = json.load(file)
+
+    def save(self) -> None:
+        """Persists the manifest, atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self.documents, file, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def is_unchanged(
+        self, source_id: str, doc_hash: str, fingerprint: Optional[str] = None
+    ) -> bool:
+        """
+        Checks whether a document has already been indexed with the same content, in the same way.
+
+        Args:
+            source_id (str): The identifier of the document.
+            doc_hash (str): The hash of the current content of the document.
+            fingerprint (Optional[str]): The fingerprint of the current way of indexing documents.
+
+        Returns:
+            bool: True if the document is in the manifest with the same hash and fingerprint.
+        """
+        with self._lock:
+            entry = self.documents.get(source_id, {})
+        return (
+            entry.get("content_hash") == doc_hash
+            and entry.get("fingerprint") == fingerprint
+        )
+
+    def chunk_ids(self, source_id: str) -> list[str]:
+        """
+        Returns the ids of the points of an indexed document.
+
+        Args:
+            source_id (str): The identifier of the document.
+
+        Returns:
+            list[str]: The point ids, empty if the document is not in the manifest.
+        """
+        with self._lock:
+            return self.documents.get(source_id, {}).get("chunk_ids", [])
+
+    def sources(self) -> list[str]:
+        """
+        Returns the identifiers of the indexed documents.
+
+        Returns:
+            list[str]: The source ids in the manifest.
+        """
+        with self._lock:
+            return list(self.documents)
+
+    def update(
+        self,
+        source_id: str,
+        doc_hash: str,
+        chunk_ids: list[str],
+        save: bool = True,
+        fingerprint: Optional[str] = None,
+    ) -> None:
+        """
+        Records that a document has been indexed.
+
+        Args:
+            source_id (str): The identifier of the document.
+            doc_hash (str): The hash of the indexed content.
+            chunk_ids (list[str]): The ids of the points of its chunks.
+            save (bool): If True, the manifest is persisted right away.
+            fingerprint (Optional[str]): The fingerprint of the way the document was indexed.
+        """
+        with self._lock:
+            self.documents[source_id] = {
+                "content_hash": doc_hash,
+                "fingerprint": fingerprint,
+                "chunk_ids": chunk_ids,
+            }
+        if save:
+            self.save()
+
+    def invalidate(self, source_ids: list[str]) -> None:
+        """
+        Forgets (and persists) the content hash of documents, so that the next run re-indexes them
+        even if they are unchanged; their point ids are kept, to replace their points.
+
+        Args:
+            source_ids (list[str]): The identifiers of the documents.
+        """
+        with self._lock:
+            for source_id in source_ids:
+                if source_id in self.documents:
+                    self.documents[source_id]["content_hash"] = None
+        self.save()
+
+    def remove(self, source_id: str) -> None:
+        """
+        Removes (and persists the removal of) a document from the manifest.
+
+        Args:
+            source_id (str): The identifier of the document.
+        """
+        with self._lock:
+            self.documents.pop(source_id, None)
+        self.save()
+
+    def clear(self) -> None:
+        """Removes all the documents from the manifest."""
+        with self._lock:
+            self.documents = {}
+        self.save()
+
+
+def get_manifest(coll_name: str) -> Optional[DocumentManifest]:
+    """
+    Returns the manifest of a collection, as set in the config file.
+
+    Args:
+        coll_name (str): The name of the collection.
+
+    Returns:
+        Optional[DocumentManifest]: The manifest, or None if incremental indexing is disabled.
+    """
+    if not dct_config["VECTOR_DB"]["INCREMENTAL"]:
+        return None
+    return DocumentManifest(
+        os.path.join(dct_config["VECTOR_DB"]["MANIFEST_FOLDER"], f"{coll_name}.json")
+    )
@@ -0,0 +1,565 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import numpy as np
+from qdrant_client import models
+
+from embedding.dense import compute_dense_vectors
+from embedding.sparse import compute_sparse_vectors
+from embedding.worker_pool import EmbeddingWorkerPool, PendingEmbeddings
+from ingestion.checkpoint import IngestionCheckpoint
+from ingestion.chunking import Chunk, chunk_markdown
+from ingestion.dedup import MinHashDeduplicator
+from ingestion.manifest import (
+    DocumentManifest,
+    content_hash,
+    index_fingerprint,
+    point_id,
+)
+from ingestion.utils import (
+    HTML_EXTENSIONS,
+    arxiv_id_from_source,
+    arxiv_year,
+    convert_html_to_markdown,
+    extract_title,
+)
+from ingestion.vdb_wrapper import LoadInVdb
+from utility.metrics import PipelineMetrics
+from utility.read_config import get_config_from_path
+
+logger = getLogger("ingestion")
+
+dct_config = get_config_from_path("config.yaml")
+
+PIPELINE_CONFIG = dct_config["INGESTION_PIPELINE"]
+METRICS_CONFIG = PIPELINE_CONFIG["METRICS"]
+
+# closes a queue: no more items will be put after it
+_DONE = object()
+# version of the payload fields of the chunks (see `_payloads`): the documents recorded in
+# the manifest with another version are re-indexed
+PAYLOAD_VERSION = 2
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class Document:
+    def __init__(
+        self, html_file_path: str, source_id: str, doc_hash: Optional[str] = None
+    ):
+        """
+        Initializes a document flowing through the ingestion pipeline.
+
+        Args:
+            html_file_path (str): The path of the HTML file.
+            source_id (str): The identifier of the document (its file name).
+            doc_hash (Optional[str]): The hash of the file content, if tracked in a manifest.
+        """
+        self.html_file_path = html_file_path
+        self.source_id = source_id
+        self.doc_hash = doc_hash
+        self.title: Optional[str] = None
+        self.markdown_text: Optional[str] = None
+        self.chunks: list[Chunk] = []
+        self.dense_vectors: Optional[np.ndarray] = None
+        self.sparse_vectors: Optional[list[dict[str, list]]] = None
+
+
+class IngestionPipeline:
+    def __init__(
+        self,
+        loader: LoadInVdb,
+        manifest: Optional[DocumentManifest] = None,
+        dedup: Optional[MinHashDeduplicator] = None,
+        checkpoint: Optional[IngestionCheckpoint] = None,
+        pool: Optional[EmbeddingWorkerPool] = None,
+        parse_workers: int = PIPELINE_CONFIG["PARSE_WORKERS"],
+        parse_processes: int = PIPELINE_CONFIG["PARSE_PROCESSES"],
+        chunk_workers: int = PIPELINE_CONFIG["CHUNK_WORKERS"],
+        upsert_workers: int = PIPELINE_CONFIG["UPSERT_WORKERS"],
+        embed_batch_size: int = PIPELINE_CONFIG["EMBED_BATCH_SIZE"],
+        upsert_batch_size: int = PIPELINE_CONFIG["UPSERT_BATCH_SIZE"],
+        queue_size: int = PIPELINE_CONFIG["QUEUE_SIZE"],
+        metrics_interval_s: float = METRICS_CONFIG["LOG_INTERVAL_S"],
+        metrics_folder: Optional[str] = METRICS_CONFIG["PATH_TO_FOLDER"],
+    ):
+        """
+        Initializes a streaming pipeline indexing HTML files into the vector database.
+
+        Files flow through four stages (HTML parsing, chunking, embedding and upsert),
+        each one running in its own threads and connected to the next one by a bounded
+        queue: the stages overlap, and a slow stage makes the previous ones wait instead
+        of piling up documents in memory. Embedding and upsert work on batches of whole
+        documents, made of whatever is available when the stage gets idle.
+        The time and throughput of each stage and the depth of the queues are recorded
+        in `metrics`, and periodically logged.
+
+        Args:
+            loader (LoadInVdb): The LoadInVdb instance used to load data into the vector database.
+            manifest (Optional[DocumentManifest]): If given, unchanged files are skipped and indexed ones are recorded.
+            dedup (Optional[MinHashDeduplicator]): If given, near-duplicate chunks are dropped before being embedded.
+            checkpoint (Optional[IngestionCheckpoint]): If given, the stages completed by each file are recorded,
+                and the files already upserted in the recorded run are skipped.
+            pool (Optional[EmbeddingWorkerPool]): If given, the embeddings are computed by its workers.
+            parse_workers (int): The number of threads converting HTML files to markdown.
+            parse_processes (int): If positive, the number of processes the HTML files are converted in
+                (each parse thread waits for one file at a time, so at least as many threads are run).
+            chunk_workers (int): The number of threads chunking the markdown texts.
+            upsert_workers (int): The number of threads uploading points to the vector database.
+            embed_batch_size (int): The num of chunks after which a batch is embedded without waiting for more.
+            upsert_batch_size (int): The num of points after which a batch is uploaded without waiting for more.
+            queue_size (int): The max number of documents waiting between two stages.
+            metrics_interval_s (float): The period of the throughput summary logged during a run, in seconds
+                (if 0, it is only logged at the end).
+            metrics_folder (Optional[str]): If given, the folder where the metrics of each run are written,
+                as a JSON report.
+        """
+        self.loader = loader
+        self.manifest = manifest
+        self.dedup = dedup
+        self.checkpoint = checkpoint
+        self.pool = pool
+        self.parse_workers = parse_workers
+        self.parse_processes = parse_processes
+        self.chunk_workers = chunk_workers
+        self.upsert_workers = upsert_workers
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.queue_size = queue_size
+        self.metrics_interval_s = metrics_interval_s
+        self.metrics_folder = metrics_folder
+        # the documents indexed with other settings (models, chunking, payload fields, ...)
+        # are not skipped as unchanged, but re-indexed
+        self.fingerprint = index_fingerprint(PAYLOAD_VERSION)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._errors: list[BaseException] = []
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
+        self.stats = {"indexed": 0, "skipped": 0, "duplicates": 0, "points": 0}
+        self.metrics = PipelineMetrics()
+        # the fields of the payloads which are the same for all the chunks of a run
+        self._run_payload: dict[str, Any] = {}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        # wait for room in the queue (backpressure), unless the pipeline is stopping
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    raise _Cancelled()
+
+    def _get(self, q: queue.Queue) -> Any:
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Cancelled()
+
+    def _get_batch(self, q: queue.Queue, max_size: int) -> tuple[list[Document], bool]:
+        # wait for one document, then take the ones already waiting, up to max_size chunks
+        docs, size, item = [], 0, self._get(q)
+        while item is not _DONE:
+            docs.append(item)
+            size += len(item.chunks)
+            if size >= max_size:
+                return docs, False
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                return docs, False
+        # leave the sentinel for the other workers of the stage
+        q.put(_DONE)
+        return docs, True
+
+    def _run_worker(self, target: Callable[..., None], *args) -> None:
+        try:
+            target(*args)
+        except _Cancelled:
+            pass
+        except BaseException as exc:
+            self._errors.append(exc)
+            self._stop.set()
+
+    def _start(self, name: str, target: Callable[..., None], *args) -> threading.Thread:
+        thread = threading.Thread(
+            target=self._run_worker, args=(target, *args), name=name, daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _feed(self, html_file_paths: Iterable[str], out_q: queue.Queue) -> None:
+        seen = set()
+        # the time waited for each new file, e.g., while it is downloaded
+        start = time.perf_counter()
+        for html_file_path in html_file_paths:
+            if not html_file_path.endswith(HTML_EXTENSIONS):
+                logger.info(f"Indexing in vect skipped for file: {html_file_path}")
+                continue
+            if os.path.abspath(html_file_path) not in seen:
+                seen.add(os.path.abspath(html_file_path))
+                self.metrics.record("download", time.perf_counter() - start)
+                self._put(out_q, html_file_path)
+                start = time.perf_counter()
+        self._put(out_q, _DONE)
+
+    def _map(
+        self,
+        func: Callable[[Any], Optional[Any]],
+        in_q: queue.Queue,
+        out_q: queue.Queue,
+        n_running: list[int],
+    ) -> None:
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                in_q.put(_DONE)
+                break
+            out = func(item)
+            if out is not None:
+                self._put(out_q, out)
+        # the last worker of the stage closes the next queue
+        with self._lock:
+            n_running[0] -= 1
+            is_last = n_running[0] == 0
+        if is_last:
+            self._put(out_q, _DONE)
+
+    def _start_map(
+        self,
+        name: str,
+        func: Callable[[Any], Optional[Any]],
+        in_q: queue.Queue,
+        out_q: queue.Queue,
+        n_workers: int,
+    ) -> list[threading.Thread]:
+        n_running = [n_workers]
+        return [
+            self._start(f"{name}-{i}", self._map, func, in_q, out_q, n_running)
+            for i in range(n_workers)
+        ]
+
+    def _parse(self, html_file_path: str) -> Optional[Document]:
+        # the same for the plain and the compressed file of a page
+        source_id = os.path.basename(html_file_path).removesuffix(".gz")
+        doc = Document(html_file_path, source_id)
+        if self.checkpoint is not None and self.checkpoint.is_done(
+            source_id, "upserted"
+        ):
+            logger.info(
+                f"Indexing in vect db skipped (done before resuming) for: {html_file_path}"
+            )
+            self._count("skipped")
+            return None
+        if self.manifest is not None:
+            doc.doc_hash = content_hash(html_file_path)
+            if self.manifest.is_unchanged(source_id, doc.doc_hash, self.fingerprint):
+                logger.info(
+                    f"Indexing in vect db skipped (unchanged) for: {html_file_path}"
+                )
+                self._count("skipped")
+                return None
+        with self.metrics.timed("parse"):
+            if self._parse_executor is None:
+                doc.markdown_text = convert_html_to_markdown(html_file_path)
+            else:
+                doc.markdown_text = self._parse_executor.submit(
+                    convert_html_to_markdown, html_file_path
+                ).result()
+        doc.title = extract_title(doc.markdown_text)
+        if self.checkpoint is not None:
+            # persisted with the next upserted batch: only that stage makes a file skipped
+            self.checkpoint.mark(source_id, "parsed", save=False)
+        return doc
+
+    def _chunk(self, doc: Document) -> Document:
+        start = time.perf_counter()
+        doc.chunks = chunk_markdown(doc.markdown_text)
+        self.metrics.record("chunk", time.perf_counter() - start, len(doc.chunks))
+        doc.markdown_text = None
+        if self.dedup is not None:
+            with self.metrics.timed("dedup", len(doc.chunks)):
+                # recorded once the chunks are upserted
+                keep = self.dedup.filter(doc.source_id, [c.text for c in doc.chunks])
+            n_duplicates = len(keep) - sum(keep)
+            if n_duplicates > 0:
+                doc.chunks = [chunk for chunk, k in zip(doc.chunks, keep) if k]
+                self._count("duplicates", n_duplicates)
+                logger.info(
+                    f"{n_duplicates} near-duplicate chunks dropped for: {doc.html_file_path}"
+                )
+        if len(doc.chunks) == 0:
+            # still sent downstream, to drop the points of its previous version
+            logger.info(
+                f"Indexing in vect db skipped (no chunks) for: {doc.html_file_path}"
+            )
+        return doc
+
+    def _emit_embedded(
+        self,
+        docs: list[Document],
+        dense_vectors: np.ndarray,
+        sparse_vectors: list[dict[str, list]],
+        out_q: queue.Queue,
+    ) -> None:
+        offset = 0
+        for doc in docs:
+            n_chunks = len(doc.chunks)
+            doc.dense_vectors = dense_vectors[offset : offset + n_chunks]
+            doc.sparse_vectors = sparse_vectors[offset : offset + n_chunks]
+            offset += n_chunks
+            if self.checkpoint is not None:
+                self.checkpoint.mark(doc.source_id, "embedded", save=False)
+            self._put(out_q, doc)
+
+    def _wait_embeddings(
+        self, pending: tuple[list[Document], PendingEmbeddings], out_q: queue.Queue
+    ) -> None:
+        # the time the stage is blocked on the workers of the pool
+        with self.metrics.timed("encode", len(pending[1].texts)):
+            embeddings = pending[1].result()
+        self._emit_embedded(pending[0], *embeddings, out_q)
+
+    def _embed(self, in_q: queue.Queue, out_q: queue.Queue) -> None:
+        # the batch being embedded by the pool, while the next one is collected
+        pending: Optional[tuple[list[Document], PendingEmbeddings]] = None
+        is_done = False
+        while not is_done:
+            docs, is_done = self._get_batch(in_q, self.embed_batch_size)
+            texts = [chunk.text for doc in docs for chunk in doc.chunks]
+            # the chunks of a doc are in the same batch, and replace its previous ones in
+            # the corpus statistics of the BM25 backend
+            source_ids = [doc.source_id for doc in docs for _ in doc.chunks]
+            coll_name = self.loader.coll_name
+            if self.pool is not None and texts:
+                if pending is not None:
+                    self._wait_embeddings(pending, out_q)
+                pending = (docs, self.pool.submit(texts, source_ids, coll_name))
+            elif texts:
+                with self.metrics.timed("dense encode", len(texts)):
+                    dense_vectors = compute_dense_vectors(texts)
+                with self.metrics.timed("sparse encode", len(texts)):
+                    sparse_vectors = compute_sparse_vectors(
+                        texts, source_ids=source_ids, coll_name=coll_name
+                    )
+                self._emit_embedded(docs, dense_vectors, sparse_vectors, out_q)
+            else:
+                self._emit_embedded(docs, np.empty((0, 0), dtype=np.float32), [], out_q)
+        if pending is not None:
+            self._wait_embeddings(pending, out_q)
+        self._put(out_q, _DONE)
+
+    def _payloads(self, doc: Document) -> Iterator[dict[str, Any]]:
+        arxiv_id, arxiv_version = arxiv_id_from_source(doc.source_id)
+        for i, chunk in enumerate(doc.chunks):
+            yield {
+                "text": chunk.text,
+                "source_id": doc.source_id,
+                "arxiv_id": arxiv_id,
+                "arxiv_version": arxiv_version,
+                "title": doc.title,
+                "year": arxiv_year(arxiv_id),
+                "heading": chunk.heading,
+                "chunk_index": i,
+                "start": chunk.start,
+                "end": chunk.end,
+                **self._run_payload,
+            }
+
+    def _invalidate(self, source_ids: list[str]) -> None:
+        if not source_ids:
+            return
+        logger.info(
+            f"Re-indexing needed for {source_ids}: some of their chunks were dropped "
+            f"as duplicates of texts which are not indexed anymore"
+        )
+        if self.manifest is not None:
+            self.manifest.invalidate(source_ids)
+
+    def _upsert_batch(self, docs: list[Document]) -> None:
+        lst_ids = [
+            [point_id(doc.source_id, i) for i in range(len(doc.chunks))] for doc in docs
+        ]
+        ids = [a_id for doc_ids in lst_ids for a_id in doc_ids]
+        if ids:
+            with self.metrics.timed("upsert", len(ids)):
+                n_points = self.loader.add_to_collection(
+                    dense_vectors=(row for doc in docs for row in doc.dense_vectors),
+                    sparse_vectors=(
+                        models.SparseVector(**sparse_vector)
+                        for doc in docs
+                        for sparse_vector in doc.sparse_vectors
+                    ),
+                    payloads=(
+                        payload for doc in docs for payload in self._payloads(doc)
+                    ),
+                    ids=ids,
+                )
+            self._count("points", n_points)
+
+        if self.manifest is not None:
+            # a previous version of a document might have had more chunks
+            stale_ids = []
+            for doc, doc_ids in zip(docs, lst_ids):
+                new_ids = set(doc_ids)
+                stale_ids += [
+                    a_id
+                    for a_id in self.manifest.chunk_ids(doc.source_id)
+                    if a_id not in new_ids
+                ]
+                self.manifest.update(
+                    doc.source_id,
+                    doc.doc_hash,
+                    doc_ids,
+                    save=False,
+                    fingerprint=self.fingerprint,
+                )
+            self.loader.delete_points(stale_ids)
+            self.manifest.save()
+
+        if self.dedup is not None:
+            for doc in docs:
+                self._invalidate(self.dedup.commit(doc.source_id))
+
+        if self.checkpoint is not None:
+            for doc in docs:
+                self.checkpoint.mark(doc.source_id, "upserted", save=False)
+            self.checkpoint.save()
+        for doc in docs:
+            if doc.chunks:
+                self._count("indexed")
+                logger.info(f"Indexing in vect db ended for: {doc.html_file_path}")
+
+    def _upsert(self, in_q: queue.Queue) -> None:
+        is_done = False
+        while not is_done:
+            docs, is_done = self._get_batch(in_q, self.upsert_batch_size)
+            if docs:
+                self._upsert_batch(docs)
+
+    def run(
+        self, html_file_paths: Iterable[str], keyword: Optional[str] = None
+    ) -> dict[str, int]:
+        """
+        Indexes HTML files, consuming them as they are produced (e.g., while they are downloaded).
+
+        The payload of each point records the text of its chunk and, to filter searches, the
+        source file, arXiv id, title and year of its document, the section heading, index and
+        character offsets of the chunk, the keyword of the run and its id (the ingest batch).
+
+        Args:
+            html_file_paths (Iterable[str]): The paths of the HTML files to index.
+            keyword (Optional[str]): The search keyword the files have been downloaded for, if any.
+
+        Raises:
+            Exception: The first error raised by any stage, after all the stages have stopped.
+
+        Returns:
+            dict[str, int]: The number of indexed and skipped documents, and of upserted points.
+        """
+        self._stop.clear()
+        self._errors = []
+        self.stats = {"indexed": 0, "skipped": 0, "duplicates": 0, "points": 0}
+        start = time.perf_counter()
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        self._run_payload = {"keyword": keyword, "ingest_batch": run_id}
+        n_parse_workers = max(self.parse_workers, self.parse_processes)
+        self.metrics = PipelineMetrics()
+        self.metrics.add_stage("download", "files")
+        self.metrics.add_stage("parse", "files", n_parse_workers)
+        self.metrics.add_stage("chunk", "chunks", self.chunk_workers)
+        if self.dedup is not None:
+            self.metrics.add_stage("dedup", "chunks", self.chunk_workers)
+        if self.pool is not None:
+            self.metrics.add_stage("encode", "chunks")
+        else:
+            self.metrics.add_stage("dense encode", "chunks")
+            self.metrics.add_stage("sparse encode", "chunks")
+        self.metrics.add_stage("upsert", "points", self.upsert_workers)
+
+        if self.parse_processes > 0:
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_processes, mp_context=mp.get_context("spawn")
+            )
+
+        q_paths, q_parsed, q_chunked, q_embedded = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(4)
+        ]
+        for name, q in [
+            ("files", q_paths),
+            ("parsed", q_parsed),
+            ("chunked", q_chunked),
+            ("embedded", q_embedded),
+        ]:
+            self.metrics.watch_queue(name, q)
+        self.metrics.start_reporting(logger, self.metrics_interval_s)
+        threads = [self._start("ingestion-feed", self._feed, html_file_paths, q_paths)]
+        threads += self._start_map(
+            "ingestion-parse",
+            self._parse,
+            q_paths,
+            q_parsed,
+            n_parse_workers,
+        )
+        threads += self._start_map(
+            "ingestion-chunk", self._chunk, q_parsed, q_chunked, self.chunk_workers
+        )
+        threads.append(
+            self._start("ingestion-embed", self._embed, q_chunked, q_embedded)
+        )
+        threads += [
+            self._start(f"ingestion-upsert-{i}", self._upsert, q_embedded)
+            for i in range(self.upsert_workers)
+        ]
+
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            if self.dedup is not None:
+                # the chunks of the documents which have not been upserted
+                self._invalidate(self.dedup.discard())
+            if self._parse_executor is not None:
+                self._parse_executor.shutdown(cancel_futures=True)
+                self._parse_executor = None
+            self.metrics.stop_reporting()
+            logger.info(f"Ingestion throughput {self.metrics.summary()}")
+            if self.metrics_folder is not None:
+                report_path = os.path.join(
+                    self.metrics_folder, f"{self.loader.coll_name}_{run_id}.json"
+                )
+                self.metrics.write_report(
+                    report_path,
+                    collection=self.loader.coll_name,
+                    completed=not (self._errors or self._stop.is_set()),
+                    **self.stats,
+                )
+                logger.info(f"Ingestion metrics written to: {report_path}")
+        if self._errors:
+            raise self._errors[0]
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Ingestion pipeline ended in {elapsed:.1f} s: {self.stats['indexed']} docs indexed, "
+            f"{self.stats['skipped']} skipped, {self.stats['duplicates']} near-duplicate chunks dropped, "
+            f"{self.stats['points']} points upserted"
+        )
+        return dict(self.stats)
@@ -1,11 +1,76 @@
-from typing import List
+import gzip
+import re
+from typing import Optional
 
-import markdownify
 from bs4 import BeautifulSoup
+from markdownify import MarkdownConverter
+
+try:
+    import lxml  # noqa: F401
+
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# pages are stored gzip-compressed by the download, but plain ones are still read
+HTML_EXTENSIONS = (".html", ".html.gz")
+
+TITLE_PATTERN = re.compile(r"^#[ \t]+(.*?)[ \t#]*$", re.MULTILINE)
+# new-style (e.g., 2401.00001v2) and old-style (e.g., hep-ph/9901001v1) arXiv ids
+NEW_ARXIV_ID_PATTERN = re.compile(r"^(\d{2})(\d{2})\.\d{4,5}(v\d+)?$")
+OLD_ARXIV_ID_PATTERN = re.compile(
+    r"^(?:[a-z\-]+(?:\.[A-Z]{2})?/)?(\d{2})(\d{2})\d{3}(v\d+)?$"
+)
+ARXIV_VERSION_PATTERN = re.compile(r"v(\d+)$")
+
+# elements of ar5iv pages which are not part of the paper
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "form"]
+BOILERPLATE_CLASSES = [
+    "ltx_page_navbar",
+    "ltx_page_header",
+    "ltx_page_footer",
+    "ltx_page_logo",
+    "ar5iv-footer",
+]
+
+
+def html_to_markdown(html_content: str, parser: str = HTML_PARSER) -> str:
+    """Converts HTML content to Markdown format, parsing it only once.
+    Navigation and boilerplate elements are removed, and only the paper is kept if the page has one.
+
+    Args:
+        html_content (str): The HTML content to be converted.
+        parser (str): The BeautifulSoup parser, "lxml" (much faster) if installed, else "html.parser".
+
+    Returns:
+        str: The converted Markdown content.
+    """
+    soup = BeautifulSoup(html_content, parser)
+    root = soup.find("article", class_="ltx_document") or soup.body or soup
+    for element in root.find_all(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in root.find_all(class_=BOILERPLATE_CLASSES):
+        element.decompose()
+
+    return MarkdownConverter(heading_style="ATX").convert_soup(root)
+
+
+def read_html_file(html_file: str) -> str:
+    """Reads an HTML file, decompressing it if gzip-compressed (.gz).
+
+    Args:
+        html_file (str): The path to the HTML file.
+
+    Returns:
+        str: The HTML content.
+    """
+    opener = gzip.open if html_file.endswith(".gz") else open
+    with opener(html_file, "rt", encoding="utf-8") as file:
+        return file.read()
 
 
 def convert_html_to_markdown(html_file: str) -> str:
-    """Reads an HTML file and converts its content to Markdown format.
+    """Reads an HTML file (plain or gzip-compressed) and converts its content to Markdown format.
 
     Args:
         html_file (str): The path to the HTML file to be converted.
@@ -13,33 +78,67 @@ def convert_html_to_markdown(html_file: str) -> str:
     Returns:
         str: The converted Markdown content.
     """
-    with open(html_file, "r", encoding="utf-8") as file:
-        html_content = file.read()
+    return html_to_markdown(read_html_file(html_file))
+
+
+def extract_title(markdown_text: str) -> Optional[str]:
+    """Extracts the title of a Markdown document, i.e., its first level-1 heading.
+
+    Args:
+        markdown_text (str): The Markdown content.
 
-    # Parse the HTML using BeautifulSoup to clean it
-    soup = BeautifulSoup(html_content, "html.parser")
+    Returns:
+        Optional[str]: The title, or None if there is no level-1 heading.
+    """
+    match = TITLE_PATTERN.search(markdown_text)
+    return match.group(1) if match else None
 
-    # Convert HTML to Markdown
-    markdown_content = markdownify.markdownify(str(soup), heading_style="ATX")
 
-    return markdown_content
+def arxiv_filename(url: str) -> str:
+    """Returns the file name a paper is downloaded as, from its arXiv URL (e.g., .../abs/2401.00001v1).
 
+    Args:
+        url (str): The URL of the paper.
 
-def chunk_text(text: str, chunk_size: int = 300) -> List[str]:
+    Returns:
+        str: The versioned arXiv id with the extension, the "/" of old-style ids replaced by "_"
+            (e.g., 2401.00001v1.html, hep-ph_9901001v1.html).
     """
-    ---- PLACEHOLDER VERSION ----
-    ---- TO BE MODIFIED ----
-    Chunks the input text into smaller segments of specified size.
+    return url.split("/abs/")[-1].replace("/", "_") + ".html"
+
+
+def arxiv_id_from_source(source_id: str) -> tuple[str, Optional[int]]:
+    """Returns the arXiv id of a downloaded page and its version, from its file name (see `arxiv_filename`).
+
+    Args:
+        source_id (str): The file name of the page.
+
+    Returns:
+        tuple[str, Optional[int]]: The arXiv id without version (e.g., 2401.00001, hep-ph/9901001),
+            and the version, or None if the name has none.
+    """
+    arxiv_id = source_id.removesuffix(".gz").removesuffix(".html").replace("_", "/", 1)
+    match = ARXIV_VERSION_PATTERN.search(arxiv_id)
+    if match is None:
+        return arxiv_id, None
+    return arxiv_id[: match.start()], int(match.group(1))
+
+
+def arxiv_year(arxiv_id: str) -> Optional[int]:
+    """Returns the year of submission of a paper, encoded in its arXiv id (YYMM...).
 
     Args:
-        text (str): The text to be chunked.
-        chunk_size (int): The maximum number of words per chunk. Default is 300.
+        arxiv_id (str): The arXiv id.
 
     Returns:
-        List[str]: A list of text chunks.
+        Optional[int]: The year, or None if the id is not an arXiv one.
     """
-    words = text.split()
-    chunks = [
-        " ".join(words[i : i + chunk_size]) for i in range(0, len(words), chunk_size)
-    ]
-    return chunks
+    match = NEW_ARXIV_ID_PATTERN.match(arxiv_id)
+    if match:
+        return 2000 + int(match.group(1))
+    match = OLD_ARXIV_ID_PATTERN.match(arxiv_id)
+    if match and 1 <= int(match.group(2)) <= 12:
+        # old-style ids were used from 1991 to 2007
+        year = int(match.group(1))
+        return 1900 + year if year >= 91 else 2000 + year
+    return None
@@ -1,9 +1,72 @@
-from typing import Union
+import time
+from logging import getLogger
+from typing import Iterable, Iterator, Optional, Union
 from uuid import uuid4
 
+import numpy as np
 from qdrant_client import QdrantClient, models
 
-from embedding.dense import EMB_DIM
+from embedding.dense import get_emb_dim
+from utility.read_config import get_config_from_path
+
+logger = getLogger("ingestion")
+
+dct_config = get_config_from_path("config.yaml")
+
+UPLOAD_BATCH_SIZE = dct_config["VECTOR_DB"]["UPLOAD_BATCH_SIZE"]
+UPLOAD_PARALLEL = dct_config["VECTOR_DB"]["UPLOAD_PARALLEL"]
+QUANTIZATION_CONFIG = dct_config["VECTOR_DB"]["DENSE_QUANTIZATION"]
+
+# the payload fields of the chunks which can filter searches, and their index
+PAYLOAD_INDEXES = {
+    "source_id": models.PayloadSchemaType.KEYWORD,
+    "arxiv_id": models.PayloadSchemaType.KEYWORD,
+    "arxiv_version": models.PayloadSchemaType.INTEGER,
+    "title": models.TextIndexParams(
+        type=models.TextIndexType.TEXT,
+        tokenizer=models.TokenizerType.WORD,
+        lowercase=True,
+    ),
+    "heading": models.PayloadSchemaType.KEYWORD,
+    "chunk_index": models.PayloadSchemaType.INTEGER,
+    "year": models.PayloadSchemaType.INTEGER,
+    "keyword": models.PayloadSchemaType.KEYWORD,
+    "ingest_batch": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def build_quantization_config(
+    mode: Optional[str],
+    quantile: float = QUANTIZATION_CONFIG["QUANTILE"],
+    always_ram: bool = QUANTIZATION_CONFIG["ALWAYS_RAM"],
+) -> Optional[models.QuantizationConfig]:
+    """
+    Builds the quantization config of dense vectors.
+
+    Args:
+        mode (Optional[str]): None (no quantization), 'scalar' (int8) or 'binary' (1 bit per dimension).
+        quantile (float): For scalar quantization, the quantile of the values setting the int8 range.
+        always_ram (bool): If True, the quantized vectors are always kept in RAM.
+
+    Raises:
+        ValueError: If the mode is not supported.
+
+    Returns:
+        Optional[models.QuantizationConfig]: The quantization config, or None if no quantization.
+    """
+    if mode is None:
+        return None
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=quantile, always_ram=always_ram
+            )
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=always_ram)
+        )
+    raise ValueError(f"Unsupported quantization mode: {mode}")
 
 
 class LoadInVdb:
@@ -28,26 +91,41 @@ class LoadInVdb:
         self.dense_vect_name = dense_vect_name
         self.sparse_vect_name = sparse_vect_name
 
-    def setup_collection(self, is_fresh_start: bool = False) -> None:
+    def setup_collection(
+        self,
+        is_fresh_start: bool = False,
+        quantization: Optional[str] = QUANTIZATION_CONFIG["MODE"],
+        on_disk: bool = QUANTIZATION_CONFIG["ON_DISK"],
+    ) -> bool:
         """
         Ensures that the collection exists; creates it if it does not.
 
         Args:
             is_fresh_start (bool): If True, removes the existing collection before re-creation.
+            quantization (Optional[str]): The quantization of the dense vectors of a new collection:
+                None, 'scalar' (int8) or 'binary'. Searches score the quantized vectors, then may
+                rescore the best candidates with the original ones.
+            on_disk (bool): If True, the original dense vectors of a new collection are kept on disk.
+
+        The collection gets the payload indexes of PAYLOAD_INDEXES, so that filtered searches
+        run inside the vector index (indexes only have effect with a Qdrant server).
 
         Returns:
-            None
+            bool: True if the collection has been (re-)created empty.
         """
         if is_fresh_start:
             self.client.delete_collection(collection_name=self.coll_name)
 
-        if not self.client.collection_exists(self.coll_name):
+        is_created = not self.client.collection_exists(self.coll_name)
+        if is_created:
             self.client.create_collection(
                 collection_name=self.coll_name,
                 vectors_config={
                     "text-dense": models.VectorParams(
-                        size=EMB_DIM,  # Vector size is defined by used model
+                        size=get_emb_dim(),  # Vector size is defined by used model
                         distance=models.Distance.COSINE,
+                        on_disk=on_disk,
+                        quantization_config=build_quantization_config(quantization),
                     )
                 },
                 sparse_vectors_config={
@@ -58,45 +136,125 @@ class LoadInVdb:
                     )
                 },
             )
+        # also on existing collections, which may predate some indexes
+        indexed_fields = self.client.get_collection(self.coll_name).payload_schema
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name in indexed_fields:
+                continue
+            self.client.create_payload_index(
+                collection_name=self.coll_name,
+                field_name=field_name,
+                field_schema=field_schema,
+            )
+        return is_created
 
     def add_to_collection(
         self,
-        dense_vectors: list[list[float]],
-        sparse_vectors: list[models.SparseVector],
-        payloads: list[dict],
-        ids: Union[list[str], None] = None,
-    ) -> None:
+        dense_vectors: Union[np.ndarray, Iterable[list[float]]],
+        sparse_vectors: Iterable[models.SparseVector],
+        payloads: Iterable[dict],
+        ids: Union[Iterable[str], None] = None,
+        batch_size: int = UPLOAD_BATCH_SIZE,
+        parallel: int = UPLOAD_PARALLEL,
+    ) -> int:
         """Adds dense and sparse vectors along with payloads to the collection.
 
+        Points are built lazily and uploaded in batches, so the inputs can be generators,
+        and memory does not grow with the number of points.
+
         Args:
-            dense_vectors (list[list[float]]): list of dense vectors to add.
-            sparse_vectors (list[models.SparseVector]): list of sparse vectors to add.
-            payloads (list[dict]): list of payload dictionaries to associate with the vectors.
-            ids (Union[list[str], None]): Optional list of IDs for the points. If None, new UUIDs are generated.
+            dense_vectors (Union[np.ndarray, Iterable[list[float]]]): dense vectors to add, e.g., the rows of a matrix.
+            sparse_vectors (Iterable[models.SparseVector]): sparse vectors to add.
+            payloads (Iterable[dict]): payload dictionaries to associate with the vectors.
+            ids (Union[Iterable[str], None]): Optional IDs for the points. If None, new UUIDs are generated.
+            batch_size (int): The number of points sent to the vector database per request.
+            parallel (int): The number of processes uploading batches (only with a Qdrant server).
 
         Raises:
-            ValueError: If the lengths of the lists do not match.
+            ValueError: If the lengths of the inputs do not match.
 
         Returns:
-            None
+            int: The number of points added.
         """
-        ids = [str(uuid4()) for _ in dense_vectors] if ids is None else ids
-        if not (len(dense_vectors) == len(sparse_vectors) == len(payloads) == len(ids)):
+        sizes = {
+            len(x)
+            for x in [dense_vectors, sparse_vectors, payloads, ids]
+            if hasattr(x, "__len__")
+        }
+        if len(sizes) > 1:
             raise ValueError(
                 "ids, dense vector, sparse vector and payloads lists must have the same length"
             )
 
-        self.client.upload_points(
-            collection_name=self.coll_name,
-            points=[
-                models.PointStruct(
+        n_points = 0
+
+        def iter_points() -> Iterator[models.PointStruct]:
+            nonlocal n_points
+            id_iter = None if ids is None else iter(ids)
+            sparse_iter, payload_iter = iter(sparse_vectors), iter(payloads)
+            # raises ValueError if an input ends before the others
+            for dense_vector in dense_vectors:
+                sparse_vector = next(sparse_iter, None)
+                payload = next(payload_iter, None)
+                if sparse_vector is None or payload is None:
+                    raise ValueError(
+                        "sparse vectors and payloads must have the same length as the dense vectors"
+                    )
+                a_id = str(uuid4()) if id_iter is None else next(id_iter, None)
+                if a_id is None:
+                    raise ValueError("ids must have the same length as the vectors")
+                n_points += 1
+                yield models.PointStruct(
                     id=a_id,
                     vector={"text-dense": dense_vector, "text-sparse": sparse_vector},
                     payload=payload,
                 )
-                for a_id, dense_vector, sparse_vector, payload in zip(
-                    ids, dense_vectors, sparse_vectors, payloads
+            if (
+                next(sparse_iter, None) is not None
+                or next(payload_iter, None) is not None
+            ):
+                raise ValueError(
+                    "sparse vectors and payloads must have the same length as the dense vectors"
                 )
-            ],
+            if id_iter is not None and next(id_iter, None) is not None:
+                raise ValueError("ids must have the same length as the vectors")
+
+        start = time.perf_counter()
+        self.client.upload_points(
+            collection_name=self.coll_name,
+            points=iter_points(),
+            batch_size=batch_size,
+            parallel=parallel,
             max_retries=3,
         )
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Upserted {n_points} points in {elapsed:.2f} s "
+            f"({n_points / max(elapsed, 1e-9):.0f} points/s)"
+        )
+        return n_points
+
+    def delete_points(self, ids: list[str]) -> None:
+        """Deletes points from the collection.
+
+        Args:
+            ids (list[str]): list of IDs of the points to delete.
+
+        Returns:
+            None
+        """
+        if ids:
+            self.client.delete(
+                collection_name=self.coll_name,
+                points_selector=models.PointIdsList(points=ids),
+            )
+
+    def count_points(self) -> int:
+        """Counts the points of the collection.
+
+        Returns:
+            int: The number of points, 0 if the collection does not exist.
+        """
+        if not self.client.collection_exists(self.coll_name):
+            return 0
+        return self.client.count(collection_name=self.coll_name, exact=True).count
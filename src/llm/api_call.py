@@ -6,7 +6,7 @@ from typing import Any, Optional
 import requests
 
 from llm.prompt import get_prompt_1, get_prompt_2
-from retrieval.search_qd import main_search
+from retrieval.search_qd import main_search, query_cache
 from retrieval.vdb_wrapper import SearchInVdb
 from utility.read_config import get_config_from_path
 
@@ -151,7 +151,8 @@ def main_api_call(searcher: SearchInVdb, question: str, rewriting: bool = True)
     else:
         _question = question
 
-    lst_points = main_search(searcher, query_text=_question)
+    lst_points = main_search(searcher, query_text=_question, with_payload=["text"])
+    logging.debug(f"Query embedding cache stats: {query_cache.stats()}")
     dct_points = {i: point.payload['text'] for i, point in enumerate(lst_points)}
 
     p2 = get_prompt_2(context=dct_points, question=_question)
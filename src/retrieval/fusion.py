@@ -0,0 +1,159 @@
+import warnings
+from typing import Optional
+
+import numpy as np
+from qdrant_client import models
+
+FUSION_METHODS = ["rrf", "minmax", "zscore", "dbsf"]
+
+
+def _to_matrices(
+    results: list[list[models.ScoredPoint]],
+) -> tuple[np.ndarray, np.ndarray]:
+    # scores and ids of the results of each query, padded with nan and None
+    width = max((len(points) for points in results), default=0)
+    scores = np.full((len(results), width), np.nan)
+    ids = np.full((len(results), width), None, dtype=object)
+    for row, points in enumerate(results):
+        scores[row, : len(points)] = [p.score for p in points]
+        ids[row, : len(points)] = [str(p.id) for p in points]
+    return scores, ids
+
+
+def normalize_scores(
+    scores: np.ndarray, method: str = "rrf", rrf_k: int = 60
+) -> np.ndarray:
+    """
+    Normalizes the scores of the results of many queries, query by query.
+
+    Args:
+        scores (np.ndarray): A (n_queries, n_results) matrix of scores, sorted by decreasing
+            score in each row and padded with nan.
+        method (str): 'rrf' (1 / (rrf_k + rank), the scores only set the rank), 'minmax'
+            (to [0, 1]), 'zscore' (to mean 0 and std 1) or 'dbsf' (distribution-based, to [0, 1]
+            between the mean -/+ 3 std).
+        rrf_k (int): The rank constant of 'rrf': the higher, the less the top ranks dominate.
+
+    Raises:
+        ValueError: If the method is not supported.
+
+    Returns:
+        np.ndarray: The matrix of normalized scores, nan where padded.
+    """
+    is_valid = ~np.isnan(scores)
+    if scores.size == 0:
+        return scores
+    if method == "rrf":
+        ranks = np.arange(1, scores.shape[1] + 1)
+        return np.where(is_valid, 1.0 / (rrf_k + ranks), np.nan)
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unsupported fusion method: {method}")
+
+    # queries without results warn and give nan, which is what they hold anyway
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if method == "minmax":
+            low = np.nanmin(scores, axis=1, keepdims=True)
+            span = np.nanmax(scores, axis=1, keepdims=True) - low
+        else:
+            mean = np.nanmean(scores, axis=1, keepdims=True)
+            std = np.nanstd(scores, axis=1, keepdims=True)
+            low, span = (mean, std) if method == "zscore" else (mean - 3 * std, 6 * std)
+    # all the scores of a query are equal: they are all the best
+    out = np.where(span > 0, (scores - low) / np.where(span > 0, span, 1), 1.0)
+    return np.where(is_valid, out, np.nan)
+
+
+def fuse_batch(
+    results: list[list[list[models.ScoredPoint]]],
+    weights: Optional[list[float]] = None,
+    method: str = "rrf",
+    k: int = 5,
+    rrf_k: int = 60,
+) -> list[list[models.ScoredPoint]]:
+    """
+    Merges the results of several searches (e.g., dense and sparse) of many queries at once.
+
+    The scores of each search are normalized query by query, and the fused score of a point
+    is the weighted sum of its normalized scores (a search which did not return it adds 0).
+    All the queries are processed together, with array operations.
+
+    Args:
+        results (list[list[list[models.ScoredPoint]]]): For each search, the results of each query,
+            sorted by decreasing score (as returned by the vector database).
+        weights (Optional[list[float]]): The weight of each search. If None, all weights are 1.
+        method (str): The normalization of the scores (see `normalize_scores`).
+        k (int): The number of results to return per query.
+        rrf_k (int): The rank constant of 'rrf'.
+
+    Raises:
+        ValueError: If the searches have different numbers of queries, or weights.
+
+    Returns:
+        list[list[models.ScoredPoint]]: For each query, its top-k points, with the fused score.
+    """
+    weights = [1.0] * len(results) if weights is None else weights
+    if len(weights) != len(results):
+        raise ValueError("There must be one weight per search")
+    n_queries = len(results[0]) if results else 0
+    if any(len(search) != n_queries for search in results):
+        raise ValueError("All the searches must have the same number of queries")
+
+    lst_scores, lst_ids = [], []
+    for search, weight in zip(results, weights):
+        scores, ids = _to_matrices(search)
+        lst_scores.append(weight * normalize_scores(scores, method, rrf_k))
+        lst_ids.append(ids)
+    scores, ids = np.hstack(lst_scores), np.hstack(lst_ids)
+    rows = np.broadcast_to(np.arange(n_queries)[:, None], scores.shape)
+    is_valid = ~np.isnan(scores)
+    scores, ids, rows = scores[is_valid], ids[is_valid], rows[is_valid]
+    # row-major order of the valid cells, the same as the concatenated points
+    points = np.empty(len(scores), dtype=object)
+    points[:] = [p for i in range(n_queries) for search in results for p in search[i]]
+    if len(scores) == 0:
+        return [[] for _ in range(n_queries)]
+
+    # sum the scores of each (query, point) pair
+    _, codes = np.unique(ids.astype(str), return_inverse=True)
+    keys = rows * (codes.max() + 1) + codes
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    fused = np.bincount(inverse, weights=scores)
+    fused_rows = rows[first]
+
+    # top-k of each query: sort by query, then by decreasing score
+    order = np.lexsort((-fused, fused_rows))
+    starts = np.searchsorted(fused_rows[order], np.arange(n_queries))
+    ends = np.searchsorted(fused_rows[order], np.arange(n_queries), side="right")
+    return [
+        [
+            points[first[j]].model_copy(update={"score": float(fused[j])})
+            for j in order[start : min(end, start + k)]
+        ]
+        for start, end in zip(starts, ends)
+    ]
+
+
+def fuse(
+    results: list[list[models.ScoredPoint]],
+    weights: Optional[list[float]] = None,
+    method: str = "rrf",
+    k: int = 5,
+    rrf_k: int = 60,
+) -> list[models.ScoredPoint]:
+    """
+    Merges the results of several searches (e.g., dense and sparse) of a query (see `fuse_batch`).
+
+    Args:
+        results (list[list[models.ScoredPoint]]): The results of each search, sorted by decreasing score.
+        weights (Optional[list[float]]): The weight of each search. If None, all weights are 1.
+        method (str): The normalization of the scores (see `normalize_scores`).
+        k (int): The number of results to return.
+        rrf_k (int): The rank constant of 'rrf'.
+
+    Returns:
+        list[models.ScoredPoint]: The top-k points, with the fused score.
+    """
+    return fuse_batch(
+        [[points] for points in results], weights, method=method, k=k, rrf_k=rrf_k
+    )[0]
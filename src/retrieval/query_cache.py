@@ -0,0 +1,231 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Union
+
+from qdrant_client.models import SparseVector
+
+QueryVectors = tuple[list[float], SparseVector]
+
+
+def normalize_query(query_text: str) -> str:
+    """
+    Normalizes a query so that trivially different spellings share the same cache entry.
+
+    Unicode is NFKC-normalized, case is folded and whitespace is collapsed: both
+    encoders are uncased, so this does not change the resulting vectors.
+
+    Args:
+        query_text (str): The query text.
+
+    Returns:
+        str: The normalized query text.
+    """
+    return " ".join(unicodedata.normalize("NFKC", query_text).lower().split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_size: int = 1024, ttl_s: float = 3600.0):
+        """
+        Initializes a bounded, in-memory LRU cache of query embeddings with expiration.
+
+        Entries are keyed by collection and query: the sparse vector of a query depends on
+        the searched collection (e.g., its BM25 corpus statistics).
+
+        Args:
+            max_size (int): The maximum number of queries kept; the least recently used is dropped first.
+            ttl_s (float): The number of seconds after which an entry expires.
+        """
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[tuple[str, str], tuple[float, QueryVectors]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._encode_time_s = 0.0
+
+    def get(self, coll_name: str, query_text: str) -> Optional[QueryVectors]:
+        """
+        Looks up the vectors of a query.
+
+        Args:
+            coll_name (str): The name of the searched collection.
+            query_text (str): The query text.
+
+        Returns:
+            Optional[QueryVectors]: The dense and sparse vectors of the query, or None if absent or expired.
+        """
+        key = (coll_name, normalize_query(query_text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_s:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, coll_name: str, query_text: str, vectors: QueryVectors) -> None:
+        """
+        Stores the vectors of a query.
+
+        Args:
+            coll_name (str): The name of the searched collection.
+            query_text (str): The query text.
+            vectors (QueryVectors): The dense and sparse vectors of the query.
+        """
+        if self.max_size <= 0:
+            return
+        key = (coll_name, normalize_query(query_text))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vectors)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, coll_name: Optional[str] = None) -> None:
+        """
+        Drops the cached vectors, e.g., once documents have been indexed, since the sparse
+        vectors of the queries depend on the corpus statistics with the BM25 backend.
+
+        Args:
+            coll_name (Optional[str]): If given, only the queries of this collection are dropped.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if coll_name is None or key[0] == coll_name:
+                    del self._entries[key]
+
+    def get_or_compute(
+        self, coll_name: str, query_text: str, compute: Callable[[str], QueryVectors]
+    ) -> QueryVectors:
+        """
+        Returns the cached vectors of a query, computing and storing them on a miss.
+
+        Args:
+            coll_name (str): The name of the searched collection.
+            query_text (str): The query text.
+            compute (Callable[[str], QueryVectors]): The function embedding the (normalized) query.
+
+        Returns:
+            QueryVectors: The dense and sparse vectors of the query.
+        """
+        vectors = self.get(coll_name, query_text)
+        if vectors is not None:
+            with self._lock:
+                self.hits += 1
+            return vectors
+
+        start = time.perf_counter()
+        vectors = compute(normalize_query(query_text))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.misses += 1
+            self._encode_time_s += elapsed
+        self.put(coll_name, query_text, vectors)
+        return vectors
+
+    async def get_or_compute_async(
+        self,
+        coll_name: str,
+        query_text: str,
+        compute: Callable[[str], Awaitable[QueryVectors]],
+    ) -> QueryVectors:
+        """
+        Returns the cached vectors of a query, awaiting their computation and storing them on a miss.
+
+        Args:
+            coll_name (str): The name of the searched collection.
+            query_text (str): The query text.
+            compute (Callable[[str], Awaitable[QueryVectors]]): The coroutine function embedding the (normalized) query.
+
+        Returns:
+            QueryVectors: The dense and sparse vectors of the query.
+        """
+        vectors = self.get(coll_name, query_text)
+        if vectors is not None:
+            with self._lock:
+                self.hits += 1
+            return vectors
+
+        start = time.perf_counter()
+        vectors = await compute(normalize_query(query_text))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.misses += 1
+            self._encode_time_s += elapsed
+        self.put(coll_name, query_text, vectors)
+        return vectors
+
+    def get_or_compute_many(
+        self,
+        coll_name: str,
+        query_texts: list[str],
+        compute_many: Callable[[list[str]], list[QueryVectors]],
+    ) -> list[QueryVectors]:
+        """
+        Returns the cached vectors of many queries, computing the missing ones in a single call.
+
+        Args:
+            coll_name (str): The name of the searched collection.
+            query_texts (list[str]): The query texts.
+            compute_many (Callable[[list[str]], list[QueryVectors]]): The function embedding a list
+                of (normalized) queries, in order.
+
+        Returns:
+            list[QueryVectors]: The dense and sparse vectors of each query, in input order.
+        """
+        out: list[Optional[QueryVectors]] = [
+            self.get(coll_name, q) for q in query_texts
+        ]
+        # each distinct query is computed once, even if repeated
+        missing = list(
+            dict.fromkeys(
+                normalize_query(q) for q, v in zip(query_texts, out) if v is None
+            )
+        )
+        with self._lock:
+            self.hits += len(query_texts) - sum(v is None for v in out)
+        if not missing:
+            return out
+
+        start = time.perf_counter()
+        computed = dict(zip(missing, compute_many(missing)))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.misses += len(missing)
+            self._encode_time_s += elapsed
+        for key, vectors in computed.items():
+            self.put(coll_name, key, vectors)
+        return [
+            v if v is not None else computed[normalize_query(q)]
+            for q, v in zip(query_texts, out)
+        ]
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        """
+        Returns the hit-rate statistics of the cache.
+
+        The encoding time saved is estimated as the number of hits times the mean
+        encoding time of the misses.
+
+        Returns:
+            dict: The number of hits, misses and evictions, the hit rate, the mean
+                encoding time of a miss and the estimated encoding time saved, in seconds.
+        """
+        with self._lock:
+            n_calls = self.hits + self.misses
+            mean_encode_s = self._encode_time_s / self.misses if self.misses else 0.0
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / n_calls if n_calls > 0 else 0.0,
+                "mean_encode_s": mean_encode_s,
+                "saved_encode_s": self.hits * mean_encode_s,
+            }
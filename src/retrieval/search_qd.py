@@ -1,10 +1,36 @@
-from typing import List
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, List, Optional, Union
 
-from qdrant_client.models import ScoredPoint, SparseVector
+from qdrant_client.models import Filter, ScoredPoint, SparseVector
 
-from embedding.dense import compute_dense_vector
-from embedding.sparse import compute_sparse_vector
-from retrieval.vdb_wrapper import SearchInVdb
+from embedding.dense import compute_dense_vector, compute_dense_vectors
+from embedding.sparse import (
+    COLLECTION_NAME,
+    compute_sparse_query_vectors,
+    compute_sparse_vector,
+)
+from retrieval.fusion import fuse_batch
+from retrieval.query_cache import QueryEmbeddingCache, QueryVectors
+from retrieval.vdb_wrapper import AsyncSearchInVdb, SearchInVdb
+from utility.read_config import get_config_from_path
+
+dct_config = get_config_from_path("config.yaml")
+
+QUANTIZATION_CONFIG = dct_config["VECTOR_DB"]["DENSE_QUANTIZATION"]
+SEARCH_BATCH_SIZE = dct_config["RAG"]["SEARCH_BATCH_SIZE"]
+FUSION_CONFIG = dct_config["RAG"]["FUSION"]
+
+query_cache = QueryEmbeddingCache(
+    max_size=dct_config["RAG"]["QUERY_CACHE_SIZE"],
+    ttl_s=dct_config["RAG"]["QUERY_CACHE_TTL_S"],
+)
+
+# one thread per encoder: the two encoders run at the same time, but a (Rust) tokenizer
+# must not be used by two threads at a time; threads are started on first use
+dense_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dense-query")
+sparse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sparse-query")
 
 
 def print_info(r: ScoredPoint):
@@ -20,44 +46,321 @@ def print_info(r: ScoredPoint):
     print()
 
 
+def embed_query(query_text: str, coll_name: str = COLLECTION_NAME) -> QueryVectors:
+    """
+    Computes the dense and sparse vectors of a query.
+
+    Args:
+        query_text (str): The query text.
+        coll_name (str): The collection searched: with the BM25 backend, its corpus statistics
+            weight the sparse vector.
+
+    Returns:
+        QueryVectors: The dense vector and the sparse vector of the query.
+    """
+    return compute_dense_vector(query_text), SparseVector(
+        **compute_sparse_vector(query_text, coll_name=coll_name)
+    )
+
+
+def embed_queries(
+    query_texts: list[str], coll_name: str = COLLECTION_NAME
+) -> list[QueryVectors]:
+    """
+    Computes the dense and sparse vectors of many queries, in batches.
+
+    Args:
+        query_texts (list[str]): The query texts.
+        coll_name (str): The collection searched: with the BM25 backend, its corpus statistics
+            weight the sparse vectors.
+
+    Returns:
+        list[QueryVectors]: The dense vector and the sparse vector of each query, in input order.
+    """
+    # queries are not stored in the embedding cache, which keeps the vectors of the documents
+    dense_vectors = compute_dense_vectors(query_texts, use_cache=False)
+    sparse_vectors = compute_sparse_query_vectors(query_texts, coll_name=coll_name)
+    return [
+        (dense_vector.tolist(), SparseVector(**sparse_vector))
+        for dense_vector, sparse_vector in zip(dense_vectors, sparse_vectors)
+    ]
+
+
+async def embed_query_async(
+    query_text: str, coll_name: str = COLLECTION_NAME
+) -> QueryVectors:
+    """
+    Computes the dense and sparse vectors of a query concurrently, on the encoder executors.
+
+    Args:
+        query_text (str): The query text.
+        coll_name (str): The collection searched: with the BM25 backend, its corpus statistics
+            weight the sparse vector.
+
+    Returns:
+        QueryVectors: The dense vector and the sparse vector of the query.
+    """
+    loop = asyncio.get_running_loop()
+    dense_vector, sparse_vector = await asyncio.gather(
+        loop.run_in_executor(dense_executor, compute_dense_vector, query_text),
+        loop.run_in_executor(
+            sparse_executor,
+            partial(compute_sparse_vector, query_text, coll_name=coll_name),
+        ),
+    )
+    return dense_vector, SparseVector(**sparse_vector)
+
+
+def get_fusion_config(coll_name: str) -> dict[str, Any]:
+    """
+    Returns the fusion settings of a collection.
+
+    Args:
+        coll_name (str): The name of the collection.
+
+    Returns:
+        dict[str, Any]: The METHOD, DENSE_WEIGHT, SPARSE_WEIGHT and RRF_K of the collection
+            in config.yaml (those of DEFAULT, overridden by the section of the collection).
+    """
+    return {**FUSION_CONFIG["DEFAULT"], **(FUSION_CONFIG.get(coll_name) or {})}
+
+
+def fuse_dense_sparse(
+    dense_hits: List[List[ScoredPoint]],
+    sparse_hits: List[List[ScoredPoint]],
+    k: int,
+    fusion: dict[str, Any],
+) -> List[List[ScoredPoint]]:
+    """
+    Merges the dense and sparse results of many queries, client-side (see `retrieval.fusion`).
+
+    Args:
+        dense_hits (List[List[ScoredPoint]]): For each query, the results of the dense search.
+        sparse_hits (List[List[ScoredPoint]]): For each query, the results of the sparse search.
+        k (int): The number of results to return per query.
+        fusion (dict[str, Any]): The fusion settings (see `get_fusion_config`).
+
+    Returns:
+        List[List[ScoredPoint]]: For each query, its top-k points, with the fused score.
+    """
+    return fuse_batch(
+        [dense_hits, sparse_hits],
+        weights=[fusion["DENSE_WEIGHT"], fusion["SPARSE_WEIGHT"]],
+        method=fusion["METHOD"],
+        k=k,
+        rrf_k=fusion["RRF_K"],
+    )
+
+
 def main_search(
-    searcher: SearchInVdb, query_text: str, sp_k: int = 20, de_k: int = 20, k: int = 5
+    searcher: SearchInVdb,
+    query_text: str,
+    sp_k: int = 20,
+    de_k: int = 20,
+    k: int = 5,
+    oversampling: Optional[float] = QUANTIZATION_CONFIG["OVERSAMPLING"],
+    rescore: Optional[bool] = QUANTIZATION_CONFIG["RESCORE"],
+    query_filter: Optional[Filter] = None,
+    with_payload: Union[bool, List[str]] = True,
+    fusion: Optional[dict[str, Any]] = None,
 ) -> List[ScoredPoint]:
     """
     Performs a search using the provided searcher with the given query text.
 
     Args:
         searcher (SearchInVdb): The SearchInVdb instance used to perform the search.
-        query_text (str): The query text to be converted into dense and sparse vectors.
+        query_text (str): The query text to be converted into dense and sparse vectors (cached in memory).
         sp_k (int): The number of top results to return from the sparse search.
         de_k (int): The number of top results to return from the dense search.
         k (int): The total number of results to return.
+        oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates per result.
+        rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the candidates
+            with the original vectors.
+        query_filter (Optional[Filter]): If given, only the chunks matching it are searched
+            (e.g., built with `retrieval.vdb_wrapper.build_filter`).
+        with_payload (Union[bool, List[str]]): Whether to return the payloads, or the payload fields to return.
+        fusion (Optional[dict[str, Any]]): The fusion settings (see `get_fusion_config`). If None,
+            those of the collection in config.yaml.
 
     Returns:
         List[ScoredPoint]: The list of scored points resulting from the search.
     """
-    query_sparse_vector = SparseVector(**compute_sparse_vector(query_text))
-    query_dense_vector = compute_dense_vector(query_text)
+    query_dense_vector, query_sparse_vector = query_cache.get_or_compute(
+        searcher.coll_name,
+        query_text,
+        partial(embed_query, coll_name=searcher.coll_name),
+    )
 
     # res = searcher.dense(query_dense_vector, k=5)
     # res = searcher.sparse(query_sparse_vector, k=5)
 
+    fusion = fusion or get_fusion_config(searcher.coll_name)
+    if fusion["METHOD"] != "qdrant":
+        dense_hits, sparse_hits = searcher.dense_sparse_batch(
+            de_query_vectors=[query_dense_vector],
+            sp_query_vectors=[query_sparse_vector],
+            sp_k=sp_k,
+            de_k=de_k,
+            oversampling=oversampling,
+            rescore=rescore,
+            query_filter=query_filter,
+            with_payload=with_payload,
+        )
+        return fuse_dense_sparse(dense_hits, sparse_hits, k, fusion)[0]
+
     res = searcher.hybrid_qd(
         de_query_vector=query_dense_vector,
         sp_query_vector=query_sparse_vector,
         sp_k=sp_k,  # e.g., 20
         de_k=de_k,  # e.g., 20
         k=k,  # e.g., 5
+        oversampling=oversampling,
+        rescore=rescore,
+        query_filter=query_filter,
+        with_payload=with_payload,
     )
     return res
 
 
-if __name__ == "__main__":
-    from qdrant_client.qdrant_client import QdrantClient
+async def main_search_async(
+    searcher: AsyncSearchInVdb,
+    query_text: str,
+    sp_k: int = 20,
+    de_k: int = 20,
+    k: int = 5,
+    oversampling: Optional[float] = QUANTIZATION_CONFIG["OVERSAMPLING"],
+    rescore: Optional[bool] = QUANTIZATION_CONFIG["RESCORE"],
+    query_filter: Optional[Filter] = None,
+    with_payload: Union[bool, List[str]] = True,
+    fusion: Optional[dict[str, Any]] = None,
+) -> List[ScoredPoint]:
+    """
+    Performs the search of `main_search` without blocking the event loop: the dense and
+    sparse query vectors are computed at the same time, in executor threads, and the
+    vector database is awaited, so many searches can share one event loop.
+
+    Args:
+        searcher (AsyncSearchInVdb): The AsyncSearchInVdb instance used to perform the search.
+        query_text (str): The query text to be converted into dense and sparse vectors (cached in memory).
+        sp_k (int): The number of top results to return from the sparse search.
+        de_k (int): The number of top results to return from the dense search.
+        k (int): The total number of results to return.
+        oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates per result.
+        rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the candidates
+            with the original vectors.
+        query_filter (Optional[Filter]): If given, only the chunks matching it are searched.
+        with_payload (Union[bool, List[str]]): Whether to return the payloads, or the payload fields to return.
+        fusion (Optional[dict[str, Any]]): The fusion settings (see `get_fusion_config`). If None,
+            those of the collection in config.yaml.
+
+    Returns:
+        List[ScoredPoint]: The list of scored points resulting from the search.
+    """
+    query_dense_vector, query_sparse_vector = await query_cache.get_or_compute_async(
+        searcher.coll_name,
+        query_text,
+        partial(embed_query_async, coll_name=searcher.coll_name),
+    )
+    fusion = fusion or get_fusion_config(searcher.coll_name)
+    if fusion["METHOD"] != "qdrant":
+        dense_hits, sparse_hits = await searcher.dense_sparse(
+            de_query_vector=query_dense_vector,
+            sp_query_vector=query_sparse_vector,
+            sp_k=sp_k,
+            de_k=de_k,
+            oversampling=oversampling,
+            rescore=rescore,
+            query_filter=query_filter,
+            with_payload=with_payload,
+        )
+        return fuse_dense_sparse([dense_hits], [sparse_hits], k, fusion)[0]
+    return await searcher.hybrid_qd(
+        de_query_vector=query_dense_vector,
+        sp_query_vector=query_sparse_vector,
+        sp_k=sp_k,
+        de_k=de_k,
+        k=k,
+        oversampling=oversampling,
+        rescore=rescore,
+        query_filter=query_filter,
+        with_payload=with_payload,
+    )
+
+
+def main_search_batch(
+    searcher: SearchInVdb,
+    query_texts: List[str],
+    sp_k: int = 20,
+    de_k: int = 20,
+    k: int = 5,
+    oversampling: Optional[float] = QUANTIZATION_CONFIG["OVERSAMPLING"],
+    rescore: Optional[bool] = QUANTIZATION_CONFIG["RESCORE"],
+    query_filter: Optional[Filter] = None,
+    with_payload: Union[bool, List[str]] = True,
+    fusion: Optional[dict[str, Any]] = None,
+    batch_size: int = SEARCH_BATCH_SIZE,
+) -> List[List[ScoredPoint]]:
+    """
+    Performs the search of `main_search` for many queries (e.g., an evaluation set):
+    the queries not in the cache are embedded in batches, and searched with one request
+    per batch of queries.
+
+    Args:
+        searcher (SearchInVdb): The SearchInVdb instance used to perform the searches.
+        query_texts (List[str]): The query texts.
+        sp_k (int): The number of top results to return from the sparse search.
+        de_k (int): The number of top results to return from the dense search.
+        k (int): The total number of results to return per query.
+        oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates per result.
+        rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the candidates
+            with the original vectors.
+        query_filter (Optional[Filter]): If given, only the chunks matching it are searched.
+        with_payload (Union[bool, List[str]]): Whether to return the payloads, or the payload fields to return.
+        fusion (Optional[dict[str, Any]]): The fusion settings (see `get_fusion_config`). If None,
+            those of the collection in config.yaml.
+        batch_size (int): The number of queries sent to the vector database per request.
+
+    Returns:
+        List[List[ScoredPoint]]: For each query, in input order, the scored points resulting from the search.
+    """
+    query_vectors = query_cache.get_or_compute_many(
+        searcher.coll_name,
+        query_texts,
+        partial(embed_queries, coll_name=searcher.coll_name),
+    )
+    de_query_vectors = [dense_vector for dense_vector, _ in query_vectors]
+    sp_query_vectors = [sparse_vector for _, sparse_vector in query_vectors]
+    fusion = fusion or get_fusion_config(searcher.coll_name)
+    if fusion["METHOD"] != "qdrant":
+        # all the queries are fused at once
+        dense_hits, sparse_hits = searcher.dense_sparse_batch(
+            de_query_vectors=de_query_vectors,
+            sp_query_vectors=sp_query_vectors,
+            sp_k=sp_k,
+            de_k=de_k,
+            oversampling=oversampling,
+            rescore=rescore,
+            query_filter=query_filter,
+            with_payload=with_payload,
+            batch_size=batch_size,
+        )
+        return fuse_dense_sparse(dense_hits, sparse_hits, k, fusion)
+    return searcher.hybrid_qd_batch(
+        de_query_vectors=de_query_vectors,
+        sp_query_vectors=sp_query_vectors,
+        sp_k=sp_k,
+        de_k=de_k,
+        k=k,
+        oversampling=oversampling,
+        rescore=rescore,
+        query_filter=query_filter,
+        with_payload=with_payload,
+        batch_size=batch_size,
+    )
 
-    from utility.read_config import get_config_from_path
 
-    dct_config = get_config_from_path("config.yaml")
+if __name__ == "__main__":
+    from qdrant_client.qdrant_client import QdrantClient
 
     client = QdrantClient(path=dct_config["VECTOR_DB"]["PATH_TO_FOLDER"])
     searcher = SearchInVdb(
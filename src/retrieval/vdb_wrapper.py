@@ -1,7 +1,180 @@
-from qdrant_client import QdrantClient, models
+import re
+from typing import Optional, Union
 
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
 
-class SearchInVdb:
+# the version suffix of arXiv ids (e.g., the v2 of 2401.00001v2), not part of the indexed ids
+ARXIV_VERSION_PATTERN = re.compile(r"v\d+$")
+
+
+def build_search_params(
+    oversampling: Optional[float] = None, rescore: Optional[bool] = None
+) -> Optional[models.SearchParams]:
+    """
+    Builds the search params of quantized dense vectors (ignored if the vectors are not quantized).
+
+    Args:
+        oversampling (Optional[float]): The number of candidates scored with the quantized vectors,
+            per result. If None, the default of the collection.
+        rescore (Optional[bool]): Whether to re-score the candidates with the original vectors.
+            If None, the default of the collection.
+
+    Returns:
+        Optional[models.SearchParams]: The search params, or None if both are None.
+    """
+    if oversampling is None and rescore is None:
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            oversampling=oversampling, rescore=rescore
+        )
+    )
+
+
+def build_filter(
+    arxiv_ids: Optional[list[str]] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    keywords: Optional[list[str]] = None,
+    title_text: Optional[str] = None,
+    ingest_batches: Optional[list[str]] = None,
+) -> Optional[models.Filter]:
+    """
+    Builds a filter of the chunks on the indexed fields of their payload (all conditions must hold).
+
+    Args:
+        arxiv_ids (Optional[list[str]]): If given, the arXiv ids of the papers to search in (any version
+            is searched: version suffixes are ignored).
+        min_year (Optional[int]): If given, the min year of the papers.
+        max_year (Optional[int]): If given, the max year of the papers.
+        keywords (Optional[list[str]]): If given, the ingestion keywords the papers have been downloaded for.
+        title_text (Optional[str]): If given, words the titles of the papers must contain.
+        ingest_batches (Optional[list[str]]): If given, the ingestion runs which indexed the chunks.
+
+    Returns:
+        Optional[models.Filter]: The filter, or None if no condition is given.
+    """
+    conditions = []
+    if arxiv_ids is not None:
+        arxiv_ids = [ARXIV_VERSION_PATTERN.sub("", arxiv_id) for arxiv_id in arxiv_ids]
+    for key, values in [
+        ("arxiv_id", arxiv_ids),
+        ("keyword", keywords),
+        ("ingest_batch", ingest_batches),
+    ]:
+        if values is not None:
+            conditions.append(
+                models.FieldCondition(key=key, match=models.MatchAny(any=values))
+            )
+    if min_year is not None or max_year is not None:
+        conditions.append(
+            models.FieldCondition(
+                key="year", range=models.Range(gte=min_year, lte=max_year)
+            )
+        )
+    if title_text is not None:
+        conditions.append(
+            models.FieldCondition(key="title", match=models.MatchText(text=title_text))
+        )
+    return models.Filter(must=conditions) if conditions else None
+
+
+class _SearchRequests:
+    # the query requests shared by the sync and async searchers (see SearchInVdb for the args)
+    coll_name: str
+    dense_vect_name: str
+    sparse_vect_name: str
+
+    def _hybrid_prefetch(
+        self,
+        de_query_vector: list[float],
+        sp_query_vector: models.SparseVector,
+        sp_k: int,
+        de_k: int,
+        oversampling: Optional[float],
+        rescore: Optional[bool],
+        query_filter: Optional[models.Filter],
+    ) -> list[models.Prefetch]:
+        return [
+            models.Prefetch(
+                query=sp_query_vector,
+                using=self.sparse_vect_name,
+                filter=query_filter,
+                limit=sp_k,
+            ),
+            models.Prefetch(
+                query=de_query_vector,
+                using=self.dense_vect_name,
+                params=build_search_params(oversampling, rescore),
+                filter=query_filter,
+                limit=de_k,
+            ),
+        ]
+
+    def _dense_request(
+        self,
+        query_vector: list[float],
+        k: int,
+        oversampling: Optional[float],
+        rescore: Optional[bool],
+        query_filter: Optional[models.Filter],
+        with_payload: Union[bool, list[str]],
+    ) -> models.QueryRequest:
+        return models.QueryRequest(
+            query=query_vector,
+            using=self.dense_vect_name,
+            filter=query_filter,
+            params=build_search_params(oversampling, rescore),
+            with_payload=with_payload,
+            limit=k,
+        )
+
+    def _sparse_request(
+        self,
+        query_vector: models.SparseVector,
+        k: int,
+        query_filter: Optional[models.Filter],
+        with_payload: Union[bool, list[str]],
+    ) -> models.QueryRequest:
+        return models.QueryRequest(
+            query=query_vector,
+            using=self.sparse_vect_name,
+            filter=query_filter,
+            with_payload=with_payload,
+            limit=k,
+        )
+
+    def _hybrid_request(
+        self,
+        de_query_vector: list[float],
+        sp_query_vector: models.SparseVector,
+        sp_k: int,
+        de_k: int,
+        k: int,
+        oversampling: Optional[float],
+        rescore: Optional[bool],
+        query_filter: Optional[models.Filter],
+        with_payload: Union[bool, list[str]],
+    ) -> models.QueryRequest:
+        return models.QueryRequest(
+            prefetch=self._hybrid_prefetch(
+                de_query_vector,
+                sp_query_vector,
+                sp_k,
+                de_k,
+                oversampling,
+                rescore,
+                query_filter,
+            ),
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            with_payload=with_payload,
+            limit=k,
+            # explicit, as the local mode adds it to the prefetch limits
+            offset=0,
+        )
+
+
+class SearchInVdb(_SearchRequests):
     def __init__(
         self,
         client: QdrantClient,
@@ -23,13 +196,27 @@ class SearchInVdb:
         self.dense_vect_name = dense_vect_name
         self.sparse_vect_name = sparse_vect_name
 
-    def dense(self, query_vector: list[float], k: int = 5) -> list[models.ScoredPoint]:
+    def dense(
+        self,
+        query_vector: list[float],
+        k: int = 5,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+    ) -> list[models.ScoredPoint]:
         """
         Performs a dense vector search.
 
         Args:
             query_vector (List[float]): The dense vector to search with.
             k (int): The number of top results to return.
+            oversampling (Optional[float]): If the vectors are quantized, the number of candidates per result.
+            rescore (Optional[bool]): If the vectors are quantized, whether to re-score the candidates
+                with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched
+                (e.g., built with `build_filter`).
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
 
         Returns:
             List[models.ScoredPoint]: The top-k scored points resulting from the search.
@@ -40,18 +227,21 @@ class SearchInVdb:
                 name=self.dense_vect_name,
                 vector=query_vector,
             ),
-            # query_filter=models.Filter(must=[models.FieldCondition(key='title',
-            #                                                        match=models.MatchAny(
-            #                                                            any=['Super_Bowl_50', 'Orso']))]),
-            # many types of filter available (still not tried) among which:
-            # range, is Null, exact match, etc..
+            # filtered during the search, by the payload indexes
             # for more info, https://qdrant.tech/articles/vector-search-filtering/
+            query_filter=query_filter,
+            search_params=build_search_params(oversampling, rescore),
+            with_payload=with_payload,
             limit=k,
         )
         return hits
 
     def sparse(
-        self, query_vector: models.SparseVector, k: int = 5
+        self,
+        query_vector: models.SparseVector,
+        k: int = 5,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
     ) -> list[models.ScoredPoint]:
         """
         Performs a sparse vector search.
@@ -59,6 +249,8 @@ class SearchInVdb:
         Args:
             query_vector (models.SparseVector): The sparse vector to search with.
             k (int): The number of top results to return.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
 
         Returns:
             List[models.ScoredPoint]: The top-k scored points resulting from the search.
@@ -69,6 +261,8 @@ class SearchInVdb:
                 name=self.sparse_vect_name,
                 vector=query_vector,
             ),
+            query_filter=query_filter,
+            with_payload=with_payload,
             limit=k,
         )
         return hits
@@ -80,6 +274,10 @@ class SearchInVdb:
         sp_k: int = 20,
         de_k: int = 20,
         k: int = 5,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
     ) -> list[models.ScoredPoint]:
         """Performs a hybrid query combining dense and sparse vector searches.
         From https://qdrant.tech/documentation/concepts/hybrid-queries/#hybrid-search
@@ -89,25 +287,398 @@ class SearchInVdb:
             sp_k (int): The number of top results to return from the sparse search.
             de_k (int): The number of top results to return from the dense search.
             k (int): The total number of results to return.
+            oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates
+                per result of the dense search.
+            rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the
+                candidates of the dense search with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched,
+                by both the dense and the sparse search.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
 
         Returns:
             List[models.ScoredPoint]: The top-k scored points resulting from the hybrid search.
         """
         hits = self.client.query_points(
             collection_name=self.coll_name,
-            prefetch=[
-                models.Prefetch(
-                    query=sp_query_vector,
-                    using=self.sparse_vect_name,
-                    limit=sp_k,
-                ),
-                models.Prefetch(
-                    query=de_query_vector,
-                    using=self.dense_vect_name,
-                    limit=de_k,
-                ),
-            ],
+            prefetch=self._hybrid_prefetch(
+                de_query_vector,
+                sp_query_vector,
+                sp_k,
+                de_k,
+                oversampling,
+                rescore,
+                query_filter,
+            ),
             query=models.FusionQuery(fusion=models.Fusion.RRF),
+            with_payload=with_payload,
             limit=k,
         ).points
         return hits
+
+    def _query_batch(
+        self, requests: list[models.QueryRequest], batch_size: int
+    ) -> list[list[models.ScoredPoint]]:
+        # one round-trip per batch of queries, results in input order
+        results = []
+        for i in range(0, len(requests), batch_size):
+            results += [
+                response.points
+                for response in self.client.query_batch_points(
+                    collection_name=self.coll_name,
+                    requests=requests[i : i + batch_size],
+                )
+            ]
+        return results
+
+    def dense_batch(
+        self,
+        query_vectors: list[list[float]],
+        k: int = 5,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+        batch_size: int = 64,
+    ) -> list[list[models.ScoredPoint]]:
+        """
+        Performs many dense vector searches, with one request per batch of queries.
+
+        Args:
+            query_vectors (list[list[float]]): The dense vectors to search with.
+            k (int): The number of top results to return per query.
+            oversampling (Optional[float]): If the vectors are quantized, the number of candidates per result.
+            rescore (Optional[bool]): If the vectors are quantized, whether to re-score the candidates
+                with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+            batch_size (int): The number of queries sent to the vector database per request.
+
+        Returns:
+            list[list[models.ScoredPoint]]: For each query, in input order, its top-k scored points.
+        """
+        requests = [
+            self._dense_request(
+                query_vector, k, oversampling, rescore, query_filter, with_payload
+            )
+            for query_vector in query_vectors
+        ]
+        return self._query_batch(requests, batch_size)
+
+    def sparse_batch(
+        self,
+        query_vectors: list[models.SparseVector],
+        k: int = 5,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+        batch_size: int = 64,
+    ) -> list[list[models.ScoredPoint]]:
+        """
+        Performs many sparse vector searches, with one request per batch of queries.
+
+        Args:
+            query_vectors (list[models.SparseVector]): The sparse vectors to search with.
+            k (int): The number of top results to return per query.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+            batch_size (int): The number of queries sent to the vector database per request.
+
+        Returns:
+            list[list[models.ScoredPoint]]: For each query, in input order, its top-k scored points.
+        """
+        requests = [
+            self._sparse_request(query_vector, k, query_filter, with_payload)
+            for query_vector in query_vectors
+        ]
+        return self._query_batch(requests, batch_size)
+
+    def hybrid_qd_batch(
+        self,
+        de_query_vectors: list[list[float]],
+        sp_query_vectors: list[models.SparseVector],
+        sp_k: int = 20,
+        de_k: int = 20,
+        k: int = 5,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+        batch_size: int = 64,
+    ) -> list[list[models.ScoredPoint]]:
+        """Performs many hybrid queries (see `hybrid_qd`), with one request per batch of queries.
+
+        Args:
+            de_query_vectors (list[list[float]]): The dense vectors to search with.
+            sp_query_vectors (list[models.SparseVector]): The sparse vectors to search with, one per dense vector.
+            sp_k (int): The number of top results to return from the sparse search.
+            de_k (int): The number of top results to return from the dense search.
+            k (int): The total number of results to return per query.
+            oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates
+                per result of the dense search.
+            rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the
+                candidates of the dense search with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched,
+                by both the dense and the sparse search.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+            batch_size (int): The number of queries sent to the vector database per request.
+
+        Raises:
+            ValueError: If the numbers of dense and sparse vectors differ.
+
+        Returns:
+            list[list[models.ScoredPoint]]: For each query, in input order, its top-k scored points.
+        """
+        if len(de_query_vectors) != len(sp_query_vectors):
+            raise ValueError("dense and sparse query vectors must have the same length")
+        requests = [
+            self._hybrid_request(
+                de_query_vector,
+                sp_query_vector,
+                sp_k,
+                de_k,
+                k,
+                oversampling,
+                rescore,
+                query_filter,
+                with_payload,
+            )
+            for de_query_vector, sp_query_vector in zip(
+                de_query_vectors, sp_query_vectors
+            )
+        ]
+        return self._query_batch(requests, batch_size)
+
+    def dense_sparse_batch(
+        self,
+        de_query_vectors: list[list[float]],
+        sp_query_vectors: list[models.SparseVector],
+        sp_k: int = 20,
+        de_k: int = 20,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+        batch_size: int = 64,
+    ) -> tuple[list[list[models.ScoredPoint]], list[list[models.ScoredPoint]]]:
+        """Performs the dense and the sparse searches of many queries, to be fused client-side
+        (see `retrieval.fusion`), with one request per batch of queries.
+
+        Args:
+            de_query_vectors (list[list[float]]): The dense vectors to search with.
+            sp_query_vectors (list[models.SparseVector]): The sparse vectors to search with, one per dense vector.
+            sp_k (int): The number of top results to return from the sparse search.
+            de_k (int): The number of top results to return from the dense search.
+            oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates
+                per result of the dense search.
+            rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the
+                candidates of the dense search with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched,
+                by both the dense and the sparse search.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+            batch_size (int): The number of queries sent to the vector database per request.
+
+        Raises:
+            ValueError: If the numbers of dense and sparse vectors differ.
+
+        Returns:
+            tuple[list[list[models.ScoredPoint]], list[list[models.ScoredPoint]]]: For each query,
+                in input order, its top-de_k dense and its top-sp_k sparse scored points.
+        """
+        if len(de_query_vectors) != len(sp_query_vectors):
+            raise ValueError("dense and sparse query vectors must have the same length")
+        requests = []
+        for de_query_vector, sp_query_vector in zip(de_query_vectors, sp_query_vectors):
+            requests.append(
+                self._dense_request(
+                    de_query_vector,
+                    de_k,
+                    oversampling,
+                    rescore,
+                    query_filter,
+                    with_payload,
+                )
+            )
+            requests.append(
+                self._sparse_request(sp_query_vector, sp_k, query_filter, with_payload)
+            )
+        # the dense and sparse requests of a query go in the same batch
+        results = self._query_batch(requests, 2 * batch_size)
+        return results[0::2], results[1::2]
+
+
+class AsyncSearchInVdb(_SearchRequests):
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        coll_name: str,
+        dense_vect_name: str = "text-dense",
+        sparse_vect_name: str = "text-sparse",
+    ):
+        """
+        Initializes the AsyncSearchInVdb instance, the asyncio version of SearchInVdb:
+        many searches can wait for the vector database at the same time, on one event loop.
+
+        Args:
+            client (AsyncQdrantClient): The async Qdrant client instance for database interactions.
+            coll_name (str): The name of the collection to search within.
+            dense_vect_name (str): The name of the dense vector to use for searching.
+            sparse_vect_name (str): The name of the sparse vector to use for searching.
+        """
+        self.client = client
+        self.coll_name = coll_name
+        self.dense_vect_name = dense_vect_name
+        self.sparse_vect_name = sparse_vect_name
+
+    async def _query_many(
+        self, requests: list[models.QueryRequest]
+    ) -> list[list[models.ScoredPoint]]:
+        responses = await self.client.query_batch_points(
+            collection_name=self.coll_name, requests=requests
+        )
+        return [response.points for response in responses]
+
+    async def _query(self, request: models.QueryRequest) -> list[models.ScoredPoint]:
+        return (await self._query_many([request]))[0]
+
+    async def dense(
+        self,
+        query_vector: list[float],
+        k: int = 5,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+    ) -> list[models.ScoredPoint]:
+        """
+        Performs a dense vector search.
+
+        Args:
+            query_vector (List[float]): The dense vector to search with.
+            k (int): The number of top results to return.
+            oversampling (Optional[float]): If the vectors are quantized, the number of candidates per result.
+            rescore (Optional[bool]): If the vectors are quantized, whether to re-score the candidates
+                with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+
+        Returns:
+            List[models.ScoredPoint]: The top-k scored points resulting from the search.
+        """
+        return await self._query(
+            self._dense_request(
+                query_vector, k, oversampling, rescore, query_filter, with_payload
+            )
+        )
+
+    async def sparse(
+        self,
+        query_vector: models.SparseVector,
+        k: int = 5,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+    ) -> list[models.ScoredPoint]:
+        """
+        Performs a sparse vector search.
+
+        Args:
+            query_vector (models.SparseVector): The sparse vector to search with.
+            k (int): The number of top results to return.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+
+        Returns:
+            List[models.ScoredPoint]: The top-k scored points resulting from the search.
+        """
+        return await self._query(
+            self._sparse_request(query_vector, k, query_filter, with_payload)
+        )
+
+    async def hybrid_qd(
+        self,
+        de_query_vector: list[float],
+        sp_query_vector: models.SparseVector,
+        sp_k: int = 20,
+        de_k: int = 20,
+        k: int = 5,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+    ) -> list[models.ScoredPoint]:
+        """Performs a hybrid query combining dense and sparse vector searches (see `SearchInVdb.hybrid_qd`).
+
+        Args:
+            de_query_vector (List[float]): The dense vector to search with.
+            sp_query_vector (models.SparseVector): The sparse vector to search with.
+            sp_k (int): The number of top results to return from the sparse search.
+            de_k (int): The number of top results to return from the dense search.
+            k (int): The total number of results to return.
+            oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates
+                per result of the dense search.
+            rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the
+                candidates of the dense search with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched,
+                by both the dense and the sparse search.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+
+        Returns:
+            List[models.ScoredPoint]: The top-k scored points resulting from the hybrid search.
+        """
+        return await self._query(
+            self._hybrid_request(
+                de_query_vector,
+                sp_query_vector,
+                sp_k,
+                de_k,
+                k,
+                oversampling,
+                rescore,
+                query_filter,
+                with_payload,
+            )
+        )
+
+    async def dense_sparse(
+        self,
+        de_query_vector: list[float],
+        sp_query_vector: models.SparseVector,
+        sp_k: int = 20,
+        de_k: int = 20,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None,
+        query_filter: Optional[models.Filter] = None,
+        with_payload: Union[bool, list[str]] = True,
+    ) -> tuple[list[models.ScoredPoint], list[models.ScoredPoint]]:
+        """Performs the dense and the sparse searches of a query in one request, to be fused
+        client-side (see `SearchInVdb.dense_sparse_batch`).
+
+        Args:
+            de_query_vector (List[float]): The dense vector to search with.
+            sp_query_vector (models.SparseVector): The sparse vector to search with.
+            sp_k (int): The number of top results to return from the sparse search.
+            de_k (int): The number of top results to return from the dense search.
+            oversampling (Optional[float]): If the dense vectors are quantized, the number of candidates
+                per result of the dense search.
+            rescore (Optional[bool]): If the dense vectors are quantized, whether to re-score the
+                candidates of the dense search with the original vectors.
+            query_filter (Optional[models.Filter]): If given, only the points matching it are searched,
+                by both the dense and the sparse search.
+            with_payload (Union[bool, list[str]]): Whether to return the payloads, or the payload fields to return.
+
+        Returns:
+            tuple[list[models.ScoredPoint], list[models.ScoredPoint]]: The top-de_k dense and the
+                top-sp_k sparse scored points.
+        """
+        dense_hits, sparse_hits = await self._query_many(
+            [
+                self._dense_request(
+                    de_query_vector,
+                    de_k,
+                    oversampling,
+                    rescore,
+                    query_filter,
+                    with_payload,
+                ),
+                self._sparse_request(sp_query_vector, sp_k, query_filter, with_payload),
+            ]
+        )
+        return dense_hits, sparse_hits
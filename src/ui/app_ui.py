@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import streamlit as st
 
@@ -42,17 +43,24 @@ if __name__ == "__main__":
     )
 
     if st.session_state.ongoing_ingestion:
+        log_handler = create_log_handler(
+            StreamlitLogHandler, resources.log_formatter, log_container.code
+        )
         resources.setup_task_logger(
             handlers=[
-                create_log_handler(
-                    StreamlitLogHandler, resources.log_formatter, log_container.code
-                ),
+                log_handler,
                 create_log_handler(logging.StreamHandler, resources.log_formatter),
             ]
         )
 
-        # starting ingestion
-        resources.ingest(keyword=keyword_input)
+        # starting ingestion, in a thread: its stages log from their own threads, whose
+        # messages are shown from here (Streamlit only updates widgets from the script thread)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            ingestion = executor.submit(resources.ingest, keyword=keyword_input)
+            while wait([ingestion], timeout=0.5).not_done:
+                log_handler.update_widget()
+            log_handler.update_widget()
+            ingestion.result()
 
         st.session_state.ongoing_ingestion = False
         resources.setup_task_logger(
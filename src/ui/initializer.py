@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 from pydantic import BaseModel, ConfigDict
 from qdrant_client.qdrant_client import QdrantClient
 
+from embedding.dense import warmup as warmup_dense_encoder
+from embedding.sparse import warmup as warmup_sparse_encoder
 from ingestion.ingesting import ingest
 from ingestion.vdb_wrapper import LoadInVdb
 from llm.api_call import main_api_call
@@ -38,8 +40,8 @@ def initialize() -> AppParams:
     """
     Initializes the application parameters and configurations.
 
-    Loads environment variables, configurations, sets up logging, and initializes
-    the Qdrant client and related components.
+    Loads environment variables, configurations, sets up logging, loads the encoders
+    and initializes the Qdrant client and related components.
 
     Returns:
         AppParams: The application parameters containing configuration and services.
@@ -64,6 +66,10 @@ def initialize() -> AppParams:
         force=True,
     )
 
+    # encoders are loaded once here, so that the first question is not slowed down
+    warmup_dense_encoder()
+    warmup_sparse_encoder()
+
     client = QdrantClient(path=dct_config["VECTOR_DB"]["PATH_TO_FOLDER"])
 
     # for Retrieval
@@ -1,4 +1,5 @@
 import logging
+import threading
 from typing import Callable, List, Type
 
 
@@ -6,27 +7,46 @@ class StreamlitLogHandler(logging.Handler):
     def __init__(self, widget_update_func: Callable[[str], None]) -> None:
         """Initializes the Streamlit log handler.
 
+        Streamlit drops the widget updates made from threads without a script run context:
+        the widget is only updated from the thread creating the handler (the script thread),
+        the messages logged by the other threads are shown when it calls `update_widget`.
+
         Args:
             widget_update_func (Callable[[str], None]): Function to update the widget with log messages.
         """
         super().__init__()
         self.widget_update_func = widget_update_func
         self.log_buffer: List[str] = []
+        self._buffer_lock = threading.Lock()
+        self._is_updated = True
+        self._script_thread = threading.current_thread()
 
     def emit(self, record: logging.LogRecord) -> None:
-        """Processes a log record and updates the widget.
+        """Processes a log record and, in the script thread, updates the widget.
 
         Args:
             record (logging.LogRecord): The log record containing log information.
         """
         msg = self.format(record)
-        self.log_buffer.append(msg)
+        with self._buffer_lock:
+            self.log_buffer.append(msg)
+
+            # Limit the log buffer to the last 15 messages
+            if len(self.log_buffer) > 15:
+                self.log_buffer.pop(0)
+            self._is_updated = False
 
-        # Limit the log buffer to the last 15 messages
-        if len(self.log_buffer) > 15:
-            self.log_buffer.pop(0)
+        if threading.current_thread() is self._script_thread:
+            self.update_widget()
 
-        self.widget_update_func("\n".join(self.log_buffer))
+    def update_widget(self) -> None:
+        """Updates the widget with the messages logged since the last update (call it from the script thread)."""
+        with self._buffer_lock:
+            if self._is_updated:
+                return
+            text = "\n".join(self.log_buffer)
+            self._is_updated = True
+        self.widget_update_func(text)
 
 
 def create_log_handler(
@@ -0,0 +1,36 @@
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LazySingleton(Generic[T]):
+    def __init__(self, factory: Callable[[], T]):
+        """
+        Initializes a thread-safe holder of an object which is created on first use.
+
+        Args:
+            factory (Callable[[], T]): The function creating the object (e.g., loading a model).
+        """
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """
+        Returns the held object, creating it if this is the first call.
+
+        Returns:
+            T: The held object.
+        """
+        if self._instance is None:
+            with self._lock:
+                # double-checked: another thread may have created it while waiting
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    @property
+    def is_loaded(self) -> bool:
+        """bool: Whether the held object has already been created."""
+        return self._instance is not None
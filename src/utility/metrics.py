@@ -0,0 +1,207 @@
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from logging import Logger
+from typing import Any, Iterator, Optional
+
+
+class PipelineMetrics:
+    def __init__(self):
+        """
+        Initializes the throughput metrics of a run of a multi-stage pipeline.
+
+        For each stage, the number of items it processed and the time it spent on them
+        (summed over the threads of the stage) are recorded; the depth of the queues
+        between stages is sampled while the metrics are reported. The busy time of a
+        stage over the elapsed time of its threads (its utilization) points to the
+        bottleneck: the stage close to 100% makes the other ones wait.
+        """
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.stages: dict[str, dict[str, Any]] = {}
+        self.queues: dict[str, queue.Queue] = {}
+        self._depths: dict[str, list[int]] = {}
+        self._stop = threading.Event()
+        self._reporter: Optional[threading.Thread] = None
+
+    def add_stage(self, name: str, unit: str, n_workers: int = 1) -> None:
+        """
+        Registers a stage, in pipeline order.
+
+        Args:
+            name (str): The name of the stage.
+            unit (str): The items processed by the stage (e.g., "files", "chunks").
+            n_workers (int): The number of threads running the stage.
+        """
+        with self._lock:
+            self.stages[name] = {
+                "unit": unit,
+                "n_workers": n_workers,
+                "n_items": 0,
+                "busy_s": 0.0,
+            }
+
+    def watch_queue(self, name: str, q: queue.Queue) -> None:
+        """
+        Registers a queue whose depth is sampled.
+
+        Args:
+            name (str): The name of the queue.
+            q (queue.Queue): The queue.
+        """
+        with self._lock:
+            self.queues[name] = q
+            # sum, number and max of the samples
+            self._depths[name] = [0, 0, 0]
+
+    def record(self, stage: str, seconds: float, n_items: int = 1) -> None:
+        """
+        Records the time spent by a stage on some items.
+
+        Args:
+            stage (str): The name of the stage.
+            seconds (float): The wall time spent.
+            n_items (int): The number of items processed.
+        """
+        with self._lock:
+            self.stages[stage]["n_items"] += n_items
+            self.stages[stage]["busy_s"] += seconds
+
+    @contextmanager
+    def timed(self, stage: str, n_items: int = 1) -> Iterator[None]:
+        """
+        Records the time spent by a stage on some items, in a with block.
+
+        Args:
+            stage (str): The name of the stage.
+            n_items (int): The number of items processed in the block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, n_items)
+
+    def sample_queues(self) -> None:
+        """Samples the depth of the watched queues."""
+        with self._lock:
+            for name, q in self.queues.items():
+                depth = q.qsize()
+                samples = self._depths[name]
+                samples[0] += depth
+                samples[1] += 1
+                samples[2] = max(samples[2], depth)
+
+    def report(self) -> dict[str, Any]:
+        """
+        Returns the metrics recorded so far.
+
+        Returns:
+            dict[str, Any]: The elapsed time and, per stage, the items, busy time, throughput
+                (items per busy second of a thread) and utilization; per queue, the capacity,
+                current, mean and max depth.
+        """
+        elapsed = time.perf_counter() - self._start
+        with self._lock:
+            stages = {
+                name: {
+                    **stage,
+                    "busy_s": round(stage["busy_s"], 3),
+                    "items_per_s": (
+                        round(stage["n_items"] / stage["busy_s"], 2)
+                        if stage["busy_s"] > 0
+                        else None
+                    ),
+                    "utilization": (
+                        round(stage["busy_s"] / (elapsed * stage["n_workers"]), 3)
+                        if elapsed > 0
+                        else None
+                    ),
+                }
+                for name, stage in self.stages.items()
+            }
+            queues = {
+                name: {
+                    "maxsize": q.maxsize,
+                    "depth": q.qsize(),
+                    "mean_depth": (
+                        round(self._depths[name][0] / self._depths[name][1], 2)
+                        if self._depths[name][1]
+                        else None
+                    ),
+                    "max_depth": self._depths[name][2],
+                }
+                for name, q in self.queues.items()
+            }
+        return {"elapsed_s": round(elapsed, 3), "stages": stages, "queues": queues}
+
+    def summary(self) -> str:
+        """
+        Returns a one-line summary of the metrics recorded so far.
+
+        Returns:
+            str: The throughput and utilization of each stage, and the depth of each queue.
+        """
+        report = self.report()
+        stages = ", ".join(
+            f"{name} {s['n_items']} {s['unit']} "
+            f"({s['items_per_s'] or 0:.1f}/s, {100 * (s['utilization'] or 0):.0f}% busy)"
+            for name, s in report["stages"].items()
+        )
+        queues = ", ".join(
+            f"{name} {q['depth']}/{q['maxsize']}"
+            for name, q in report["queues"].items()
+        )
+        return f"after {report['elapsed_s']:.1f} s: {stages}; queues: {queues}"
+
+    def _report_periodically(
+        self, logger: Logger, interval_s: float, sample_interval_s: float
+    ) -> None:
+        next_log = time.perf_counter() + interval_s
+        while not self._stop.wait(sample_interval_s):
+            self.sample_queues()
+            if interval_s > 0 and time.perf_counter() >= next_log:
+                logger.info(f"Throughput {self.summary()}")
+                next_log += interval_s
+
+    def start_reporting(
+        self, logger: Logger, interval_s: float, sample_interval_s: float = 0.5
+    ) -> None:
+        """
+        Starts sampling the queues and logging a summary of the metrics, in a background thread.
+
+        Args:
+            logger (Logger): The logger the summaries are sent to.
+            interval_s (float): The period of the summaries, in seconds (if 0, queues are only sampled).
+            sample_interval_s (float): The period of the samples of the queue depths, in seconds.
+        """
+        self._stop.clear()
+        self._reporter = threading.Thread(
+            target=self._report_periodically,
+            args=(logger, interval_s, sample_interval_s),
+            name="metrics-reporter",
+            daemon=True,
+        )
+        self._reporter.start()
+
+    def stop_reporting(self) -> None:
+        """Stops the background reporting, if started."""
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+
+    def write_report(self, path: str, **extra: Any) -> None:
+        """
+        Writes the metrics to a JSON file.
+
+        Args:
+            path (str): The path of the JSON file.
+            **extra (Any): Other fields of the report (e.g., the counters of the run).
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({**extra, **self.report()}, file, indent=1)
@@ -1,5 +1,6 @@
 import logging
 import os
+from functools import lru_cache
 
 from pyaml_env import parse_config
 
@@ -7,6 +8,7 @@ from pyaml_env import parse_config
 def get_config_from_path(file_name: str) -> dict:
     """
     Loads a YAML configuration file from a specified path.
+    Each file is parsed only once: later calls return the same (not to be modified) dictionary.
 
     Args:
         file_name (str): The name of the YAML configuration file to load.
@@ -28,6 +30,11 @@ def get_config_from_path(file_name: str) -> dict:
     full_path = os.path.join(path_to_yaml_files, file_name)
 
     if full_path.endswith(".yaml"):
-        return parse_config(full_path)
+        return _parse_config(full_path)
     else:
         raise ValueError(f"Only .yaml files are managed.")
+
+
+@lru_cache(maxsize=None)
+def _parse_config(full_path: str) -> dict:
+    return parse_config(full_path)